@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+
+from .db import (
+    MONGODB_CONNECT_TIMEOUT_MS, MONGODB_DATABASE, MONGODB_INDEX_RETRY_SECONDS, MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE, MONGODB_SERVER_SELECTION_TIMEOUT_MS, MONGODB_SOCKET_TIMEOUT_MS, MONGODB_URI,
+    PROFILE_CURSOR_BATCH_SIZE, PROFILE_DETAIL_FIELDS, PROFILE_INDEXES, PROFILE_PROJECTION_FIELDS,
+    PROFILE_SUMMARY_FIELDS, profile_page_query
+)
+from .metrics import phase
+
+logger = logging.getLogger(__name__)
+
+# The async counterpart of db.py for the ASGI app; same collection, fields and indexes
+_client = None
+_client_loop = None
+_client_factory = None
+# As in db: the client whose indexes exist, when a failure may be retried, and whether a try is running
+_indexes_client = None
+_index_retry_at = 0.0
+_indexes_pending = False
+
+def create_client():
+    return AsyncMongoClient(
+        MONGODB_URI,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+        connect=False
+    )
+
+def use_client_factory(factory):
+    """Swap the client factory for tests; None restores the default"""
+    global _client, _client_factory, _index_retry_at
+    _client_factory = factory
+    _client = None
+    _index_retry_at = 0.0
+
+async def get_client():
+    """The client for the running event loop, created lazily (an async client is bound to its loop)"""
+    global _client, _client_loop, _index_retry_at
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = (_client_factory or create_client)()
+        _client_loop = loop
+        _index_retry_at = 0.0
+    client = _client
+    if _indexes_client is not client:
+        await ensure_client_indexes(client)
+    return client
+
+async def get_profiles_collection():
+    return (await get_client())[MONGODB_DATABASE].profiles
+
+async def ensure_indexes(db):
+    try:
+        for keys, name in PROFILE_INDEXES:
+            await db.profiles.create_index(keys, name=name)
+        return True
+    except PyMongoError as e:
+        logger.warning(f'Could not create profile indexes: {str(e)}')
+        return False
+
+async def ensure_client_indexes(client):
+    """Like db.ensure_client_indexes: one request tries at a time, failures are retried later"""
+    global _indexes_client, _index_retry_at, _indexes_pending
+    if _indexes_pending or time.monotonic() < _index_retry_at:
+        return
+    _indexes_pending = True
+    try:
+        if await ensure_indexes(client[MONGODB_DATABASE]):
+            _indexes_client = client
+        else:
+            _index_retry_at = time.monotonic() + MONGODB_INDEX_RETRY_SECONDS
+    finally:
+        _indexes_pending = False
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+async def save_profile(name, config, owner=None, projection=None):
+    profile = {
+        'name': name,
+        'config': config,
+        'owner': owner,
+        'createdAt': datetime.now(timezone.utc)
+    }
+    if projection is not None:
+        profile['projection'] = projection
+    with phase('mongo'):
+        result = await (await get_profiles_collection()).insert_one(profile)
+    return str(result.inserted_id)
+
+async def iter_profiles(limit=None, after=None, prefix=None):
+    """Async generator of profile summaries in the order of db.iter_profiles"""
+    query, sort = profile_page_query(after, prefix)
+    cursor = (await get_profiles_collection()).find(query, PROFILE_SUMMARY_FIELDS).sort(sort)
+    cursor = cursor.batch_size(PROFILE_CURSOR_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    while True:
+        # Only the fetch counts as mongo time, not the caller's work between items
+        with phase('mongo'):
+            profile = await anext(cursor, None)
+        if profile is None:
+            return
+        profile['_id'] = str(profile['_id'])
+        yield profile
+
+async def get_profile(profile_id):
+    with phase('mongo'):
+        profile = await (await get_profiles_collection()).find_one({'_id': ObjectId(profile_id)}, PROFILE_DETAIL_FIELDS)
+    if profile:
+        profile['_id'] = str(profile['_id'])
+    return profile
+
+async def update_profile(profile_id, name, config, projection=None):
+    update = {'$set': {'name': name, 'config': config}}
+    if projection is not None:
+        update['$set']['projection'] = projection
+    else:
+        update['$unset'] = {'projection': ''}
+    with phase('mongo'):
+        result = await (await get_profiles_collection()).update_one({'_id': ObjectId(profile_id)}, update)
+    return result.matched_count > 0
+
+async def get_profile_projection(profile_id):
+    with phase('mongo'):
+        return await (await get_profiles_collection()).find_one({'_id': ObjectId(profile_id)}, PROFILE_PROJECTION_FIELDS)
+
+async def set_profile_projection(profile_id, projection):
+    with phase('mongo'):
+        await (await get_profiles_collection()).update_one({'_id': ObjectId(profile_id)}, {'$set': {'projection': projection}})
+
+async def delete_profile(profile_id):
+    with phase('mongo'):
+        result = await (await get_profiles_collection()).delete_one({'_id': ObjectId(profile_id)})
+    return result.deleted_count > 0
@@ -0,0 +1,65 @@
+import numpy as np
+
+from .montecarlo import load_historical_returns, path_success, simulate_paths
+from .projection import build_cash_flows
+from .schema import ValidationError, parse_calculate_config
+
+def historical_real_return_windows(length):
+    """(start years, cohorts x length real returns) for every complete historical window
+
+    Column i holds the return earned between plan years i - 1 and i, so a cohort starting in
+    year Y grows with Y's return first; column 0 is unused, as in simulate_paths.
+    """
+    years, stock_returns, inflation = load_historical_returns()
+    if length - 1 > len(years):
+        raise ValueError(
+            f'The plan needs {length - 1} years of returns but the history only covers '
+            f'{len(years)} ({years[0]}-{years[-1]})'
+        )
+    real_returns = (1 + stock_returns) / (1 + inflation) - 1
+    windows = np.lib.stride_tricks.sliding_window_view(real_returns, length - 1)[:len(years)]
+    cohorts = len(windows)
+    return years[:cohorts], np.hstack([np.zeros((cohorts, 1)), windows])
+
+def run_backtest(data):
+    """The plan run from every historical start year (rolling windows), all cohorts at once"""
+    data = parse_calculate_config(data)
+    # Historical returns are annual, so there's no finer schedule to step through
+    if data.get('granularity', 'yearly') != 'yearly':
+        raise ValidationError('Backtests only support yearly granularity')
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    years = list(range(current_age, end_age + 1))
+    retirement_spending = data['retirementSpending']
+    required_savings = retirement_spending / (data['withdrawalRate'] / 100)
+    stop_at_fire = data.get('stopAtFire', False)
+    start_years, real_returns = historical_real_return_windows(len(years))
+
+    # Income, spending and tax don't depend on returns, so every cohort shares them
+    _, spending, total_available_income, _ = build_cash_flows(data)
+    working_savings = total_available_income - spending
+    retired_savings = np.full(len(years), -float(retirement_spending))
+    fire_index, real_net_worth = simulate_paths(
+        data.get('currentNetWorth', 0), working_savings, retired_savings, required_savings, stop_at_fire, real_returns
+    )
+
+    fired = fire_index >= 0
+    success, lowest_after_fire = path_success(fire_index, real_net_worth)
+    # Worst: a failed cohort before any success, then the smallest cushion from FIRE on
+    # (the final balance for cohorts that never reach FIRE)
+    cushion = np.where(fired, lowest_after_fire, real_net_worth[:, -1])
+    worst = np.lexsort((cushion, success))[0]
+    fire_ages = np.where(fired, current_age + fire_index, -1)
+
+    return {
+        'years': years,
+        'startYears': start_years.tolist(),
+        'cohorts': len(start_years),
+        'requiredSavings': required_savings,
+        'successRate': float(success.mean()),
+        'fireRate': float(fired.mean()),
+        'worstStartYear': int(start_years[worst]),
+        'success': success.tolist(),
+        'fireAges': [int(age) if age >= 0 else None for age in fire_ages],
+        'realNetWorth': real_net_worth.tolist()
+    }
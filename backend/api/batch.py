@@ -0,0 +1,51 @@
+import os
+
+from .pool import WORKER_PROCESSES, get_process_pool
+from .projection import run_projection
+from .result_cache import config_hash
+from .schema import ValidationError, parse_calculate_config
+
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 1000))
+# Batches with at least this many distinct configs are evaluated across the process pool
+PARALLEL_BATCH_THRESHOLD = int(os.getenv('BATCH_PARALLEL_THRESHOLD', 32))
+
+def evaluate_config(config):
+    """Projection for one config, with failures reported instead of raised"""
+    try:
+        return {'result': run_projection(config)}
+    except Exception as e:
+        return {'error': str(e)}
+
+def run_batch(configs):
+    if not isinstance(configs, list):
+        raise ValueError('Expected a list of configs')
+    if len(configs) > MAX_BATCH_SIZE:
+        raise ValueError(f'Batch has {len(configs)} configs, the limit is {MAX_BATCH_SIZE}')
+
+    # Validate everything up front and evaluate each distinct config once
+    items = [None] * len(configs)
+    unique_configs = []
+    unique_index = {}
+    assignments = []
+    for i, config in enumerate(configs):
+        try:
+            config = parse_calculate_config(config)
+        except ValidationError as e:
+            items[i] = {'error': str(e)}
+            continue
+        # Normalized configs that only differ in entry ids or order hash the same
+        key = config_hash(config)
+        if key not in unique_index:
+            unique_index[key] = len(unique_configs)
+            unique_configs.append(config)
+        assignments.append((i, unique_index[key]))
+
+    if WORKER_PROCESSES > 1 and len(unique_configs) >= PARALLEL_BATCH_THRESHOLD:
+        chunksize = max(1, len(unique_configs) // (WORKER_PROCESSES * 4))
+        evaluated = list(get_process_pool().map(evaluate_config, unique_configs, chunksize=chunksize))
+    else:
+        evaluated = [evaluate_config(config) for config in unique_configs]
+
+    for i, unique in assignments:
+        items[i] = evaluated[unique]
+    return {'results': items, 'evaluated': len(unique_configs)}
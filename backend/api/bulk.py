@@ -0,0 +1,92 @@
+import gzip
+import json
+import zlib
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+
+from . import db
+
+IMPORT_BATCH_SIZE = 1000
+
+def parse_profile_record(record):
+    """Profile document for one imported record; an exported _id is kept (so importing the same
+    export again replaces rather than duplicates), projection snapshots are not carried over"""
+    if not isinstance(record, dict):
+        raise ValueError('Record must be an object')
+    if not isinstance(record.get('name'), str) or not record['name']:
+        raise ValueError('Record needs a non-empty name')
+    if not isinstance(record.get('config'), dict):
+        raise ValueError('Record needs a config object')
+    created_at = record.get('createdAt')
+    try:
+        created_at = datetime.fromisoformat(created_at) if created_at else datetime.now(timezone.utc)
+    except (TypeError, ValueError):
+        raise ValueError(f'createdAt must be an ISO 8601 timestamp: {created_at!r}')
+    profile = {
+        'name': record['name'],
+        'config': record['config'],
+        'owner': record.get('owner'),
+        'createdAt': created_at
+    }
+    if record.get('_id') is not None:
+        if not isinstance(record['_id'], str) or not ObjectId.is_valid(record['_id']):
+            raise ValueError(f"_id must be an ObjectId string: {record['_id']!r}")
+        profile['_id'] = ObjectId(record['_id'])
+    return profile
+
+def import_profiles(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Import NDJSON profile lines in unordered bulk_write batches, reporting errors per line
+
+    Records with an _id replace the profile with that _id (or create it), so restoring a backup
+    keeps profile ids and re-running an import doesn't duplicate anything.
+    """
+    inserted = 0
+    replaced = 0
+    errors = []
+    batch = []
+    batch_lines = []
+
+    def flush():
+        nonlocal inserted, replaced
+        batch_inserted, batch_replaced, batch_errors = db.upsert_profiles(batch)
+        inserted += batch_inserted
+        replaced += batch_replaced
+        errors.extend({'line': batch_lines[index], 'error': message} for index, message in batch_errors)
+        batch.clear()
+        batch_lines.clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(parse_profile_record(json.loads(line)))
+            batch_lines.append(line_number)
+        except (TypeError, ValueError) as e:
+            errors.append({'line': line_number, 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return {'inserted': inserted, 'replaced': replaced, 'failed': len(errors), 'errors': errors}
+
+def export_profiles():
+    """NDJSON lines for every profile, streamed from the cursor"""
+    for profile in db.iter_profile_documents():
+        yield json.dumps(profile) + '\n'
+
+def gzip_lines(lines):
+    """Gzip-compress a stream of text lines chunk by chunk"""
+    compressor = zlib.compressobj(wbits=31)
+    for line in lines:
+        chunk = compressor.compress(line.encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+def open_ndjson(stream, compressed):
+    """Text line iterator over a (possibly gzip-compressed) binary stream"""
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream)
+    for line in stream:
+        yield line.decode()
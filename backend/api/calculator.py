@@ -1,4 +1,7 @@
-from .tax import calculate_tax
+import math
+
+from .metrics import phase
+from .tax import cached_calculate_tax
 
 
 def calculate_yearly_data(year, yearly_income, yearly_spending, stop_at_fire, retirement_spending, end_age, fire_age=None):
@@ -9,16 +12,12 @@ def calculate_yearly_data(year, yearly_income, yearly_spending, stop_at_fire, re
         return 0, retirement_spending, [], [{'startAge': year, 'endAge': end_age, 'amount': retirement_spending}]
     return gross_income, spending, yearly_income, yearly_spending
 
-def calculate_income_tax(gross_income, state, pre_tax_401k, employer_match):
+def calculate_income_tax(gross_income, state, pre_tax_401k, employer_match, filing_status=None, tax_year=None):
     if gross_income <= 0:
         return 0, 0, 0
     
-    tax_data = {
-        'income': gross_income,
-        'state': state,
-        'preTax401k': pre_tax_401k
-    }
-    tax_result = calculate_tax(tax_data)
+    with phase('tax'):
+        tax_result = cached_calculate_tax(gross_income, state, pre_tax_401k, filing_status, tax_year)
     after_tax_income = tax_result['afterTaxIncome']
     effective_tax_rate = (tax_result['totalTax'] / gross_income) * 100
     employer_contribution = gross_income * employer_match
@@ -32,7 +31,131 @@ def calculate_net_worth(current_net_worth, previous_real_balance, real_return_ra
     real_balance = previous_real_balance + real_interest_earned
     return real_balance, real_interest_earned
 
-def calculate_fire_projection(data):
+# Per-year series in a projection result, in addition to `years`
+PROJECTION_ARRAY_KEYS = [
+    'nominalNetWorth',
+    'realNetWorth',
+    'yearlyPreTaxIncome',
+    'yearlyAfterTaxIncome',
+    'yearlySpending',
+    'yearlyTaxRates',
+    'yearlySavings',
+    'yearlyRealInterest'
+]
+
+def fire_not_possible_error(withdrawal_rate, real_return_rate):
+    return f"FIRE is not possible: Withdrawal rate ({withdrawal_rate*100:.1f}%) exceeds real return rate ({real_return_rate*100:.1f}%)"
+
+def build_segments(data):
+    """Split the timeline into (start_age, stop_age, savings) runs of constant income and spending"""
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    yearly_income = data.get('yearlyIncome', [])
+    yearly_spending = data.get('yearlySpending', [])
+    if end_age < current_age:
+        return []
+    
+    breakpoints = {current_age, end_age + 1}
+    for entry in yearly_income + yearly_spending:
+        for age in (entry['startAge'], entry['endAge'] + 1):
+            if current_age < age <= end_age:
+                breakpoints.add(age)
+    edges = sorted(breakpoints)
+    
+    segments = []
+    for start_age, stop_age in zip(edges, edges[1:]):
+        gross_income, spending, _, _ = calculate_yearly_data(
+            start_age, yearly_income, yearly_spending, False, 0, end_age
+        )
+        total_available_income, _, _ = calculate_income_tax(
+            gross_income, data.get('state', 'CA'), data['preTax401k'], data['employerMatch'] / 100,
+            data.get('filingStatus'), data.get('taxYear')
+        )
+        segments.append((start_age, stop_age, total_available_income - spending))
+    return segments
+
+def balance_after(balance, savings, growth, years):
+    """Real net worth after `years` steps of W = W * growth + savings"""
+    if growth == 1:
+        return balance + savings * years
+    factor = growth ** years
+    return balance * factor + savings * (factor - 1) / (growth - 1)
+
+def first_crossing(balance, savings, growth, target, years):
+    """First step in 1..years where the balance reaches target, or None (the balance is monotone in a segment)"""
+    if balance_after(balance, savings, growth, 1) >= target:
+        return 1
+    if balance_after(balance, savings, growth, years) < target:
+        return None
+    if growth == 1:
+        step = (target - balance) / savings
+    else:
+        # W_k - F = (W_0 - F) * growth^k around the fixed point F
+        fixed_point = -savings / (growth - 1)
+        step = math.log((target - fixed_point) / (balance - fixed_point)) / math.log(growth)
+    step = min(max(math.ceil(step), 1), years)
+    # Correct for floating point error around the boundary
+    while step > 1 and balance_after(balance, savings, growth, step - 1) >= target:
+        step -= 1
+    while balance_after(balance, savings, growth, step) < target:
+        step += 1
+    return step
+
+def find_fire_age(data, segments=None):
+    """First age whose real net worth reaches required savings, solved per segment in closed form"""
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    current_net_worth = data.get('currentNetWorth', 0)
+    real_return_rate = (1 + data['annualReturn'] / 100) / (1 + data['inflationRate'] / 100) - 1
+    required_savings = data['retirementSpending'] / (data['withdrawalRate'] / 100)
+    growth = 1 + real_return_rate
+    
+    if end_age < current_age:
+        return None
+    if current_net_worth >= required_savings:
+        return current_age
+    if segments is None:
+        segments = build_segments(data)
+    
+    balance = current_net_worth
+    for start_age, stop_age, savings in segments:
+        # The first year's savings never reach the net worth
+        first_age = max(start_age, current_age + 1)
+        years = stop_age - first_age
+        if years <= 0:
+            continue
+        if growth <= 0:
+            for age in range(first_age, stop_age):
+                balance = balance * growth + savings
+                if balance >= required_savings:
+                    return age
+            continue
+        step = first_crossing(balance, savings, growth, required_savings, years)
+        if step is not None:
+            return first_age + step - 1
+        balance = balance_after(balance, savings, growth, years)
+    return None
+
+def calculate_fire_summary(data):
+    """Just fireAge and requiredSavings, in O(segments) without building per-year arrays"""
+    annual_return = data['annualReturn'] / 100
+    inflation_rate = data['inflationRate'] / 100
+    withdrawal_rate = data['withdrawalRate'] / 100
+    real_return_rate = (1 + annual_return) / (1 + inflation_rate) - 1
+    
+    with phase('pass1'):
+        fire_age = find_fire_age(data)
+    result = {
+        'fireAge': fire_age,
+        'requiredSavings': data['retirementSpending'] / withdrawal_rate
+    }
+    if withdrawal_rate > real_return_rate:
+        result['error'] = fire_not_possible_error(withdrawal_rate, real_return_rate)
+        result['fireAge'] = None
+    return result
+
+def iter_fire_projection(data):
+    """Yield the fireAge/requiredSavings summary first, then one row per year as soon as it is computed"""
     # Extract input parameters
     current_age = data['currentAge']
     end_age = data['endAge']
@@ -44,6 +167,8 @@ def calculate_fire_projection(data):
     pre_tax_401k = data['preTax401k']
     employer_match = data['employerMatch'] / 100
     state = data.get('state', 'CA')
+    filing_status = data.get('filingStatus')
+    tax_year = data.get('taxYear')
     stop_at_fire = data.get('stopAtFire', False)
     
     # Calculate real return rate and check FIRE possibility
@@ -51,95 +176,64 @@ def calculate_fire_projection(data):
     fire_possible = withdrawal_rate <= real_return_rate
     required_savings = retirement_spending / withdrawal_rate
     
-    # Initialize arrays
-    years = range(current_age, end_age + 1)
-    arrays = {
-        'real_net_worth': [0] * len(years),
-        'yearly_after_tax_income': [0] * len(years),
-        'yearly_spending_amounts': [0] * len(years),
-        'yearly_pre_tax_income': [0] * len(years),
-        'yearly_tax_rates': [0] * len(years),
-        'yearly_savings': [0] * len(years),
-        'yearly_real_interest': [0] * len(years)
-    }
-    
     yearly_spending = data.get('yearlySpending', [])
     yearly_income = data.get('yearlyIncome', [])
     
-    # First pass to calculate FIRE age
-    fire_age = None
-    for i, year in enumerate(years):
-        gross_income, spending, _, _ = calculate_yearly_data(
-            year, yearly_income, yearly_spending, False, retirement_spending, end_age
-        )
-        
-        total_available_income, effective_tax_rate, _ = calculate_income_tax(
-            gross_income, state, pre_tax_401k, employer_match
-        )
-        
-        real_balance, real_interest_earned = calculate_net_worth(
-            current_net_worth,
-            arrays['real_net_worth'][i-1] if i > 0 else current_net_worth,
-            real_return_rate,
-            i
-        )
-        
-        savings = total_available_income - spending
-        
-        # Update arrays
-        arrays['real_net_worth'][i] = current_net_worth if i == 0 else arrays['real_net_worth'][i-1] + savings + real_interest_earned
-        
-        # Check if we've reached FIRE
-        if fire_age is None and arrays['real_net_worth'][i] >= required_savings:
-            fire_age = year
+    # Closed-form solve for the FIRE age instead of a first full pass
+    with phase('pass1'):
+        fire_age = find_fire_age(data)
+    
+    summary = {'fireAge': fire_age, 'requiredSavings': required_savings}
+    if not fire_possible:
+        summary['error'] = fire_not_possible_error(withdrawal_rate, real_return_rate)
+        summary['fireAge'] = None
+    yield summary
     
     # Second pass to calculate final values with stop_at_fire if needed
-    for i, year in enumerate(years):
+    real_net_worth = current_net_worth
+    for i, year in enumerate(range(current_age, end_age + 1)):
         gross_income, spending, yearly_income, yearly_spending = calculate_yearly_data(
             year, yearly_income, yearly_spending, stop_at_fire, retirement_spending, end_age, fire_age
         )
         
         total_available_income, effective_tax_rate, _ = calculate_income_tax(
-            gross_income, state, pre_tax_401k, employer_match
+            gross_income, state, pre_tax_401k, employer_match, filing_status, tax_year
         )
         
         real_balance, real_interest_earned = calculate_net_worth(
             current_net_worth,
-            arrays['real_net_worth'][i-1] if i > 0 else current_net_worth,
+            real_net_worth,
             real_return_rate,
             i
         )
         
         savings = total_available_income - spending
+        real_net_worth = current_net_worth if i == 0 else real_net_worth + savings + real_interest_earned
         
-        # Update arrays
-        arrays['real_net_worth'][i] = current_net_worth if i == 0 else arrays['real_net_worth'][i-1] + savings + real_interest_earned
-        arrays['yearly_pre_tax_income'][i] = gross_income
-        arrays['yearly_after_tax_income'][i] = total_available_income
-        arrays['yearly_spending_amounts'][i] = spending
-        arrays['yearly_tax_rates'][i] = effective_tax_rate
-        arrays['yearly_savings'][i] = savings
-        arrays['yearly_real_interest'][i] = real_interest_earned if i > 0 else 0
-    
-    # Calculate nominal values from real values
-    nominal_net_worth = [real * ((1 + inflation_rate) ** i) for i, real in enumerate(arrays['real_net_worth'])]
-    
-    result = {
-        'years': list(years),
-        'nominalNetWorth': nominal_net_worth,
-        'realNetWorth': arrays['real_net_worth'],
-        'yearlyPreTaxIncome': arrays['yearly_pre_tax_income'],
-        'yearlyAfterTaxIncome': arrays['yearly_after_tax_income'],
-        'yearlySpending': arrays['yearly_spending_amounts'],
-        'yearlyTaxRates': arrays['yearly_tax_rates'],
-        'yearlySavings': arrays['yearly_savings'],
-        'yearlyRealInterest': arrays['yearly_real_interest'],
-        'fireAge': fire_age,
-        'requiredSavings': required_savings
-    }
+        yield {
+            'year': year,
+            # Calculate nominal values from real values
+            'nominalNetWorth': real_net_worth * ((1 + inflation_rate) ** i),
+            'realNetWorth': real_net_worth,
+            'yearlyPreTaxIncome': gross_income,
+            'yearlyAfterTaxIncome': total_available_income,
+            'yearlySpending': spending,
+            'yearlyTaxRates': effective_tax_rate,
+            'yearlySavings': savings,
+            'yearlyRealInterest': real_interest_earned if i > 0 else 0
+        }
+
+def calculate_fire_projection(data):
+    if data.get('summaryOnly'):
+        return calculate_fire_summary(data)
     
-    if not fire_possible:
-        result['error'] = f"FIRE is not possible: Withdrawal rate ({withdrawal_rate*100:.1f}%) exceeds real return rate ({real_return_rate*100:.1f}%)"
-        result['fireAge'] = None
+    rows = iter_fire_projection(data)
+    summary = next(rows)
+    with phase('pass2'):
+        rows = list(rows)
     
-    return result
\ No newline at end of file
+    result = {'years': [row['year'] for row in rows]}
+    for key in PROJECTION_ARRAY_KEYS:
+        result[key] = [row[key] for row in rows]
+    result.update(summary)
+    return result
@@ -1,37 +1,272 @@
-from pymongo import MongoClient
+from pymongo import ASCENDING, InsertOne, MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from bson.objectid import ObjectId
+from datetime import datetime, timezone
+import base64
+import json
+import logging
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
 
+from .metrics import phase, timed
+
 load_dotenv()
 
-# Get MongoDB connection string from environment variable
+logger = logging.getLogger(__name__)
+
+# Get MongoDB connection settings from environment variables
 MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
-client = MongoClient(MONGODB_URI)
-db = client.fire_calculator
-profiles = db.profiles
+MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'fire_calculator')
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 20))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 10000))
+# Seconds before index creation is tried again after a failure (e.g. the server was down)
+MONGODB_INDEX_RETRY_SECONDS = float(os.getenv('MONGODB_INDEX_RETRY_SECONDS', 30))
+
+# Only the fields each read needs
+PROFILE_SUMMARY_FIELDS = {'_id': 1, 'name': 1}
+PROFILE_DETAIL_FIELDS = {'_id': 1, 'name': 1, 'config': 1}
+PROFILE_PROJECTION_FIELDS = {'_id': 0, 'config': 1, 'projection': 1}
+PROFILE_EXPORT_FIELDS = {'_id': 1, 'name': 1, 'config': 1, 'owner': 1, 'createdAt': 1}
+
+MAX_PROFILE_PAGE_SIZE = int(os.getenv('MAX_PROFILE_PAGE_SIZE', 1000))
+PROFILE_CURSOR_BATCH_SIZE = 500
+
+PROFILE_INDEXES = [
+    # Serves anchored name-prefix searches, sorted and paged on (name, _id)
+    ([('name', ASCENDING), ('_id', ASCENDING)], 'name_id'),
+    ([('owner', ASCENDING)], 'owner'),
+    ([('createdAt', ASCENDING)], 'createdAt'),
+]
+
+_client = None
+_client_pid = None
+_client_factory = None
+_client_lock = threading.Lock()
+# The client whose indexes exist, and when a failed attempt may be retried
+_indexes_client = None
+_index_retry_at = 0.0
+_index_lock = threading.Lock()
+
+def create_client():
+    return MongoClient(
+        MONGODB_URI,
+        maxPoolSize=MONGODB_MAX_POOL_SIZE,
+        minPoolSize=MONGODB_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+        connect=False
+    )
+
+def use_client_factory(factory):
+    """Swap the client factory, e.g. `mongomock.MongoClient` for tests; None restores the default"""
+    global _client, _client_factory, _index_retry_at
+    with _client_lock:
+        _client_factory = factory
+        _client = None
+        _index_retry_at = 0.0
 
-def save_profile(name, config):
-    """Save a new profile configuration"""
+def get_client():
+    """The process-wide pooled client, created lazily and again after a fork"""
+    global _client, _client_pid, _index_retry_at
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = (_client_factory or create_client)()
+            _client_pid = os.getpid()
+            _index_retry_at = 0.0
+        client = _client
+    if _indexes_client is not client:
+        ensure_client_indexes(client)
+    return client
+
+def get_db():
+    return get_client()[MONGODB_DATABASE]
+
+def get_profiles_collection():
+    return get_db().profiles
+
+def ensure_indexes(db):
+    """Create the profile indexes; returns whether that worked"""
+    try:
+        for keys, name in PROFILE_INDEXES:
+            db.profiles.create_index(keys, name=name)
+        return True
+    except PyMongoError as e:
+        logger.warning(f'Could not create profile indexes: {str(e)}')
+        return False
+
+def ensure_client_indexes(client):
+    """Create the indexes for a client outside _client_lock, so a down server only holds up the
+    one request trying; the others go on without them, and a failure is retried after
+    MONGODB_INDEX_RETRY_SECONDS"""
+    global _indexes_client, _index_retry_at
+    if time.monotonic() < _index_retry_at or not _index_lock.acquire(blocking=False):
+        return
+    try:
+        if _indexes_client is client:
+            return
+        if ensure_indexes(client[MONGODB_DATABASE]):
+            _indexes_client = client
+        else:
+            _index_retry_at = time.monotonic() + MONGODB_INDEX_RETRY_SECONDS
+    finally:
+        _index_lock.release()
+
+@timed('mongo')
+def save_profile(name, config, owner=None, projection=None):
+    """Save a new profile configuration, with its projection snapshot if given"""
     profile = {
         'name': name,
-        'config': config
+        'config': config,
+        'owner': owner,
+        'createdAt': datetime.now(timezone.utc)
     }
-    result = profiles.insert_one(profile)
+    if projection is not None:
+        profile['projection'] = projection
+    result = get_profiles_collection().insert_one(profile)
     return str(result.inserted_id)
 
+def timed_cursor(cursor):
+    """Yield from a cursor with each fetch counted as the mongo phase, but not the caller's work"""
+    while True:
+        with phase('mongo'):
+            document = next(cursor, None)
+        if document is None:
+            return
+        yield document
+
+def page_cursor(profile, prefix=None):
+    """Cursor for the page ending at `profile`: its _id, or for a prefix search its (name, _id) sort key"""
+    if not prefix:
+        return profile['_id']
+    key = json.dumps([profile['name'], profile['_id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_name_cursor(after):
+    """(name, ObjectId) from a prefix search cursor; raises ValueError for a malformed one"""
+    try:
+        name, profile_id = json.loads(base64.urlsafe_b64decode(after.encode()))
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid cursor: {after}')
+    if not isinstance(name, str) or not ObjectId.is_valid(profile_id):
+        raise ValueError(f'Invalid cursor: {after}')
+    return name, ObjectId(profile_id)
+
+def profile_page_query(after=None, prefix=None):
+    """(filter, sort) for a page of profiles
+
+    Plain pages walk _id. A prefix search walks (name, _id), so the anchored match, the sort and
+    the cursor are all served by the name_id index.
+    """
+    if not prefix:
+        return ({'_id': {'$gt': ObjectId(after)}} if after else {}), [('_id', ASCENDING)]
+    query = {'name': {'$regex': '^' + re.escape(prefix)}}
+    if after:
+        name, profile_id = decode_name_cursor(after)
+        query['$or'] = [{'name': {'$gt': name}}, {'name': name, '_id': {'$gt': profile_id}}]
+    return query, [('name', ASCENDING), ('_id', ASCENDING)]
+
+def iter_profiles(limit=None, after=None, prefix=None):
+    """Yield profile summaries straight from the cursor, in _id order or (name, _id) order for a prefix
+
+    `after` is page_cursor() of the previous page's last profile.
+    """
+    query, sort = profile_page_query(after, prefix)
+    cursor = get_profiles_collection().find(query, PROFILE_SUMMARY_FIELDS).sort(sort)
+    cursor = cursor.batch_size(PROFILE_CURSOR_BATCH_SIZE)
+    if limit:
+        cursor = cursor.limit(limit)
+    for profile in timed_cursor(cursor):
+        profile['_id'] = str(profile['_id'])
+        yield profile
+
+def parse_page_limit(value):
+    """The limit query argument as an int, None when absent; raises ValueError for anything else"""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'limit must be an integer: {value}')
+
+def validate_page_args(limit, after, prefix=None):
+    """Raise ValueError for a page size out of range or a malformed cursor"""
+    if limit is not None and not 1 <= limit <= MAX_PROFILE_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PROFILE_PAGE_SIZE}')
+    if after and prefix:
+        decode_name_cursor(after)
+    elif after and not ObjectId.is_valid(after):
+        raise ValueError(f'Invalid cursor: {after}')
+
 def get_profiles():
     """Get all saved profiles"""
-    return list(profiles.find({}, {'_id': 1, 'name': 1}))
+    return list(iter_profiles())
 
+@timed('mongo')
 def get_profile(profile_id):
     """Get a specific profile by ID"""
-    profile = profiles.find_one({'_id': ObjectId(profile_id)})
+    profile = get_profiles_collection().find_one({'_id': ObjectId(profile_id)}, PROFILE_DETAIL_FIELDS)
     if profile:
         profile['_id'] = str(profile['_id'])
     return profile
 
+@timed('mongo')
+def update_profile(profile_id, name, config, projection=None):
+    """Replace a profile's name and config; a stale snapshot is dropped when none is given"""
+    update = {'$set': {'name': name, 'config': config}}
+    if projection is not None:
+        update['$set']['projection'] = projection
+    else:
+        update['$unset'] = {'projection': ''}
+    result = get_profiles_collection().update_one({'_id': ObjectId(profile_id)}, update)
+    return result.matched_count > 0
+
+@timed('mongo')
+def get_profile_projection(profile_id):
+    """Config and stored projection snapshot of a profile"""
+    return get_profiles_collection().find_one({'_id': ObjectId(profile_id)}, PROFILE_PROJECTION_FIELDS)
+
+@timed('mongo')
+def set_profile_projection(profile_id, projection):
+    get_profiles_collection().update_one({'_id': ObjectId(profile_id)}, {'$set': {'projection': projection}})
+
+@timed('mongo')
 def delete_profile(profile_id):
     """Delete a profile by ID"""
-    result = profiles.delete_one({'_id': ObjectId(profile_id)})
-    return result.deleted_count > 0 
\ No newline at end of file
+    result = get_profiles_collection().delete_one({'_id': ObjectId(profile_id)})
+    return result.deleted_count > 0
+
+@timed('mongo')
+def upsert_profiles(profiles):
+    """Unordered bulk write: profiles with an _id replace (or create) that profile, others are inserted
+
+    Returns (created count, replaced count, [(index, error message)] for the failures).
+    """
+    if not profiles:
+        return 0, 0, []
+    requests = [
+        ReplaceOne({'_id': profile['_id']}, profile, upsert=True) if '_id' in profile else InsertOne(profile)
+        for profile in profiles
+    ]
+    try:
+        details = get_profiles_collection().bulk_write(requests, ordered=False).bulk_api_result
+        errors = []
+    except BulkWriteError as e:
+        details = e.details
+        errors = [(error['index'], error['errmsg']) for error in details.get('writeErrors', [])]
+    return details.get('nInserted', 0) + details.get('nUpserted', 0), details.get('nMatched', 0), errors
+
+def iter_profile_documents():
+    """Yield full profiles (without projection snapshots) in _id order from a server-side cursor"""
+    cursor = get_profiles_collection().find({}, PROFILE_EXPORT_FIELDS).sort('_id', ASCENDING)
+    for profile in timed_cursor(cursor.batch_size(PROFILE_CURSOR_BATCH_SIZE)):
+        profile['_id'] = str(profile['_id'])
+        if isinstance(profile.get('createdAt'), datetime):
+            profile['createdAt'] = profile['createdAt'].isoformat()
+        yield profile
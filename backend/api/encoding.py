@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+COLUMNAR_MIMETYPE = 'application/vnd.fire.columnar'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', 1024))
+
+# Columnar layout: magic, version, 3 reserved bytes, uint32 header length, JSON header padded so
+# the columns start 8-byte aligned, then each column as little-endian float64
+COLUMNAR_MAGIC = b'FIRC'
+COLUMNAR_VERSION = 1
+COLUMNAR_PREFIX = struct.Struct('<4sB3xI')
+
+def response_mimetypes():
+    # JSON first: it is what */* and a missing Accept header get
+    return [JSON_MIMETYPE, COLUMNAR_MIMETYPE] + ([MSGPACK_MIMETYPE] if msgpack is not None else [])
+
+def content_codings():
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+def negotiate(accept, accept_encoding):
+    """(mimetype, content coding or None) for the Accept and Accept-Encoding headers"""
+    mimetype = parse_accept_header(accept, MIMEAccept).best_match(response_mimetypes(), default=JSON_MIMETYPE)
+    encodings = parse_accept_header(accept_encoding)
+    coding = max(content_codings(), key=lambda name: encodings[name])
+    return mimetype, coding if encodings[coding] > 0 else None
+
+def is_column(value):
+    if isinstance(value, np.ndarray):
+        return value.ndim == 1
+    return (
+        isinstance(value, list)
+        and all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in value)
+    )
+
+def encode_columnar(obj):
+    """Numeric lists become raw float64 columns; every other field goes in the JSON header"""
+    columns = {key: value for key, value in obj.items() if is_column(value)}
+    header = {
+        'fields': {key: value for key, value in obj.items() if key not in columns},
+        'columns': [{'name': key, 'length': len(value)} for key, value in columns.items()]
+    }
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    header_bytes += b' ' * (-(COLUMNAR_PREFIX.size + len(header_bytes)) % 8)
+    parts = [COLUMNAR_PREFIX.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(header_bytes)), header_bytes]
+    parts.extend(np.asarray(value, dtype='<f8').tobytes() for value in columns.values())
+    return b''.join(parts)
+
+def decode_columnar(body):
+    """Inverse of encode_columnar, with the columns as float64 arrays"""
+    magic, version, header_length = COLUMNAR_PREFIX.unpack_from(body)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError('Not a columnar projection body')
+    offset = COLUMNAR_PREFIX.size
+    header = json.loads(body[offset:offset + header_length])
+    offset += header_length
+    result = dict(header['fields'])
+    for column in header['columns']:
+        result[column['name']] = np.frombuffer(body, dtype='<f8', count=column['length'], offset=offset)
+        offset += column['length'] * 8
+    return result
+
+def encode_body(obj, mimetype, json_dumps=json.dumps):
+    if mimetype == COLUMNAR_MIMETYPE:
+        return encode_columnar(obj)
+    if mimetype == MSGPACK_MIMETYPE:
+        return msgpack.packb(obj, use_bin_type=True)
+    return (json_dumps(obj) + '\n').encode()
+
+def compress(body, coding):
+    if coding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def strong_etag(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()[:32]
+
+def encode_response(obj, accept=None, accept_encoding=None, etag_parts=None, if_none_match=None,
+                    json_dumps=json.dumps, json_body=None):
+    """(status, body, headers) for obj in the negotiated format
+
+    json_body is obj already serialized (e.g. a result cache entry), sent as is when JSON is
+    negotiated. With etag_parts (e.g. a config hash and the projection version) the response
+    carries a strong ETag per representation, and a matching If-None-Match gives a bodiless 304.
+    """
+    mimetype, coding = negotiate(accept, accept_encoding)
+    headers = {'Content-Type': mimetype, 'Vary': 'Accept, Accept-Encoding'}
+    etag_base = strong_etag(*etag_parts, mimetype) if etag_parts is not None else None
+    if etag_base and if_none_match:
+        # The coding depends on the body size, so either variant counts as a match
+        requested = parse_etags(if_none_match)
+        for etag in (f'{etag_base}-{coding}' if coding else None, etag_base):
+            if etag and requested.contains_weak(etag):
+                return 304, b'', {'ETag': f'"{etag}"', 'Vary': headers['Vary']}
+
+    if json_body is not None:
+        body = json_body if mimetype == JSON_MIMETYPE else encode_body(json.loads(json_body), mimetype)
+    else:
+        body = encode_body(obj, mimetype, json_dumps)
+    if coding and len(body) >= COMPRESSION_MIN_BYTES:
+        body = compress(body, coding)
+        headers['Content-Encoding'] = coding
+    else:
+        coding = None
+    if etag_base:
+        headers['ETag'] = f'"{etag_base}-{coding}"' if coding else f'"{etag_base}"'
+    return 200, body, headers
@@ -0,0 +1,150 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; the Prometheus client library's default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format"""
+
+    def __init__(self, name, description, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            label_text = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return '\n'.join(lines)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Per worker process; scrape every worker or run a single worker behind /metrics
+REQUEST_LATENCY = Histogram(
+    'fire_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status')
+)
+PHASE_LATENCY = Histogram(
+    'fire_request_phase_duration_seconds', 'Time spent per request phase', ('route', 'phase')
+)
+
+# Phase totals of the request being handled; None outside a request, so phase() is a no-op there
+_phases = contextvars.ContextVar('phases', default=None)
+
+def start_request():
+    _phases.set({})
+
+def finish_request():
+    """Phase totals (seconds) recorded since start_request"""
+    phases = _phases.get()
+    _phases.set(None)
+    return phases if phases is not None else {}
+
+def iter_with_phases(iterable, phases):
+    """Iterate a streamed body with its request's phases current, so work done while the body is
+    produced (after the view has returned) still counts; closes the iterable when done"""
+    iterator = iter(iterable)
+    try:
+        while True:
+            token = _phases.set(phases)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _phases.reset(token)
+            yield item
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+async def aiter_with_phases(iterable, phases):
+    """Async counterpart of iter_with_phases for ASGI streaming bodies"""
+    iterator = aiter(iterable)
+    try:
+        while True:
+            token = _phases.set(phases)
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                _phases.reset(token)
+            yield item
+    finally:
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's phase total; phases may nest"""
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - started
+
+def timed(name):
+    """Decorator form of phase() for whole functions"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe_request(method, route, status, duration, phases):
+    REQUEST_LATENCY.observe((method, route, str(status)), duration)
+    for name, seconds in phases.items():
+        PHASE_LATENCY.observe((route, name), seconds)
+
+def server_timing(phases, duration):
+    """Server-Timing header value, durations in milliseconds"""
+    entries = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in phases.items()]
+    entries.append(f'total;dur={duration * 1000:.2f}')
+    return ', '.join(entries)
+
+def render_counter(name, description, value):
+    return f'# HELP {name} {description}\n# TYPE {name} counter\n{name} {value}'
+
+def render_gauge(name, description, value):
+    return f'# HELP {name} {description}\n# TYPE {name} gauge\n{name} {value}'
+
+def render_metrics(extra=()):
+    """Prometheus text exposition of the histograms followed by any extra rendered metrics"""
+    return '\n'.join([REQUEST_LATENCY.render(), PHASE_LATENCY.render(), *extra]) + '\n'
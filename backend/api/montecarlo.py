@@ -0,0 +1,173 @@
+import csv
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from .pool import WORKER_PROCESSES, get_process_pool
+from .projection import build_cash_flows
+from .schema import ValidationError, parse_calculate_config
+
+HISTORICAL_RETURNS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'historical_returns.csv')
+
+DEFAULT_PATHS = 10000
+MAX_PATHS = 100000
+# Largest paths x years matrix one run may allocate (8 bytes per cell, several such matrices)
+MAX_PATH_YEARS = int(os.getenv('MONTECARLO_MAX_PATH_YEARS', 10_000_000))
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+DEFAULT_RETURN_STDEV = 15
+DEFAULT_INFLATION_STDEV = 1
+# Runs with at least this many paths are split across the process pool
+PARALLEL_PATH_THRESHOLD = int(os.getenv('MONTECARLO_PARALLEL_THRESHOLD', 50000))
+
+@lru_cache(maxsize=None)
+def load_historical_returns(path=HISTORICAL_RETURNS_PATH):
+    """Load the bundled (year, stock return, inflation) series as read-only fractions"""
+    with open(path) as f:
+        rows = list(csv.DictReader(line for line in f if not line.startswith('#')))
+    years = np.array([int(row['year']) for row in rows])
+    stock_returns = np.array([float(row['stock_return']) for row in rows]) / 100
+    inflation = np.array([float(row['inflation']) for row in rows]) / 100
+    for array in (years, stock_returns, inflation):
+        array.flags.writeable = False
+    return years, stock_returns, inflation
+
+def draw_rates(rng, spec, shape):
+    """Draw annual rates (as fractions) from a {'distribution', 'mean', 'stdev'} spec in percent"""
+    distribution = spec.get('distribution', 'normal')
+    mean = spec['mean'] / 100
+    stdev = spec['stdev'] / 100
+    if distribution == 'normal':
+        return rng.normal(mean, stdev, shape)
+    if distribution == 'lognormal':
+        # Match the mean and stdev of the gross return 1 + r
+        sigma2 = np.log(1 + (stdev / (1 + mean)) ** 2)
+        mu = np.log(1 + mean) - sigma2 / 2
+        return rng.lognormal(mu, np.sqrt(sigma2), shape) - 1
+    raise ValueError(f'Unknown distribution: {distribution}')
+
+def draw_real_returns(rng, simulation, paths, length):
+    """Paths x years matrix of real returns for the configured return/inflation model"""
+    if simulation['model'] == 'bootstrap':
+        _, stock_returns, inflation = load_historical_returns()
+        # Sample whole historical years so returns and inflation stay correlated
+        picks = rng.integers(0, len(stock_returns), (paths, length))
+        return (1 + stock_returns[picks]) / (1 + inflation[picks]) - 1
+    returns = draw_rates(rng, simulation['returns'], (paths, length))
+    inflation = draw_rates(rng, simulation['inflation'], (paths, length))
+    return (1 + returns) / (1 + inflation) - 1
+
+def simulate_paths(current_net_worth, working_savings, retired_savings, required_savings, stop_at_fire, real_returns):
+    """Step every path through the years at once; same FIRE/stopAtFire rules as the deterministic engine"""
+    paths, length = real_returns.shape
+    real_net_worth = np.empty((paths, length))
+    fire_index = np.full(paths, -1)
+    fired = np.zeros(paths, dtype=bool)
+    previous = np.full(paths, float(current_net_worth))
+    for i in range(length):
+        if i == 0:
+            candidate = previous
+        else:
+            grown = previous * (1 + real_returns[:, i])
+            candidate = grown + working_savings[i]
+        newly_fired = ~fired & (candidate >= required_savings)
+        fire_index[newly_fired] = i
+        fired |= newly_fired
+        if stop_at_fire and i > 0:
+            candidate = np.where(fired, grown + retired_savings[i], candidate)
+        real_net_worth[:, i] = candidate
+        previous = candidate
+    return fire_index, real_net_worth
+
+def path_success(fire_index, real_net_worth):
+    """(success, lowest real net worth from FIRE on) per path; success is reaching FIRE and
+    never running the real net worth below zero afterwards"""
+    fired = fire_index >= 0
+    length = real_net_worth.shape[1]
+    after_fire = np.arange(length) >= np.where(fired, fire_index, length)[:, None]
+    lowest_after_fire = np.where(after_fire, real_net_worth, np.inf).min(axis=1)
+    return fired & (lowest_after_fire >= 0), lowest_after_fire
+
+def _simulate_chunk(args):
+    seed, paths, simulation, current_net_worth, working_savings, retired_savings, required_savings, stop_at_fire = args
+    rng = np.random.default_rng(seed)
+    real_returns = draw_real_returns(rng, simulation, paths, len(working_savings))
+    return simulate_paths(current_net_worth, working_savings, retired_savings, required_savings, stop_at_fire, real_returns)
+
+def parse_simulation(data):
+    simulation = dict(data.get('simulation', {}))
+    simulation['paths'] = int(simulation.get('paths', DEFAULT_PATHS))
+    if not 1 <= simulation['paths'] <= MAX_PATHS:
+        raise ValueError(f'paths must be between 1 and {MAX_PATHS}')
+    simulation.setdefault('model', 'distribution')
+    if simulation['model'] not in ('distribution', 'bootstrap'):
+        raise ValueError(f"Unknown model: {simulation['model']}")
+    simulation['returns'] = {'mean': data['annualReturn'], 'stdev': DEFAULT_RETURN_STDEV,
+                             **simulation.get('returns', {})}
+    simulation['inflation'] = {'mean': data['inflationRate'], 'stdev': DEFAULT_INFLATION_STDEV,
+                               **simulation.get('inflation', {})}
+    simulation['percentiles'] = simulation.get('percentiles', DEFAULT_PERCENTILES)
+    return simulation
+
+def run_monte_carlo(data):
+    data = parse_calculate_config(data)
+    # Returns are drawn per year, so there's no finer schedule to step through
+    if data.get('granularity', 'yearly') != 'yearly':
+        raise ValidationError('Monte Carlo simulations only support yearly granularity')
+    simulation = parse_simulation(data)
+    paths = simulation['paths']
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    years = list(range(current_age, end_age + 1))
+    if paths * len(years) > MAX_PATH_YEARS:
+        raise ValueError(f'{paths} paths x {len(years)} years is more than the limit of {MAX_PATH_YEARS} path-years')
+    current_net_worth = data.get('currentNetWorth', 0)
+    retirement_spending = data['retirementSpending']
+    required_savings = retirement_spending / (data['withdrawalRate'] / 100)
+    stop_at_fire = data.get('stopAtFire', False)
+
+    # Income, spending and tax are deterministic, so every path shares them
+    _, spending, total_available_income, _ = build_cash_flows(data)
+    working_savings = total_available_income - spending
+    retired_savings = np.full(len(years), -float(retirement_spending))
+
+    # Clamped to the pool: each worker is a task on it
+    workers = min(int(simulation.get('workers', WORKER_PROCESSES if paths >= PARALLEL_PATH_THRESHOLD else 1)), WORKER_PROCESSES)
+    chunk_sizes = [len(chunk) for chunk in np.array_split(np.arange(paths), max(1, min(workers, paths)))]
+    seeds = np.random.SeedSequence(simulation.get('seed')).spawn(len(chunk_sizes))
+    tasks = [
+        (seed, size, simulation, current_net_worth, working_savings, retired_savings, required_savings, stop_at_fire)
+        for seed, size in zip(seeds, chunk_sizes)
+    ]
+    if len(tasks) > 1:
+        chunks = list(get_process_pool().map(_simulate_chunk, tasks))
+    else:
+        chunks = [_simulate_chunk(tasks[0])]
+    fire_index = np.concatenate([chunk[0] for chunk in chunks])
+    real_net_worth = np.concatenate([chunk[1] for chunk in chunks])
+
+    fired = fire_index >= 0
+    success, _ = path_success(fire_index, real_net_worth)
+
+    fire_ages = np.array(years)[fire_index[fired]]
+    ages, counts = np.unique(fire_ages, return_counts=True)
+    percentiles = simulation['percentiles']
+    if len(fire_ages):
+        fire_age_percentiles = {str(p): float(age) for p, age in zip(percentiles, np.percentile(fire_ages, percentiles))}
+    else:
+        fire_age_percentiles = {str(p): None for p in percentiles}
+    bands = np.percentile(real_net_worth, percentiles, axis=0)
+
+    return {
+        'years': years,
+        'paths': paths,
+        'requiredSavings': required_savings,
+        'successProbability': float(success.mean()),
+        'fireProbability': float(fired.mean()),
+        'fireAgeDistribution': {
+            'ages': ages.tolist(),
+            'probabilities': (counts / paths).tolist()
+        },
+        'fireAgePercentiles': fire_age_percentiles,
+        'realNetWorthPercentiles': {str(p): band.tolist() for p, band in zip(percentiles, bands)}
+    }
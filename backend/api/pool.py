@@ -0,0 +1,22 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes for CPU-heavy endpoints (Monte Carlo, sweeps, batches)
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """Lazily create the process pool shared by every request in this worker"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn instead of fork: gunicorn workers run request threads
+            _pool = ProcessPoolExecutor(
+                max_workers=WORKER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
@@ -0,0 +1,153 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+# Fraction of requests profiled with cProfile (saved as pstats)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+# Requests at least this slow keep their stack samples (saved as collapsed stacks); 0 disables
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 0))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5))
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'fire_profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 50))
+
+PROFILE_NAME_PATTERN = re.compile(r'^[\w.-]+\.(pstats|folded)$')
+
+def collapse_stack(frame):
+    """Root-first `function (file:line);...` line in the collapsed-stack format flame graph tools read"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class StackSampler:
+    """One background thread sampling the stacks of every registered request thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._targets[thread_id] = Counter()
+            # Started lazily, and again in a forked worker where the thread no longer exists
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._targets
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+class RequestProfiler:
+    """cProfile on a sampled fraction of requests, stack sampling kept only for slow ones"""
+
+    def __init__(self, directory, sample_rate, slow_ms, max_files, interval_ms=PROFILE_SAMPLE_INTERVAL_MS):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.max_files = max_files
+        self.sampler = StackSampler(interval_ms / 1000) if slow_ms > 0 else None
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Handle to pass to finish(), or None when this request isn't profiled"""
+        if self.sample_rate and random.random() < self.sample_rate:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                return ('cprofile', profile)
+            except ValueError:
+                # Another profiler is active on this interpreter, e.g. a concurrent request's
+                pass
+        if self.sampler is not None:
+            thread_id = threading.get_ident()
+            self.sampler.start(thread_id)
+            return ('sampler', thread_id)
+        return None
+
+    def finish(self, handle, duration, label):
+        """Stop profiling; returns the saved file name, if any"""
+        if handle is None:
+            return None
+        kind, target = handle
+        duration_ms = duration * 1000
+        stem = f'{time.strftime("%Y%m%dT%H%M%S")}-{int(duration_ms)}ms-{slugify(label)}-{uuid.uuid4().hex[:8]}'
+        if kind == 'cprofile':
+            target.disable()
+            name = f'{stem}.pstats'
+            target.dump_stats(os.path.join(self.directory, name))
+        else:
+            stacks = self.sampler.stop(target)
+            if duration_ms < self.slow_ms or not stacks:
+                return None
+            name = f'{stem}.folded'
+            with open(os.path.join(self.directory, name), 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        self.prune()
+        return name
+
+    def prune(self):
+        """Keep only the newest max_files profiles"""
+        profiles = self.list()
+        for profile in profiles[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, profile['name']))
+            except FileNotFoundError:
+                pass
+
+    def list(self):
+        """Saved profiles, newest first"""
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if PROFILE_NAME_PATTERN.match(entry.name):
+                stat = entry.stat()
+                profiles.append({'name': entry.name, 'size': stat.st_size, 'createdAt': stat.st_mtime})
+        return sorted(profiles, key=lambda profile: profile['createdAt'], reverse=True)
+
+    def path(self, name):
+        """Path of a saved profile; None for unknown or unsafe names"""
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+def slugify(text):
+    return re.sub(r'[^\w]+', '_', text).strip('_')[:60]
+
+def create_profiler():
+    """Process profiler, or None when both sampling and the slow threshold are off"""
+    if PROFILE_SAMPLE_RATE <= 0 and PROFILE_SLOW_MS <= 0:
+        return None
+    return RequestProfiler(PROFILE_DIR, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_MAX_FILES)
@@ -0,0 +1,394 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from .calculator import calculate_fire_projection, calculate_fire_summary, fire_not_possible_error
+from .metrics import phase
+from .tax import calculate_tax_batch
+
+
+def build_yearly_array(entries, current_age, end_age):
+    """Expand startAge/endAge entries into a dense per-year array of summed amounts"""
+    length = end_age - current_age + 1
+    if length <= 0 or not entries:
+        return np.zeros(max(length, 0))
+
+    starts = np.array([entry['startAge'] for entry in entries]) - current_age
+    ends = np.array([entry['endAge'] for entry in entries]) - current_age + 1
+    amounts = np.array([entry['amount'] for entry in entries], dtype=float)
+    return dense_from_intervals(starts, ends, amounts, length)
+
+def dense_from_intervals(starts, ends, amounts, length):
+    """Sum of amounts over [start, end) index intervals as a dense array of the given length"""
+    # Clip every interval to the simulated range and drop the empty ones
+    starts = np.clip(starts, 0, length)
+    ends = np.clip(ends, 0, length)
+    valid = starts < ends
+    starts, ends, amounts = starts[valid], ends[valid], amounts[valid]
+
+    # Interval -> dense array: +amount at the start, -amount one past the end, then cumsum
+    deltas = np.zeros(length + 1)
+    counts = np.zeros(length + 1, dtype=np.int64)
+    np.add.at(deltas, starts, amounts)
+    np.add.at(deltas, ends, -amounts)
+    np.add.at(counts, starts, 1)
+    np.add.at(counts, ends, -1)
+
+    # Years with no active entry must be exactly zero, not cumsum rounding residue
+    active = np.cumsum(counts[:-1]) > 0
+    return np.where(active, np.cumsum(deltas[:-1]), 0.0)
+
+
+def calculate_income_tax_array(gross_income, state, pre_tax_401k, employer_match, filing_status=None, tax_year=None):
+    """Vectorized calculate_income_tax over every simulated year"""
+    with phase('tax'):
+        tax_result = calculate_tax_batch(gross_income, state, pre_tax_401k, filing_status, tax_year)
+    earning = gross_income > 0
+    safe_income = np.where(earning, gross_income, 1)
+    total_available_income = np.where(earning, tax_result['afterTaxIncome'] + gross_income * employer_match, 0.0)
+    effective_tax_rate = np.where(earning, tax_result['totalTax'] / safe_income * 100, 0.0)
+    return total_available_income, effective_tax_rate
+
+
+def build_cash_flows(data):
+    """Per-year gross income, spending, available income and effective tax rate for a config"""
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    gross_income = build_yearly_array(data.get('yearlyIncome', []), current_age, end_age)
+    spending = build_yearly_array(data.get('yearlySpending', []), current_age, end_age)
+    total_available_income, effective_tax_rate = calculate_income_tax_array(
+        gross_income, data.get('state', 'CA'), data['preTax401k'], data['employerMatch'] / 100,
+        data.get('filingStatus'), data.get('taxYear')
+    )
+    return gross_income, spending, total_available_income, effective_tax_rate
+
+
+def solve_real_net_worth(current_net_worth, savings, real_return_rate):
+    """Solve W[i] = W[i-1] * (1 + r) + savings[i] with W[0] = current_net_worth"""
+    growth = 1 + real_return_rate
+    if len(savings) == 0:
+        return np.zeros(0)
+    if growth <= 0:
+        real_net_worth = np.empty(len(savings))
+        balance = current_net_worth
+        for i, saving in enumerate(savings):
+            balance = current_net_worth if i == 0 else balance * growth + saving
+            real_net_worth[i] = balance
+        return real_net_worth
+
+    # W[i] = g^i * (W[0] + sum_{k=1..i} savings[k] / g^k)
+    powers = growth ** np.arange(len(savings))
+    discounted = savings / powers
+    discounted[0] = current_net_worth
+    return powers * np.cumsum(discounted)
+
+
+def continue_real_net_worth(real_net_worth, savings, real_return_rate, start_index, current_net_worth):
+    """Keep real_net_worth before start_index and re-solve the recurrence from there on"""
+    if start_index <= 0:
+        return solve_real_net_worth(current_net_worth, savings, real_return_rate)
+    tail = solve_real_net_worth(
+        real_net_worth[start_index - 1], np.concatenate(([0.0], savings[start_index:])), real_return_rate
+    )
+    return np.concatenate((real_net_worth[:start_index], tail[1:]))
+
+
+# Retained per-projection state: the config, per-year cash flows and tax results,
+# and the first-pass (never stopping at FIRE) real net worth
+ProjectionState = namedtuple('ProjectionState', ['config', 'cash_flows', 'first_pass_net_worth'])
+
+def real_return_rate_for(data):
+    return (1 + data['annualReturn'] / 100) / (1 + data['inflationRate'] / 100) - 1
+
+def build_projection_state(data, cash_flows=None):
+    if cash_flows is None:
+        cash_flows = build_cash_flows(data)
+    _, spending, total_available_income, _ = cash_flows
+    with phase('pass1'):
+        first_pass_net_worth = solve_real_net_worth(
+            data.get('currentNetWorth', 0), total_available_income - spending, real_return_rate_for(data)
+        )
+    return ProjectionState(data, cash_flows, first_pass_net_worth)
+
+def projection_result(state):
+    """Projection response for a state: FIRE age, the stopAtFire branch and the per-year series"""
+    data = state.config
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    current_net_worth = data.get('currentNetWorth', 0)
+    inflation_rate = data['inflationRate'] / 100
+    retirement_spending = data['retirementSpending']
+    withdrawal_rate = data['withdrawalRate'] / 100
+    stop_at_fire = data.get('stopAtFire', False)
+
+    # Calculate real return rate and check FIRE possibility
+    real_return_rate = real_return_rate_for(data)
+    fire_possible = withdrawal_rate <= real_return_rate
+    required_savings = retirement_spending / withdrawal_rate
+
+    years = range(current_age, end_age + 1)
+    gross_income, spending, total_available_income, effective_tax_rate = state.cash_flows
+
+    # First pass: FIRE age is the first year the real net worth covers required savings
+    real_net_worth = state.first_pass_net_worth
+    reached = real_net_worth >= required_savings
+    fire_index = int(np.argmax(reached)) if reached.any() else None
+    fire_age = years[fire_index] if fire_index is not None else None
+
+    # Second pass: after FIRE, income stops and spending switches to retirement spending
+    if stop_at_fire and fire_index is not None:
+        with phase('pass2'):
+            retired = np.arange(len(years)) >= fire_index
+            gross_income = np.where(retired, 0.0, gross_income)
+            total_available_income = np.where(retired, 0.0, total_available_income)
+            effective_tax_rate = np.where(retired, 0.0, effective_tax_rate)
+            spending = np.where(retired, float(retirement_spending), spending)
+            # Years before FIRE are the same as in the first pass
+            real_net_worth = continue_real_net_worth(
+                real_net_worth, total_available_income - spending, real_return_rate, fire_index, current_net_worth
+            )
+
+    savings = total_available_income - spending
+    real_interest = np.zeros(len(years))
+    real_interest[1:] = real_net_worth[:-1] * real_return_rate
+
+    # Calculate nominal values from real values
+    nominal_net_worth = real_net_worth * (1 + inflation_rate) ** np.arange(len(years))
+
+    result = {
+        'years': list(years),
+        'nominalNetWorth': nominal_net_worth.tolist(),
+        'realNetWorth': real_net_worth.tolist(),
+        'yearlyPreTaxIncome': gross_income.tolist(),
+        'yearlyAfterTaxIncome': total_available_income.tolist(),
+        'yearlySpending': spending.tolist(),
+        'yearlyTaxRates': effective_tax_rate.tolist(),
+        'yearlySavings': savings.tolist(),
+        'yearlyRealInterest': real_interest.tolist(),
+        'fireAge': fire_age,
+        'requiredSavings': required_savings
+    }
+
+    if not fire_possible:
+        result['error'] = fire_not_possible_error(withdrawal_rate, real_return_rate)
+        result['fireAge'] = None
+
+    return result
+
+
+def calculate_fire_projection_vectorized(data, cash_flows=None):
+    """Array version of calculate_fire_projection; cash_flows may be reused from build_cash_flows"""
+    if data.get('summaryOnly'):
+        return calculate_fire_summary(data)
+    return projection_result(build_projection_state(data, cash_flows))
+
+
+# Patched fields that change every year's returns or taxes
+FULL_RECOMPUTE_FIELDS = {
+    'currentAge', 'endAge', 'currentNetWorth', 'annualReturn', 'inflationRate',
+    'state', 'preTax401k', 'employerMatch', 'filingStatus', 'taxYear'
+}
+
+def first_difference(old, new):
+    differs = np.nonzero(old != new)[0]
+    return int(differs[0]) if len(differs) else len(old)
+
+def apply_projection_delta(state, patch):
+    """New state for the patched config, recomputed only from the earliest affected year
+
+    Returns the state and that year's index (the length of the timeline when no year changed).
+    retirementSpending, withdrawalRate and stopAtFire leave the state untouched: projection_result
+    re-derives fireAge and the stopAtFire branch from it.
+    """
+    config = {**state.config, **patch}
+    changed = {key for key, value in patch.items() if state.config.get(key) != value}
+    if changed & FULL_RECOMPUTE_FIELDS:
+        return build_projection_state(config), 0
+
+    gross_income, spending, total_available_income, effective_tax_rate = state.cash_flows
+    start_index = len(gross_income)
+    if 'yearlyIncome' in changed:
+        new_gross_income = build_yearly_array(config.get('yearlyIncome', []), config['currentAge'], config['endAge'])
+        income_index = first_difference(gross_income, new_gross_income)
+        if income_index < len(gross_income):
+            # Only years from the first changed income onward need new tax results
+            tail_available_income, tail_tax_rate = calculate_income_tax_array(
+                new_gross_income[income_index:], config.get('state', 'CA'),
+                config['preTax401k'], config['employerMatch'] / 100,
+                config.get('filingStatus'), config.get('taxYear')
+            )
+            total_available_income = np.concatenate((total_available_income[:income_index], tail_available_income))
+            effective_tax_rate = np.concatenate((effective_tax_rate[:income_index], tail_tax_rate))
+        gross_income = new_gross_income
+        start_index = min(start_index, income_index)
+    if 'yearlySpending' in changed:
+        new_spending = build_yearly_array(config.get('yearlySpending', []), config['currentAge'], config['endAge'])
+        start_index = min(start_index, first_difference(spending, new_spending))
+        spending = new_spending
+
+    first_pass_net_worth = state.first_pass_net_worth
+    if start_index < len(gross_income):
+        first_pass_net_worth = continue_real_net_worth(
+            first_pass_net_worth, total_available_income - spending, real_return_rate_for(config),
+            start_index, config.get('currentNetWorth', 0)
+        )
+    cash_flows = (gross_income, spending, total_available_income, effective_tax_rate)
+    return ProjectionState(config, cash_flows, first_pass_net_worth), start_index
+
+
+# Steps per year for the `granularity` option; taxes are still computed once per tax year
+STEPS_PER_YEAR = {'yearly': 1, 'monthly': 12, 'biweekly': 26}
+# Per-step flows (summed when downsampling); the net worth series are sampled instead
+FLOW_KEYS = ('yearlyPreTaxIncome', 'yearlyAfterTaxIncome', 'yearlySpending', 'yearlySavings', 'yearlyRealInterest')
+STOCK_KEYS = ('nominalNetWorth', 'realNetWorth')
+
+def build_step_array(entries, current_age, end_age, steps_per_year):
+    """Per-step amounts: each entry's yearly amount spread evenly over its steps
+
+    An entry covers ages startAge <= age < endAge + 1, so fractional ages start or stop it mid-year.
+    """
+    length = (end_age - current_age + 1) * steps_per_year
+    if length <= 0 or not entries:
+        return np.zeros(max(length, 0))
+    # Rounding first keeps ages like 35.25 on the step they name despite float error
+    starts = np.ceil(np.round((np.array([entry['startAge'] for entry in entries]) - current_age) * steps_per_year, 9))
+    ends = np.ceil(np.round((np.array([entry['endAge'] for entry in entries]) - current_age + 1) * steps_per_year, 9))
+    amounts = np.array([entry['amount'] for entry in entries], dtype=float) / steps_per_year
+    return dense_from_intervals(starts.astype(np.int64), ends.astype(np.int64), amounts, length)
+
+def step_income_after_tax(gross_income, steps_per_year, data):
+    """Available income and effective tax rate per step, taxing each tax year's total income once"""
+    annual_gross = gross_income.reshape(-1, steps_per_year).sum(axis=1)
+    annual_available, annual_tax_rate = calculate_income_tax_array(
+        annual_gross, data.get('state', 'CA'), data['preTax401k'], data['employerMatch'] / 100,
+        data.get('filingStatus'), data.get('taxYear')
+    )
+    # Each step keeps its share of the year's available income
+    share = np.divide(annual_available, annual_gross, out=np.zeros(len(annual_gross)), where=annual_gross > 0)
+    earning = gross_income > 0
+    available = gross_income * np.repeat(share, steps_per_year)
+    tax_rate = np.where(earning, np.repeat(annual_tax_rate, steps_per_year), 0.0)
+    return available, tax_rate
+
+def calculate_fire_projection_granular(data):
+    """Projection stepped monthly or bi-weekly; `years` holds the (fractional) age at each step"""
+    granularity = data.get('granularity', 'yearly')
+    if granularity not in STEPS_PER_YEAR:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    steps_per_year = STEPS_PER_YEAR[granularity]
+    current_age = data['currentAge']
+    end_age = data['endAge']
+    current_net_worth = data.get('currentNetWorth', 0)
+    inflation_rate = data['inflationRate'] / 100
+    retirement_spending = data['retirementSpending']
+    withdrawal_rate = data['withdrawalRate'] / 100
+    real_return_rate = real_return_rate_for(data)
+    required_savings = retirement_spending / withdrawal_rate
+    step_return_rate = (1 + real_return_rate) ** (1 / steps_per_year) - 1 if real_return_rate > -1 else real_return_rate
+
+    length = max(end_age - current_age + 1, 0) * steps_per_year
+    ages = current_age + np.arange(length) / steps_per_year
+    gross_income = build_step_array(data.get('yearlyIncome', []), current_age, end_age, steps_per_year)
+    spending = build_step_array(data.get('yearlySpending', []), current_age, end_age, steps_per_year)
+    total_available_income, effective_tax_rate = step_income_after_tax(gross_income, steps_per_year, data)
+
+    with phase('pass1'):
+        real_net_worth = solve_real_net_worth(current_net_worth, total_available_income - spending, step_return_rate)
+        reached = real_net_worth >= required_savings
+        fire_index = int(np.argmax(reached)) if reached.any() else None
+
+    if data.get('stopAtFire', False) and fire_index is not None:
+        with phase('pass2'):
+            retired = np.arange(length) >= fire_index
+            gross_income = np.where(retired, 0.0, gross_income)
+            spending = np.where(retired, retirement_spending / steps_per_year, spending)
+            # The FIRE year's income shrinks, so its tax is recomputed on the new annual total
+            total_available_income, effective_tax_rate = step_income_after_tax(gross_income, steps_per_year, data)
+            real_net_worth = continue_real_net_worth(
+                real_net_worth, total_available_income - spending, step_return_rate, fire_index, current_net_worth
+            )
+
+    real_interest = np.zeros(length)
+    real_interest[1:] = real_net_worth[:-1] * step_return_rate
+    result = {
+        'granularity': granularity,
+        'years': np.round(ages, 6),
+        'nominalNetWorth': real_net_worth * (1 + inflation_rate) ** (np.arange(length) / steps_per_year),
+        'realNetWorth': real_net_worth,
+        'yearlyPreTaxIncome': gross_income,
+        'yearlyAfterTaxIncome': total_available_income,
+        'yearlySpending': spending,
+        'yearlyTaxRates': effective_tax_rate,
+        'yearlySavings': total_available_income - spending,
+        'yearlyRealInterest': real_interest,
+        'fireAge': round(float(ages[fire_index]), 6) if fire_index is not None else None,
+        'requiredSavings': required_savings
+    }
+    if withdrawal_rate > real_return_rate:
+        result['error'] = fire_not_possible_error(withdrawal_rate, real_return_rate)
+        result['fireAge'] = None
+    return result
+
+def downsample_factor(downsample, steps_per_year):
+    """Steps per output point for the `downsample` option: 'yearly', 'quarterly' or a step count"""
+    if downsample == 'yearly':
+        return steps_per_year
+    if downsample == 'quarterly':
+        return max(1, round(steps_per_year / 4))
+    if isinstance(downsample, int) and not isinstance(downsample, bool) and downsample >= 1:
+        return downsample
+    raise ValueError(f'Unknown downsample option: {downsample}')
+
+def downsample_projection(result, factor):
+    """One point per `factor` steps: flows summed, net worth and age at each bucket's first step"""
+    if factor == 1:
+        return result
+    length = len(result['years'])
+    starts = np.arange(0, length, factor)
+    downsampled = dict(result)
+    downsampled['years'] = np.asarray(result['years'])[starts]
+    for key in STOCK_KEYS:
+        downsampled[key] = np.asarray(result[key], dtype=float)[starts]
+    for key in FLOW_KEYS:
+        downsampled[key] = np.add.reduceat(np.asarray(result[key], dtype=float), starts) if length else np.zeros(0)
+    # Tax rate of a bucket: its total tax over its total pre-tax income
+    gross = np.asarray(result['yearlyPreTaxIncome'], dtype=float)
+    taxed = gross * np.asarray(result['yearlyTaxRates'], dtype=float)
+    if length:
+        bucket_gross = np.add.reduceat(gross, starts)
+        downsampled['yearlyTaxRates'] = np.divide(
+            np.add.reduceat(taxed, starts), bucket_gross, out=np.zeros(len(starts)), where=bucket_gross > 0
+        )
+    else:
+        downsampled['yearlyTaxRates'] = np.zeros(0)
+    downsampled['stepsPerPoint'] = factor
+    return downsampled
+
+def finalize_series(result):
+    """Plain lists for JSON, converted once after any downsampling"""
+    return {key: value.tolist() if isinstance(value, np.ndarray) else value for key, value in result.items()}
+
+# Projection engines selectable per request with the `engine` field
+PROJECTION_ENGINES = {
+    'loop': calculate_fire_projection,
+    'vectorized': calculate_fire_projection_vectorized
+}
+DEFAULT_PROJECTION_ENGINE = os.getenv('PROJECTION_ENGINE', 'vectorized')
+
+def run_projection(data):
+    granularity = data.get('granularity', 'yearly')
+    if granularity not in STEPS_PER_YEAR:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    if granularity == 'yearly':
+        engine = data.get('engine', DEFAULT_PROJECTION_ENGINE)
+        if engine not in PROJECTION_ENGINES:
+            raise ValueError(f'Unknown projection engine: {engine}')
+        result = PROJECTION_ENGINES[engine](data)
+    else:
+        result = calculate_fire_projection_granular(data)
+        if data.get('summaryOnly'):
+            return {key: result[key] for key in ('fireAge', 'requiredSavings', 'error') if key in result}
+    if data.get('downsample') and 'years' in result:
+        result = downsample_projection(result, downsample_factor(data['downsample'], STEPS_PER_YEAR[granularity]))
+    return finalize_series(result)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from .cache import LRUCache
+
+RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'memory')
+RESULT_CACHE_SIZE = int(os.getenv('RESULT_CACHE_SIZE', 1024))
+RESULT_CACHE_TTL = float(os.getenv('RESULT_CACHE_TTL', 3600))
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'fire_result_cache.sqlite3'))
+
+# Entry fields that affect the projection; anything else (e.g. the frontend's `id`) is dropped
+ENTRY_FIELDS = ('startAge', 'endAge', 'amount')
+ENTRY_LISTS = ('yearlyIncome', 'yearlySpending')
+
+def _canonical_number(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def canonicalize_config(data):
+    """Config with entry ids dropped, entries sorted and integral floats normalized"""
+    config = {}
+    for key, value in data.items():
+        if key in ENTRY_LISTS:
+            entries = [
+                {field: _canonical_number(entry.get(field)) for field in ENTRY_FIELDS}
+                for entry in value
+            ]
+            config[key] = sorted(entries, key=lambda entry: json.dumps(entry, sort_keys=True))
+        else:
+            config[key] = _canonical_number(value)
+    return config
+
+def config_hash(data):
+    """Stable hash of a config: equal for semantically identical payloads"""
+    canonical = json.dumps(canonicalize_config(data), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class MemoryBackend:
+    """Per-process LRU store; each gunicorn worker has its own"""
+    name = 'memory'
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = LRUCache(maxsize)
+
+    def get(self, key):
+        entry = self._cache.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1], entry[2]
+
+    def set(self, key, body, compute_ms):
+        self._cache.set(key, (time.time() + self.ttl, body, compute_ms))
+
+    def size(self):
+        return self._cache.stats()['size']
+
+    def clear(self):
+        self._cache.clear()
+
+class SqliteBackend:
+    """SQLite file store shared by every worker process on the host"""
+    name = 'sqlite'
+
+    def __init__(self, path, maxsize, ttl):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results '
+                '(key TEXT PRIMARY KEY, body BLOB, compute_ms REAL, expires_at REAL, accessed_at REAL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def get(self, key):
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            'SELECT body, compute_ms FROM results WHERE key = ? AND expires_at >= ?', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+        return bytes(row[0]), row[1]
+
+    def set(self, key, body, compute_ms):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+            (key, body, compute_ms, now + self.ttl, now)
+        )
+        # Drop expired rows, then the least recently used ones above the size bound
+        connection.execute('DELETE FROM results WHERE expires_at < ?', (now,))
+        connection.execute(
+            'DELETE FROM results WHERE key IN '
+            '(SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,)
+        )
+
+    def size(self):
+        return self._connection().execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def clear(self):
+        self._connection().execute('DELETE FROM results')
+
+class ResultCache:
+    """Projection responses keyed on config_hash, with hit/miss and latency-saved counters"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def get(self, key):
+        """(body, saved_ms) on a hit, None on a miss"""
+        started = time.perf_counter()
+        entry = self.backend.get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            body, compute_ms = entry
+            saved_ms = max(0.0, compute_ms - (time.perf_counter() - started) * 1000)
+            self.hits += 1
+            self.saved_ms += saved_ms
+            return body, saved_ms
+
+    def set(self, key, body, compute_ms):
+        self.backend.set(key, body, compute_ms)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+            self.saved_ms = 0.0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend.name,
+                'size': self.backend.size(),
+                'maxsize': self.backend.maxsize,
+                'ttl': self.backend.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0,
+                'savedMs': self.saved_ms
+            }
+
+def create_result_cache(backend=RESULT_CACHE_BACKEND):
+    if backend == 'none':
+        return None
+    if backend == 'memory':
+        return ResultCache(MemoryBackend(RESULT_CACHE_SIZE, RESULT_CACHE_TTL))
+    if backend == 'sqlite':
+        return ResultCache(SqliteBackend(RESULT_CACHE_PATH, RESULT_CACHE_SIZE, RESULT_CACHE_TTL))
+    raise ValueError(f'Unknown result cache backend: {backend}')
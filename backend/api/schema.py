@@ -0,0 +1,182 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from .projection import PROJECTION_ENGINES, STEPS_PER_YEAR, downsample_factor
+from .tax_tables import FILING_STATUSES, get_tax_tables
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Longest projection accepted, so one request can't allocate arbitrarily large arrays
+MAX_PROJECTION_YEARS = int(os.getenv('MAX_PROJECTION_YEARS', 200))
+
+REQUIRED_NUMBERS = (
+    'currentAge', 'endAge', 'annualReturn', 'inflationRate', 'retirementSpending', 'withdrawalRate',
+    'preTax401k', 'employerMatch'
+)
+ENTRY_LISTS = ('yearlyIncome', 'yearlySpending')
+NUMBER_TYPES = (int, float)
+
+class ValidationError(ValueError):
+    """A payload rejected before any computation; routes turn it into a 400"""
+
+def decode_json(body):
+    """orjson when installed (several times faster than the stdlib), json otherwise"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def check_number(value, name):
+    if not is_number(value):
+        raise ValidationError(f'{name} must be a finite number')
+    return value
+
+def check_age(value, name):
+    check_number(value, name)
+    if value != int(value):
+        raise ValidationError(f'{name} must be a whole number of years')
+    # 30.0 -> 30, so the yearly engines can index with it
+    return int(value)
+
+def entry_error(entries, name, fractional_ages):
+    """The first invalid entry's error, found the slow way once the fast path has failed"""
+    if not isinstance(entries, list):
+        return ValidationError(f'{name} must be a list')
+    check_entry_age = check_number if fractional_ages else check_age
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            return ValidationError(f'{name}[{i}] must be an object')
+        try:
+            start = check_entry_age(entry.get('startAge'), f'{name}[{i}].startAge')
+            end = check_entry_age(entry.get('endAge'), f'{name}[{i}].endAge')
+            check_number(entry.get('amount'), f'{name}[{i}].amount')
+        except ValidationError as e:
+            return e
+        if end < start:
+            return ValidationError(f'{name}[{i}].endAge must not be before startAge')
+    return ValidationError(f'{name} is invalid')
+
+def normalize_entries(entries, name, current_age, end_age, fractional_ages=False):
+    """Entries as sorted, non-overlapping {startAge, endAge, amount} runs clipped to [current_age, end_age]
+
+    Overlapping entries are summed, adjacent runs with equal amounts merged and years without
+    any amount dropped, so the engines see each distinct run once. An entry covers
+    startAge <= age < endAge + 1, which also holds for fractional ages.
+    """
+    if not entries:
+        if isinstance(entries, list):
+            return []
+        raise entry_error(entries, name, fractional_ages)
+    # Checked as whole columns; entry_error only runs to name the bad entry
+    try:
+        starts = [entry['startAge'] for entry in entries]
+        ends = [entry['endAge'] for entry in entries]
+        amounts = [entry['amount'] for entry in entries]
+    except (KeyError, TypeError):
+        raise entry_error(entries, name, fractional_ages)
+    if not (isinstance(entries, list) and all(type(value) in NUMBER_TYPES for value in starts + ends + amounts)):
+        raise entry_error(entries, name, fractional_ages)
+    starts = np.array(starts, dtype=float)
+    stops = np.array(ends, dtype=float) + 1
+    amounts = np.array(amounts, dtype=float)
+    if not (np.isfinite(starts).all() and np.isfinite(stops).all() and np.isfinite(amounts).all()) \
+            or (stops <= starts).any() \
+            or not fractional_ages and ((starts != np.floor(starts)).any() or (stops != np.floor(stops)).any()):
+        raise entry_error(entries, name, fractional_ages)
+
+    starts = np.maximum(starts, current_age)
+    stops = np.minimum(stops, end_age + 1)
+    keep = (starts < stops) & (amounts != 0)
+    starts, stops, amounts = starts[keep], stops[keep], amounts[keep]
+    if not len(amounts):
+        return []
+
+    # Sweep over the distinct edges: the running sum of amounts between consecutive edges
+    edges = np.unique(np.concatenate([starts, stops]))
+    start_index = np.searchsorted(edges, starts)
+    stop_index = np.searchsorted(edges, stops)
+    deltas = np.bincount(start_index, amounts, len(edges)) - np.bincount(stop_index, amounts, len(edges))
+    counts = np.bincount(start_index, minlength=len(edges)) - np.bincount(stop_index, minlength=len(edges))
+    run_amounts = np.cumsum(deltas)[:-1]
+    active = (np.cumsum(counts)[:-1] > 0) & (run_amounts != 0)
+    if not active.any():
+        return []
+
+    # Merge neighbouring runs that touch and have the same amount
+    run_starts, run_stops, run_amounts = edges[:-1][active], edges[1:][active], run_amounts[active]
+    continues = (run_starts[1:] == run_stops[:-1]) & (run_amounts[1:] == run_amounts[:-1])
+    first = np.concatenate([[True], ~continues])
+    last = np.concatenate([~continues, [True]])
+    if not fractional_ages:
+        run_starts, run_stops = run_starts.astype(np.int64), run_stops.astype(np.int64)
+    return [
+        {'startAge': start, 'endAge': stop - 1, 'amount': amount}
+        for start, stop, amount in zip(run_starts[first].tolist(), run_stops[last].tolist(), run_amounts[first].tolist())
+    ]
+
+def parse_calculate_config(data, clip_entries=True):
+    """Validated copy of a /api/calculate payload with normalized income and spending entries
+
+    Raises ValidationError for anything the engines would fail on part way through. Retained
+    configs pass clip_entries=False so a later delta that moves the ages keeps every entry.
+    """
+    if not isinstance(data, dict):
+        raise ValidationError('The request body must be a JSON object')
+    for name in REQUIRED_NUMBERS:
+        if name not in data:
+            raise ValidationError(f'Missing required field: {name}')
+        check_number(data[name], name)
+    current_age = check_age(data['currentAge'], 'currentAge')
+    end_age = check_age(data['endAge'], 'endAge')
+    if end_age < current_age:
+        raise ValidationError('endAge must not be before currentAge')
+    if end_age - current_age + 1 > MAX_PROJECTION_YEARS:
+        raise ValidationError(f'Projections are limited to {MAX_PROJECTION_YEARS} years')
+    if data['withdrawalRate'] <= 0:
+        raise ValidationError('withdrawalRate must be positive')
+    for name in ('annualReturn', 'inflationRate'):
+        if data[name] <= -100:
+            raise ValidationError(f'{name} must be greater than -100')
+    if 'currentNetWorth' in data:
+        check_number(data['currentNetWorth'], 'currentNetWorth')
+    if not isinstance(data.get('state', ''), str):
+        raise ValidationError('state must be a string')
+    for name in ('stopAtFire', 'summaryOnly', 'retainState'):
+        if not isinstance(data.get(name, False), bool):
+            raise ValidationError(f'{name} must be true or false')
+    if data.get('filingStatus') is not None and data['filingStatus'] not in FILING_STATUSES:
+        raise ValidationError(f"filingStatus must be one of: {', '.join(FILING_STATUSES)}")
+    if data.get('taxYear') is not None and (not isinstance(data['taxYear'], int) or isinstance(data['taxYear'], bool)):
+        raise ValidationError('taxYear must be an integer')
+    try:
+        # The engines default to CA; an unknown state or year would otherwise fail mid-projection
+        get_tax_tables(data.get('state', 'CA'), data.get('filingStatus'), data.get('taxYear'))
+    except ValueError as e:
+        raise ValidationError(str(e))
+    granularity = data.get('granularity', 'yearly')
+    if granularity not in STEPS_PER_YEAR:
+        raise ValidationError(f"granularity must be one of: {', '.join(STEPS_PER_YEAR)}")
+    if data.get('downsample'):
+        try:
+            downsample_factor(data['downsample'], STEPS_PER_YEAR[granularity])
+        except ValueError:
+            raise ValidationError("downsample must be 'yearly', 'quarterly' or a positive whole number of steps")
+    # Retained states (for /api/calculate/delta) hold full yearly arrays only
+    if data.get('retainState') and (granularity != 'yearly' or data.get('downsample') or data.get('summaryOnly')):
+        raise ValidationError('retainState only supports yearly granularity without downsample or summaryOnly')
+    if 'engine' in data and data['engine'] not in PROJECTION_ENGINES:
+        raise ValidationError(f"engine must be one of: {', '.join(PROJECTION_ENGINES)}")
+
+    config = {**data, 'currentAge': current_age, 'endAge': end_age}
+    low, high = (current_age, end_age) if clip_entries else (-math.inf, math.inf)
+    for name in ENTRY_LISTS:
+        config[name] = normalize_entries(data.get(name, []), name, low, high, granularity != 'yearly')
+    return config
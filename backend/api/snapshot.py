@@ -0,0 +1,41 @@
+"""Versioned projection snapshots stored with saved profiles"""
+import hashlib
+import os
+
+from .projection import run_projection
+from .result_cache import config_hash
+from .schema import parse_calculate_config
+from .tax import TAX_TABLE_VERSION
+
+ENGINE_DIR = os.path.dirname(__file__)
+# Modules whose code decides a projection's result
+ENGINE_MODULES = ('calculator.py', 'projection.py', 'schema.py', 'tax.py', 'tax_tables.py')
+
+def engine_version(directory=ENGINE_DIR):
+    """Hash of the engine sources; changes with any edit to them, so no version needs bumping by hand"""
+    digest = hashlib.sha256()
+    for name in ENGINE_MODULES:
+        digest.update(name.encode())
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+# Stored snapshots (and cached calculate responses) from another version are recomputed on next read
+ENGINE_VERSION = engine_version()
+PROJECTION_VERSION = f'{ENGINE_VERSION}-{TAX_TABLE_VERSION}'
+
+def build_projection_snapshot(config):
+    """Versioned projection stored alongside a profile; raises ValidationError for a config the
+    calculate endpoint would reject"""
+    return {
+        'configHash': config_hash(config),
+        'version': PROJECTION_VERSION,
+        'result': run_projection(parse_calculate_config(config))
+    }
+
+def snapshot_is_current(snapshot, config):
+    return (
+        snapshot is not None
+        and snapshot.get('version') == PROJECTION_VERSION
+        and snapshot.get('configHash') == config_hash(config)
+    )
@@ -0,0 +1,128 @@
+from .calculator import calculate_fire_summary, find_fire_age
+from .schema import ValidationError, check_age, check_number, parse_calculate_config
+
+# Free variable -> True when a larger value brings FIRE earlier
+FREE_VARIABLES = {
+    'income': True,
+    'spending': False,
+    'preTax401k': True,
+    'currentNetWorth': True
+}
+# income/spending are solved as a multiplier on every entry amount
+SCALE_VARIABLES = {'income': 'yearlyIncome', 'spending': 'yearlySpending'}
+DEFAULT_TOLERANCE = {'income': 1e-4, 'spending': 1e-4, 'preTax401k': 1, 'currentNetWorth': 1}
+MAX_ITERATIONS = 200
+
+def with_value(data, variable, value):
+    """Config with the free variable set to value"""
+    if variable in SCALE_VARIABLES:
+        field = SCALE_VARIABLES[variable]
+        return {**data, field: [{**entry, 'amount': entry['amount'] * value} for entry in data.get(field, [])]}
+    return {**data, variable: value}
+
+def reaches_target(data, target_age):
+    """Whether FIRE happens by target_age; the solve stops at the target year"""
+    return find_fire_age({**data, 'endAge': min(data['endAge'], target_age)}) is not None
+
+def initial_bracket(data, variable):
+    if variable in SCALE_VARIABLES:
+        return 0, 1
+    if variable == 'preTax401k':
+        # Past the largest income a bigger 401k can't lower tax any further
+        return 0, max([entry['amount'] for entry in data.get('yearlyIncome', [])], default=0)
+    return 0, data['retirementSpending'] / (data['withdrawalRate'] / 100)
+
+def spending_is_unbounded(data, target_age):
+    """Whether no spending multiplier can miss the target: FIRE at currentAge happens before any
+    spending, and only spending in years currentAge + 1 to target_age moves the net worth the
+    target is judged on"""
+    if find_fire_age(data) == data['currentAge']:
+        return True
+    first_age = data['currentAge'] + 1
+    return not any(
+        entry['amount'] and entry['startAge'] <= target_age and entry['endAge'] >= first_age
+        for entry in data.get('yearlySpending', [])
+    )
+
+def solve_for_target(data):
+    if not isinstance(data, dict):
+        raise ValidationError('The request body must be a JSON object')
+    variable = data.get('variable')
+    if variable not in FREE_VARIABLES:
+        raise ValueError(f'Unknown variable: {variable}')
+    config = parse_calculate_config({key: value for key, value in data.items() if key not in ('targetAge', 'variable', 'tolerance')})
+    # find_fire_age steps whole years
+    if config.get('granularity', 'yearly') != 'yearly':
+        raise ValidationError('The solver only supports yearly granularity')
+    target_age = check_age(data.get('targetAge'), 'targetAge')
+    if not config['currentAge'] <= target_age <= config['endAge']:
+        raise ValueError('targetAge must be between currentAge and endAge')
+    tolerance = check_number(data.get('tolerance', DEFAULT_TOLERANCE[variable]), 'tolerance')
+    if tolerance <= 0:
+        raise ValidationError('tolerance must be positive')
+    summary = calculate_fire_summary({**config, 'summaryOnly': True})
+    if 'error' in summary:
+        raise ValueError(summary['error'])
+
+    increasing = FREE_VARIABLES[variable]
+
+    def ok(value):
+        return reaches_target(with_value(config, variable, value), target_age)
+
+    # `good` always reaches the target, `bad` never does
+    low, high = initial_bracket(config, variable)
+    good, bad = (high, low) if increasing else (low, high)
+    iterations = 0
+    if increasing and ok(low):
+        good = bad = low
+    elif not ok(good):
+        if increasing and variable in SCALE_VARIABLES:
+            # Grow the income multiplier until the target is reachable
+            while not ok(good):
+                iterations += 1
+                if iterations > MAX_ITERATIONS or good > 1e6:
+                    raise ValueError(f'No {variable} reaches FIRE by age {target_age}')
+                bad, good = good, good * 2
+        else:
+            raise ValueError(f'No {variable} reaches FIRE by age {target_age}')
+    elif not increasing:
+        if spending_is_unbounded(config, target_age):
+            return {
+                'variable': variable,
+                'value': None,
+                'unbounded': True,
+                'targetAge': target_age,
+                'fireAge': find_fire_age(config),
+                'iterations': iterations,
+                SCALE_VARIABLES[variable]: config.get(SCALE_VARIABLES[variable], [])
+            }
+        # Grow the spending multiplier until the target is missed
+        while ok(bad):
+            iterations += 1
+            if iterations > MAX_ITERATIONS:
+                raise ValueError(f'Could not bound {variable} for FIRE by age {target_age}')
+            good, bad = bad, bad * 2
+
+    # Bisection on the monotone reaches-target predicate
+    while abs(good - bad) > tolerance:
+        iterations += 1
+        if iterations > MAX_ITERATIONS:
+            raise ValueError(f'{variable} did not converge to within {tolerance} in {MAX_ITERATIONS} iterations')
+        middle = (good + bad) / 2
+        if ok(middle):
+            good = middle
+        else:
+            bad = middle
+
+    solved = with_value(config, variable, good)
+    result = {
+        'variable': variable,
+        'value': good,
+        'targetAge': target_age,
+        'fireAge': find_fire_age(solved),
+        'iterations': iterations
+    }
+    if variable in SCALE_VARIABLES:
+        field = SCALE_VARIABLES[variable]
+        result[field] = solved.get(field, [])
+    return result
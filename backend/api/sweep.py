@@ -0,0 +1,100 @@
+import itertools
+import os
+
+import numpy as np
+
+from .pool import WORKER_PROCESSES, get_process_pool
+from .projection import build_cash_flows, calculate_fire_projection_vectorized
+from .schema import ValidationError, parse_calculate_config
+
+MAX_SWEEP_CELLS = int(os.getenv('MAX_SWEEP_CELLS', 10000))
+# Sweeps with at least this many cells are evaluated across the process pool
+PARALLEL_CELL_THRESHOLD = int(os.getenv('SWEEP_PARALLEL_THRESHOLD', 500))
+
+# Config fields that change the per-year income, spending or tax arrays
+CASH_FLOW_FIELDS = {
+    'currentAge', 'endAge', 'yearlyIncome', 'yearlySpending',
+    'state', 'preTax401k', 'employerMatch', 'filingStatus', 'taxYear', 'incomeScale', 'spendingScale'
+}
+# Derived axes that scale every income/spending entry amount
+SCALE_FIELDS = {'incomeScale': 'yearlyIncome', 'spendingScale': 'yearlySpending'}
+# Response-shape options of /api/calculate; each cell is reduced to a few numbers anyway
+OUTPUT_FIELDS = ('summaryOnly', 'downsample', 'retainState')
+
+def apply_cell(base, names, values):
+    """Config for one grid cell: the base config with the axis values substituted"""
+    config = {**base, **dict(zip(names, values))}
+    for scale_field, entries_field in SCALE_FIELDS.items():
+        scale = config.pop(scale_field, None)
+        if scale is not None:
+            config[entries_field] = [
+                {**entry, 'amount': entry['amount'] * scale} for entry in config.get(entries_field, [])
+            ]
+    return config
+
+def evaluate_group(args):
+    """Evaluate cells that share cash-flow axis values, building the income/tax arrays once"""
+    base, names, cells = args
+    cash_flows = None
+    results = []
+    for values in cells:
+        config = apply_cell(base, names, values)
+        if cash_flows is None:
+            cash_flows = build_cash_flows(config)
+        projection = calculate_fire_projection_vectorized(config, cash_flows)
+        real_net_worth = projection['realNetWorth']
+        results.append((
+            projection['fireAge'],
+            projection['requiredSavings'],
+            real_net_worth[-1] if real_net_worth else None
+        ))
+    return results
+
+def run_sweep(data):
+    base = parse_calculate_config(data['base'])
+    # Cells share yearly cash flows
+    if base.get('granularity', 'yearly') != 'yearly':
+        raise ValidationError('Sweeps only support yearly granularity')
+    base = {key: value for key, value in base.items() if key not in OUTPUT_FIELDS}
+    axes = data['axes']
+    if not axes:
+        raise ValueError('At least one axis is required')
+    names = [axis['name'] for axis in axes]
+    value_lists = [axis['values'] for axis in axes]
+    shape = [len(values) for values in value_lists]
+    cell_count = int(np.prod(shape))
+    if cell_count > MAX_SWEEP_CELLS:
+        raise ValueError(f'Sweep has {cell_count} cells, the limit is {MAX_SWEEP_CELLS}')
+
+    # Group cells by their cash-flow axis values: a changed return rate doesn't need new taxes
+    cash_flow_axes = [i for i, name in enumerate(names) if name in CASH_FLOW_FIELDS]
+    groups = {}
+    for index, values in enumerate(itertools.product(*value_lists)):
+        key = tuple(repr(values[i]) for i in cash_flow_axes)
+        groups.setdefault(key, ([], []))
+        groups[key][0].append(index)
+        groups[key][1].append(values)
+
+    tasks = [(base, names, cells) for _, cells in groups.values()]
+    workers = int(data.get('workers', WORKER_PROCESSES if cell_count >= PARALLEL_CELL_THRESHOLD else 1))
+    if workers > 1 and len(tasks) > 1:
+        group_results = list(get_process_pool().map(evaluate_group, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        group_results = [evaluate_group(task) for task in tasks]
+
+    fire_age = [None] * cell_count
+    required_savings = [None] * cell_count
+    final_real_net_worth = [None] * cell_count
+    for (indices, _), results in zip(groups.values(), group_results):
+        for index, (cell_fire_age, cell_required_savings, cell_net_worth) in zip(indices, results):
+            fire_age[index] = cell_fire_age
+            required_savings[index] = cell_required_savings
+            final_real_net_worth[index] = cell_net_worth
+
+    return {
+        'axes': [{'name': name, 'values': values} for name, values in zip(names, value_lists)],
+        'shape': shape,
+        'fireAge': np.array(fire_age, dtype=object).reshape(shape).tolist(),
+        'requiredSavings': np.array(required_savings, dtype=object).reshape(shape).tolist(),
+        'finalRealNetWorth': np.array(final_real_net_worth, dtype=object).reshape(shape).tolist()
+    }
@@ -1,40 +1,22 @@
-# State tax rates (simplified for MVP)
-STATE_TAX_RATES = {
-    'CA': [
-        (0, 10756, 0.01),
-        (10757, 25499, 0.02),
-        (25500, 40245, 0.04),
-        (40246, 55866, 0.06),
-        (55867, 70606, 0.08),
-        (70607, 360659, 0.093),
-        (360660, 432787, 0.103),
-        (432788, 721314, 0.113),
-        (721315, float('inf'), 0.123)
-    ],
-    # Add more states as needed
-}
+import os
 
-# Federal tax brackets for 2024 (single filer)
-FEDERAL_TAX_RATES = [
-    (0, 11600, 0.10),
-    (11600, 47150, 0.12),
-    (47150, 100525, 0.22),
-    (100525, 191950, 0.24),
-    (191950, 243725, 0.32),
-    (243725, 609350, 0.35),
-    (609350, float('inf'), 0.37)
-]
+import numpy as np
 
-# FICA constants for 2024
-SOCIAL_SECURITY_WAGE_BASE = 168600
-SOCIAL_SECURITY_RATE = 0.062
-MEDICARE_RATE = 0.0145
-MEDICARE_ADDITIONAL_RATE = 0.009
-MEDICARE_ADDITIONAL_THRESHOLD = 200000
+from .cache import LRUCache
+from .tax_tables import (
+    DEFAULT_FILING_STATUS, DEFAULT_TAX_YEAR, bracket_tax,
+    get_tax_tables, load_tax_years, tax_data_version
+)
 
-# Standard deductions
-FEDERAL_STANDARD_DEDUCTION = 14600
-CA_STANDARD_DEDUCTION = 5540
+# Default-year single-filer brackets, as (min, max, rate) tuples
+FEDERAL_TAX_RATES = list(load_tax_years()[DEFAULT_TAX_YEAR].federal[DEFAULT_FILING_STATUS].brackets)
+STATE_TAX_RATES = {
+    state: list(tables[DEFAULT_FILING_STATUS].brackets)
+    for state, tables in load_tax_years()[DEFAULT_TAX_YEAR].states.items()
+}
+
+# Changes whenever any tax data file changes; invalidates stored projections
+TAX_TABLE_VERSION = tax_data_version()
 
 def calculate_tax_for_bracket(income, brackets):
     tax = 0
@@ -44,25 +26,38 @@ def calculate_tax_for_bracket(income, brackets):
             tax += taxable_amount * rate
     return tax
 
+# Memoized calculate_tax results keyed on (income, state, preTax401k, filingStatus, taxYear)
+TAX_CACHE = LRUCache(int(os.getenv('TAX_CACHE_SIZE', 4096)))
+
+def calculate_tax_for_bracket_batch(incomes, compiled):
+    incomes = np.asarray(incomes, dtype=float)
+    if len(compiled.edges) == 0:
+        return np.zeros(incomes.shape)
+    # Binary search for the bracket each income falls in, then one multiply-add
+    index = np.searchsorted(compiled.edges, incomes, side='right') - 1
+    clipped = np.maximum(index, 0)
+    tax = compiled.cumulative_tax[clipped] + (incomes - compiled.edges[clipped]) * compiled.rates[clipped]
+    return np.where(index >= 0, tax, 0.0)
+
 def calculate_tax(data):
     income = data['income']
     state = data['state']
     pre_tax_401k = data.get('preTax401k', 0)
+    filing_status = data.get('filingStatus') or DEFAULT_FILING_STATUS
+    federal_table, state_table, fica = get_tax_tables(state, filing_status, data.get('taxYear'))
     
-    # Calculate taxable income after deductions
-    federal_taxable_income = income - pre_tax_401k - FEDERAL_STANDARD_DEDUCTION
-    state_taxable_income = income - pre_tax_401k - CA_STANDARD_DEDUCTION
+    # Calculate taxable income after each jurisdiction's own deduction
+    federal_taxable_income = income - pre_tax_401k - federal_table.deduction
+    state_taxable_income = income - pre_tax_401k - state_table.deduction
     
-    # Calculate federal tax
-    federal_tax = calculate_tax_for_bracket(federal_taxable_income, FEDERAL_TAX_RATES)
-    
-    # Calculate state tax
-    state_tax = calculate_tax_for_bracket(state_taxable_income, STATE_TAX_RATES.get(state, []))
+    # Calculate federal and state tax
+    federal_tax = bracket_tax(federal_taxable_income, federal_table)
+    state_tax = bracket_tax(state_taxable_income, state_table)
     
     # Calculate FICA taxes
-    social_security_tax = min(income * SOCIAL_SECURITY_RATE, SOCIAL_SECURITY_WAGE_BASE * SOCIAL_SECURITY_RATE)
-    medicare_tax = income * MEDICARE_RATE
-    additional_medicare_tax = max(0, income - MEDICARE_ADDITIONAL_THRESHOLD) * MEDICARE_ADDITIONAL_RATE
+    social_security_tax = min(income * fica['socialSecurityRate'], fica['socialSecurityWageBase'] * fica['socialSecurityRate'])
+    medicare_tax = income * fica['medicareRate']
+    additional_medicare_tax = max(0, income - fica['medicareAdditionalThreshold'][filing_status]) * fica['medicareAdditionalRate']
     
     total_tax = federal_tax + state_tax + social_security_tax + medicare_tax + additional_medicare_tax
     after_tax_income = income - total_tax
@@ -75,4 +70,53 @@ def calculate_tax(data):
         'additionalMedicareTax': additional_medicare_tax,
         'totalTax': total_tax,
         'afterTaxIncome': after_tax_income
-    }
\ No newline at end of file
+    }
+
+def cached_calculate_tax(income, state, pre_tax_401k=0, filing_status=None, tax_year=None):
+    """calculate_tax through TAX_CACHE; returns a copy so callers may mutate it"""
+    key = (income, state, pre_tax_401k, filing_status, tax_year)
+    result = TAX_CACHE.get(key)
+    if result is None:
+        result = calculate_tax({
+            'income': income, 'state': state, 'preTax401k': pre_tax_401k,
+            'filingStatus': filing_status, 'taxYear': tax_year
+        })
+        TAX_CACHE.set(key, result)
+    return dict(result)
+
+def calculate_tax_batch(incomes, state, pre_tax_401k=0, filing_status=None, tax_year=None):
+    """Columnar version of calculate_tax over an array of incomes (and optionally 401k amounts)"""
+    income = np.asarray(incomes, dtype=float)
+    pre_tax_401k = np.asarray(pre_tax_401k, dtype=float)
+    if pre_tax_401k.ndim and pre_tax_401k.shape != income.shape:
+        raise ValueError(
+            f'preTax401k has {pre_tax_401k.size} values but there are {income.size} incomes; '
+            'pass one amount per income or a single number'
+        )
+    filing_status = filing_status or DEFAULT_FILING_STATUS
+    federal_table, state_table, fica = get_tax_tables(state, filing_status, tax_year)
+
+    # Calculate taxable income after each jurisdiction's own deduction
+    federal_taxable_income = income - pre_tax_401k - federal_table.deduction
+    state_taxable_income = income - pre_tax_401k - state_table.deduction
+
+    federal_tax = calculate_tax_for_bracket_batch(federal_taxable_income, federal_table.compiled)
+    state_tax = calculate_tax_for_bracket_batch(state_taxable_income, state_table.compiled)
+
+    # Calculate FICA taxes
+    social_security_tax = np.minimum(income * fica['socialSecurityRate'], fica['socialSecurityWageBase'] * fica['socialSecurityRate'])
+    medicare_tax = income * fica['medicareRate']
+    additional_medicare_tax = np.maximum(0, income - fica['medicareAdditionalThreshold'][filing_status]) * fica['medicareAdditionalRate']
+
+    total_tax = federal_tax + state_tax + social_security_tax + medicare_tax + additional_medicare_tax
+    after_tax_income = income - total_tax
+
+    return {
+        'federalTax': federal_tax,
+        'stateTax': state_tax,
+        'socialSecurityTax': social_security_tax,
+        'medicareTax': medicare_tax,
+        'additionalMedicareTax': additional_medicare_tax,
+        'totalTax': total_tax,
+        'afterTaxIncome': after_tax_income
+    }
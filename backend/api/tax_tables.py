@@ -0,0 +1,132 @@
+"""Tax tables loaded from api/data/tax/<year>.json, compiled once per process.
+
+Each year file has `fica`, `federal` and `states` sections. A table is a `deduction` and
+`brackets` per filing status, with brackets as [min, max or null, rate]. A filing status
+missing from a table uses its single-filer values; a state set to null has no wage income
+tax; a state missing from a year keeps the most recent earlier year's table, and a state no
+year has a table for is an error rather than a silent zero.
+"""
+import glob
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+import numpy as np
+
+TAX_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data', 'tax')
+FILING_STATUSES = ('single', 'married_joint', 'married_separate', 'head_of_household')
+DEFAULT_FILING_STATUS = 'single'
+DEFAULT_TAX_YEAR = 2024
+
+CompiledBrackets = namedtuple('CompiledBrackets', ['edges', 'cumulative_tax', 'rates'])
+# Compiled brackets as numpy arrays for batches and as tuples for single incomes
+TaxTable = namedtuple('TaxTable', ['brackets', 'deduction', 'compiled', 'edges', 'cumulative_tax', 'rates'])
+TaxYear = namedtuple('TaxYear', ['year', 'fica', 'federal', 'states'])
+
+def compile_brackets(brackets):
+    """Flatten (min, max, rate) brackets into edges, cumulative tax at each edge and marginal rates"""
+    edges = sorted({edge for min_income, max_income, _ in brackets for edge in (min_income, max_income)
+                    if edge != float('inf')})
+    rates = []
+    cumulative_tax = []
+    tax = 0
+    for i, edge in enumerate(edges):
+        upper = edges[i + 1] if i + 1 < len(edges) else float('inf')
+        rate = sum(r for min_income, max_income, r in brackets if min_income <= edge and upper <= max_income)
+        cumulative_tax.append(tax)
+        rates.append(rate)
+        if upper != float('inf'):
+            tax += (upper - edge) * rate
+    return CompiledBrackets(np.array(edges, dtype=float), np.array(cumulative_tax, dtype=float), np.array(rates, dtype=float))
+
+def build_tax_table(brackets, deduction=0):
+    compiled = compile_brackets(brackets)
+    for array in compiled:
+        array.setflags(write=False)
+    return TaxTable(
+        tuple(brackets), deduction, compiled,
+        tuple(compiled.edges.tolist()), tuple(compiled.cumulative_tax.tolist()), tuple(compiled.rates.tolist())
+    )
+
+NO_TAX = build_tax_table([])
+
+def bracket_tax(income, table):
+    """Tax on one income: a binary search for its bracket, then one multiply-add"""
+    index = bisect_right(table.edges, income) - 1
+    if index < 0:
+        return 0
+    return table.cumulative_tax[index] + (income - table.edges[index]) * table.rates[index]
+
+def parse_brackets(rows):
+    return [(min_income, float('inf') if max_income is None else max_income, rate) for min_income, max_income, rate in rows]
+
+def parse_tables(section):
+    """{filing status: TaxTable} for a federal or state section; None means no income tax"""
+    if section is None:
+        return MappingProxyType({status: NO_TAX for status in FILING_STATUSES})
+    brackets = section['brackets']
+    deduction = section.get('deduction', {})
+    return MappingProxyType({
+        status: build_tax_table(
+            parse_brackets(brackets.get(status, brackets[DEFAULT_FILING_STATUS])),
+            deduction.get(status, deduction.get(DEFAULT_FILING_STATUS, 0))
+        )
+        for status in FILING_STATUSES
+    })
+
+def parse_fica(fica):
+    threshold = fica['medicareAdditionalThreshold']
+    return MappingProxyType({
+        **fica,
+        'medicareAdditionalThreshold': MappingProxyType(
+            {status: threshold.get(status, threshold[DEFAULT_FILING_STATUS]) for status in FILING_STATUSES}
+        )
+    })
+
+def read_tax_files(directory=TAX_DATA_DIR):
+    """Raw year files, oldest first"""
+    years = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        with open(path) as f:
+            years.append(json.load(f))
+    return sorted(years, key=lambda data: data['year'])
+
+@lru_cache(maxsize=None)
+def load_tax_years(directory=TAX_DATA_DIR):
+    """{year: TaxYear}, compiled on first use and shared read-only by every thread"""
+    tax_years = {}
+    states = {}
+    for data in read_tax_files(directory):
+        for state, section in data['states'].items():
+            states[state] = parse_tables(section)
+        tax_years[data['year']] = TaxYear(
+            data['year'], parse_fica(data['fica']), parse_tables(data['federal']), MappingProxyType(dict(states))
+        )
+    return MappingProxyType(tax_years)
+
+def tax_data_version(directory=TAX_DATA_DIR):
+    """Hash of the tax data files; changes whenever any table does"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def get_tax_tables(state, filing_status=None, tax_year=None):
+    """(federal table, state table, FICA constants) for a state, filing status and tax year"""
+    filing_status = filing_status or DEFAULT_FILING_STATUS
+    tax_year = tax_year or DEFAULT_TAX_YEAR
+    if filing_status not in FILING_STATUSES:
+        raise ValueError(f'Unknown filing status: {filing_status}')
+    tax_years = load_tax_years()
+    if tax_year not in tax_years:
+        raise ValueError(f'No tax tables for {tax_year}; available years: {", ".join(map(str, tax_years))}')
+    year = tax_years[tax_year]
+    if state not in year.states:
+        raise ValueError(f'No {tax_year} tax tables for state {state!r}; available states: {", ".join(sorted(year.states))}')
+    return year.federal[filing_status], year.states[state][filing_status], year.fica
@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+import mongomock
+from . import async_db, db
+
+
+class AsyncCursor:
+    """Async iteration over a mongomock cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def batch_size(self, size):
+        self._cursor = self._cursor.batch_size(size)
+        return self
+
+    def limit(self, limit):
+        self._cursor = self._cursor.limit(limit)
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+class AsyncMongomockClient:
+    """Just enough of AsyncMongoClient over mongomock for async_db"""
+
+    def __init__(self):
+        self._client = mongomock.MongoClient()
+
+    def __getitem__(self, name):
+        database = self._client[name]
+        return type('AsyncDatabase', (), {'profiles': AsyncCollection(database.profiles)})()
+
+    async def close(self):
+        self._client.close()
+
+
+class TestAsyncDb(unittest.TestCase):
+    def setUp(self):
+        async_db.use_client_factory(AsyncMongomockClient)
+        self.addCleanup(async_db.use_client_factory, None)
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_profile_round_trip(self):
+        async def scenario():
+            profile_id = await async_db.save_profile('Plan A', {'currentAge': 30}, owner='alice', projection={'version': '1'})
+            listed = [profile async for profile in async_db.iter_profiles()]
+            fetched = await async_db.get_profile(profile_id)
+            self.assertTrue(await async_db.update_profile(profile_id, 'Plan B', {'currentAge': 31}))
+            projection = await async_db.get_profile_projection(profile_id)
+            deleted = await async_db.delete_profile(profile_id)
+            return profile_id, listed, fetched, projection, deleted, await async_db.get_profile(profile_id)
+
+        profile_id, listed, fetched, projection, deleted, missing = self.run_async(scenario())
+        self.assertEqual(listed, [{'_id': profile_id, 'name': 'Plan A'}])
+        self.assertEqual(fetched, {'_id': profile_id, 'name': 'Plan A', 'config': {'currentAge': 30}})
+        # Updating without a snapshot drops the stale one
+        self.assertEqual(projection, {'config': {'currentAge': 31}})
+        self.assertTrue(deleted)
+        self.assertIsNone(missing)
+
+    def test_iter_profiles_pages(self):
+        async def scenario():
+            for name in ('a1', 'a2', 'b1'):
+                await async_db.save_profile(name, {})
+            first = [profile async for profile in async_db.iter_profiles(limit=1, prefix='a')]
+            rest = [profile async for profile in async_db.iter_profiles(after=db.page_cursor(first[0], 'a'), prefix='a')]
+            return first, rest
+
+        first, rest = self.run_async(scenario())
+        self.assertEqual([profile['name'] for profile in first + rest], ['a1', 'a2'])
+
+    def test_client_is_per_event_loop(self):
+        async def client():
+            return await async_db.get_client()
+
+        self.assertIsNot(self.run_async(client()), self.run_async(client()))
+
+if __name__ == '__main__':
+    unittest.main()
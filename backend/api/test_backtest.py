@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from parameterized import parameterized
+from .backtest import historical_real_return_windows, run_backtest
+from .montecarlo import load_historical_returns
+from .projection import build_cash_flows
+from .test_projection import BASE_DATA
+
+
+class TestBacktest(unittest.TestCase):
+    def test_rolling_windows(self):
+        years, stock_returns, inflation = load_historical_returns()
+        start_years, real_returns = historical_real_return_windows(30)
+
+        self.assertEqual(len(start_years), len(years) - 28)
+        self.assertEqual(start_years[0], years[0])
+        self.assertEqual(real_returns.shape, (len(start_years), 30))
+        # The first year of growth uses the start year's return
+        self.assertAlmostEqual(real_returns[3, 1], (1 + stock_returns[3]) / (1 + inflation[3]) - 1)
+        self.assertAlmostEqual(real_returns[3, 29], (1 + stock_returns[31]) / (1 + inflation[31]) - 1)
+
+    @parameterized.expand([
+        ("longer_than_history", {'currentAge': 20, 'endAge': 150}),
+        ("end_before_current", {'endAge': 20}),
+        ("monthly", {'granularity': 'monthly'}),
+        ("bad_entry", {'yearlySpending': [{'startAge': 40, 'endAge': 30, 'amount': 1}]}),
+    ])
+    def test_rejects_plan(self, name, overrides):
+        with self.assertRaises(ValueError):
+            run_backtest({**BASE_DATA, **overrides})
+
+    @parameterized.expand([
+        ("keep_working", False),
+        ("stop_at_fire", True),
+    ])
+    def test_cohorts_match_sequential_projection(self, name, stop_at_fire):
+        data = {**BASE_DATA, 'stopAtFire': stop_at_fire}
+        result = run_backtest(data)
+        _, real_returns = historical_real_return_windows(len(result['years']))
+        _, spending, available, _ = build_cash_flows(data)
+        required = result['requiredSavings']
+
+        for cohort in (0, result['cohorts'] // 2, result['cohorts'] - 1):
+            balance = data['currentNetWorth']
+            fired = False
+            for i in range(len(result['years'])):
+                if i > 0:
+                    grown = balance * (1 + real_returns[cohort, i])
+                    balance = grown + available[i] - spending[i]
+                fired = fired or balance >= required
+                if stop_at_fire and fired and i > 0:
+                    balance = grown - data['retirementSpending']
+                self.assertAlmostEqual(result['realNetWorth'][cohort][i], balance, delta=1e-6 * max(1, abs(balance)))
+
+    def test_summary(self):
+        # An aggressive withdrawal rate fails in some historical sequences
+        result = run_backtest({**BASE_DATA, 'stopAtFire': True, 'withdrawalRate': 8})
+        self.assertEqual(len(result['realNetWorth']), result['cohorts'])
+        self.assertEqual(len(result['success']), result['cohorts'])
+        self.assertAlmostEqual(result['successRate'], np.mean(result['success']))
+        self.assertTrue(0 < result['successRate'] < 1)
+        worst = result['startYears'].index(result['worstStartYear'])
+        self.assertFalse(result['success'][worst])
+        self.assertEqual(min(min(path) for path in result['realNetWorth']), min(result['realNetWorth'][worst]))
+
+    def test_unreachable_plan_never_succeeds(self):
+        result = run_backtest({**BASE_DATA, 'retirementSpending': 10 ** 9})
+        self.assertEqual(result['successRate'], 0)
+        self.assertEqual(result['fireAges'], [None] * result['cohorts'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest import mock
+from . import batch
+from .batch import run_batch
+from .projection import run_projection
+from .test_projection import BASE_DATA
+
+
+class TestBatch(unittest.TestCase):
+    def test_results_in_input_order_with_per_item_errors(self):
+        other = {**BASE_DATA, 'annualReturn': 9}
+        configs = [BASE_DATA, {'currentAge': 30}, other, dict(reversed(list(BASE_DATA.items()))), 'oops']
+        result = run_batch(configs)
+
+        items = result['results']
+        self.assertEqual(len(items), len(configs))
+        self.assertEqual(items[0]['result'], run_projection(BASE_DATA))
+        self.assertIn('Missing required field', items[1]['error'])
+        self.assertEqual(items[2]['result'], run_projection(other))
+        self.assertEqual(items[3], items[0])
+        self.assertIn('error', items[4])
+        # BASE_DATA and its reordered copy are evaluated once
+        self.assertEqual(result['evaluated'], 2)
+
+    def test_invalid_configs_rejected_per_item(self):
+        configs = [{**BASE_DATA, 'endAge': 20000}, {**BASE_DATA, 'annualReturn': '7'}, BASE_DATA]
+        items = run_batch(configs)['results']
+        self.assertIn('limited to', items[0]['error'])
+        self.assertIn('annualReturn', items[1]['error'])
+        self.assertIn('result', items[2])
+
+    def test_entry_ids_do_not_defeat_dedupe(self):
+        entry = {'startAge': 30, 'endAge': 40, 'amount': 1000}
+        configs = [{**BASE_DATA, 'yearlySpending': [{**entry, 'id': i}]} for i in range(3)]
+        result = run_batch(configs)
+        self.assertEqual(result['evaluated'], 1)
+        self.assertEqual(result['results'][0], result['results'][2])
+
+    def test_runtime_errors_do_not_fail_batch(self):
+        configs = [{**BASE_DATA, 'withdrawalRate': 0}, BASE_DATA]
+        items = run_batch(configs)['results']
+        self.assertIn('error', items[0])
+        self.assertIn('result', items[1])
+
+    def test_parallel_matches_inline(self):
+        configs = [{**BASE_DATA, 'annualReturn': rate} for rate in range(3, 9)]
+        inline = run_batch(configs)
+        with mock.patch.object(batch, 'PARALLEL_BATCH_THRESHOLD', 1), \
+                mock.patch.object(batch, 'WORKER_PROCESSES', 2):
+            parallel = run_batch(configs)
+        self.assertEqual(parallel, inline)
+
+    def test_rejects_oversized_batch(self):
+        with mock.patch.object(batch, 'MAX_BATCH_SIZE', 2):
+            with self.assertRaises(ValueError):
+                run_batch([BASE_DATA] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import gzip
+import io
+import json
+import unittest
+from unittest import mock
+import mongomock
+from . import bulk, db
+
+_add_replace = mongomock.collection.BulkOperationBuilder.add_replace
+
+def add_replace(self, selector, doc, upsert, collation=None, hint=None, sort=None):
+    # pymongo 4.11+ passes sort (always None for ReplaceOne here), which mongomock 4.3 doesn't take
+    return _add_replace(self, selector, doc, upsert, collation=collation, hint=hint)
+
+
+class TestBulk(unittest.TestCase):
+    def setUp(self):
+        db.use_client_factory(mongomock.MongoClient)
+        self.addCleanup(db.use_client_factory, None)
+        patcher = mock.patch.object(mongomock.collection.BulkOperationBuilder, 'add_replace', add_replace)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_import_reports_errors_per_line(self):
+        lines = [
+            json.dumps({'name': 'Plan A', 'config': {'currentAge': 30}}),
+            'not json',
+            '',
+            json.dumps({'name': 'Plan B'}),
+            json.dumps({'name': 'Plan C', 'config': {}, 'owner': 'bob', 'createdAt': '2024-01-02T03:04:05+00:00'}),
+            json.dumps({'name': 'Plan D', 'config': {}, 'createdAt': 1704164645}),
+            json.dumps({'name': 'Plan E', 'config': {}, 'createdAt': 'yesterday'}),
+        ]
+        result = bulk.import_profiles(lines, batch_size=1)
+
+        self.assertEqual(result['inserted'], 2)
+        self.assertEqual([error['line'] for error in result['errors']], [2, 4, 6, 7])
+        self.assertEqual([profile['name'] for profile in db.iter_profiles()], ['Plan A', 'Plan C'])
+
+    def test_export_round_trip(self):
+        db.save_profile('Plan A', {'currentAge': 30}, owner='alice', projection={'result': {}})
+        lines = list(bulk.export_profiles())
+        exported = json.loads(lines[0])
+        self.assertEqual(exported['name'], 'Plan A')
+        self.assertEqual(exported['owner'], 'alice')
+        self.assertNotIn('projection', exported)
+
+        db.get_profiles_collection().delete_many({})
+        self.assertEqual(bulk.import_profiles(lines)['inserted'], 1)
+        self.assertEqual(db.get_profiles()[0], {'_id': exported['_id'], 'name': 'Plan A'})
+
+    def test_reimport_replaces_instead_of_duplicating(self):
+        for name in ('Plan A', 'Plan B'):
+            db.save_profile(name, {'currentAge': 30})
+        lines = list(bulk.export_profiles())
+        before = db.get_profiles()
+
+        result = bulk.import_profiles(lines)
+        self.assertEqual((result['inserted'], result['replaced'], result['failed']), (0, 2, 0))
+        bulk.import_profiles(lines, batch_size=1)
+        self.assertEqual(db.get_profiles(), before)
+
+    def test_invalid_id_reported(self):
+        result = bulk.import_profiles([json.dumps({'_id': 'nope', 'name': 'Plan A', 'config': {}})])
+        self.assertEqual([error['line'] for error in result['errors']], [1])
+
+    def test_gzip_round_trip(self):
+        lines = ['{"a": 1}\n', '{"b": 2}\n']
+        compressed = b''.join(bulk.gzip_lines(lines))
+        self.assertEqual(gzip.decompress(compressed).decode(), ''.join(lines))
+        self.assertEqual(list(bulk.open_ndjson(io.BytesIO(compressed), True)), lines)
+
+if __name__ == '__main__':
+    unittest.main()
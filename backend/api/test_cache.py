@@ -0,0 +1,56 @@
+import threading
+import unittest
+from .cache import LRUCache
+from .tax import TAX_CACHE, cached_calculate_tax, calculate_tax
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (3, 1, 1))
+        self.assertEqual(stats['size'], 2)
+
+    def test_zero_size_disables_cache(self):
+        cache = LRUCache(0)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_concurrent_access(self):
+        cache = LRUCache(50)
+
+        def worker(offset):
+            for i in range(2000):
+                key = (i + offset) % 100
+                if cache.get(key) is None:
+                    cache.set(key, key)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 8000)
+        self.assertLessEqual(stats['size'], 50)
+
+    def test_cached_calculate_tax(self):
+        TAX_CACHE.clear()
+        first = cached_calculate_tax(123456, 'CA', 1000)
+        first['totalTax'] = -1
+        second = cached_calculate_tax(123456, 'CA', 1000)
+
+        self.assertEqual(second, calculate_tax({'income': 123456, 'state': 'CA', 'preTax401k': 1000}))
+        self.assertEqual(TAX_CACHE.stats()['hits'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,11 @@ from .calculator import (
     calculate_yearly_data,
     calculate_income_tax,
     calculate_net_worth,
-    calculate_fire_projection
+    calculate_fire_projection,
+    build_segments,
+    balance_after,
+    find_fire_age,
+    iter_fire_projection
 )
 
 class TestCalculator(unittest.TestCase):
@@ -278,5 +282,92 @@ class TestCalculator(unittest.TestCase):
             self.assertIn(f"{data['withdrawalRate']:.1f}%", error_msg)
             self.assertIn(f"{real_return_rate*100:.1f}%", error_msg)
 
+    def test_build_segments(self):
+        data = {
+            'currentAge': 30,
+            'endAge': 50,
+            'preTax401k': 0,
+            'employerMatch': 0,
+            'state': 'TX',
+            'yearlyIncome': [{'startAge': 25, 'endAge': 40, 'amount': 100000}],
+            'yearlySpending': [{'startAge': 35, 'endAge': 60, 'amount': 40000}]
+        }
+        segments = build_segments(data)
+        self.assertEqual([(start, stop) for start, stop, _ in segments], [(30, 35), (35, 41), (41, 51)])
+        self.assertEqual(segments[2][2], -40000)
+
+    @parameterized.expand([
+        ("growth", 1000, 100, 1.05, 3),
+        ("no_growth", 1000, 100, 1, 3),
+        ("shrinking", 1000, -100, 0.98, 10),
+    ])
+    def test_balance_after(self, name, balance, savings, growth, years):
+        expected = balance
+        for _ in range(years):
+            expected = expected * growth + savings
+        self.assertAlmostEqual(balance_after(balance, savings, growth, years), expected, places=6)
+
+    @parameterized.expand([
+        ("reached_mid_segment", {}),
+        ("already_fire", {'currentNetWorth': 5000000}),
+        ("never", {'yearlyIncome': []}),
+        ("multiple_segments", {
+            'yearlyIncome': [
+                {'startAge': 30, 'endAge': 35, 'amount': 60000},
+                {'startAge': 36, 'endAge': 65, 'amount': 180000}
+            ],
+            'yearlySpending': [{'startAge': 40, 'endAge': 65, 'amount': 90000}]
+        }),
+        ("zero_real_return", {'annualReturn': 2}),
+    ])
+    def test_find_fire_age_matches_projection(self, name, overrides):
+        data = {
+            'currentAge': 30,
+            'endAge': 65,
+            'currentNetWorth': 100000,
+            'annualReturn': 7,
+            'inflationRate': 2,
+            'retirementSpending': 40000,
+            'withdrawalRate': 4,
+            'preTax401k': 0,
+            'employerMatch': 0,
+            'state': 'CA',
+            'yearlyIncome': [{'startAge': 30, 'endAge': 65, 'amount': 100000}],
+            'yearlySpending': [{'startAge': 30, 'endAge': 65, 'amount': 50000}],
+            **overrides
+        }
+        result = calculate_fire_projection(data)
+        reached = [year for year, real in zip(result['years'], result['realNetWorth'])
+                   if real >= result['requiredSavings']]
+        self.assertEqual(find_fire_age(data), reached[0] if reached else None)
+
+        summary = calculate_fire_projection({**data, 'summaryOnly': True})
+        self.assertEqual(summary.get('fireAge'), result['fireAge'])
+        self.assertEqual(summary['requiredSavings'], result['requiredSavings'])
+        self.assertNotIn('realNetWorth', summary)
+
+    def test_iter_fire_projection_streams_summary_then_years(self):
+        data = {
+            'currentAge': 30,
+            'endAge': 40,
+            'currentNetWorth': 100000,
+            'annualReturn': 7,
+            'inflationRate': 2,
+            'retirementSpending': 40000,
+            'withdrawalRate': 4,
+            'preTax401k': 0,
+            'employerMatch': 0,
+            'yearlyIncome': [{'startAge': 30, 'endAge': 40, 'amount': 100000}],
+            'yearlySpending': [{'startAge': 30, 'endAge': 40, 'amount': 50000}]
+        }
+        rows = iter_fire_projection(data)
+        summary = next(rows)
+        self.assertEqual(set(summary), {'fireAge', 'requiredSavings'})
+
+        rows = list(rows)
+        result = calculate_fire_projection(data)
+        self.assertEqual([row['year'] for row in rows], result['years'])
+        self.assertEqual([row['realNetWorth'] for row in rows], result['realNetWorth'])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,127 @@
+import os
+import threading
+import unittest
+from unittest import mock
+import mongomock
+from bson.objectid import ObjectId
+from . import db
+
+
+class TestDb(unittest.TestCase):
+    def setUp(self):
+        db.use_client_factory(mongomock.MongoClient)
+        self.addCleanup(db.use_client_factory, None)
+
+    def test_client_is_created_once_per_process(self):
+        self.assertIs(db.get_client(), db.get_client())
+
+    def test_client_is_recreated_after_fork(self):
+        client = db.get_client()
+        db._client_pid = os.getpid() + 1
+        self.assertIsNot(db.get_client(), client)
+
+    def test_indexes_created(self):
+        indexes = db.get_profiles_collection().index_information()
+        for name in ('name_id', 'owner', 'createdAt'):
+            self.assertIn(name, indexes)
+
+    def test_failed_indexes_retried_later(self):
+        with mock.patch.object(db, 'ensure_indexes', return_value=False) as ensure_indexes:
+            db.get_client()
+            db.get_client()
+        # A failure isn't retried on every request
+        self.assertEqual(ensure_indexes.call_count, 1)
+        with mock.patch.object(db, 'MONGODB_INDEX_RETRY_SECONDS', 0):
+            db._index_retry_at = 0.0
+            db.get_client()
+        self.assertIn('name_id', db.get_profiles_collection().index_information())
+
+    def test_index_creation_does_not_hold_client_lock(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_indexes(database):
+            started.set()
+            release.wait(5)
+            return True
+
+        with mock.patch.object(db, 'ensure_indexes', side_effect=slow_indexes):
+            thread = threading.Thread(target=db.get_client)
+            thread.start()
+            started.wait(5)
+            # Other requests get the client while the first one is still creating indexes
+            self.assertIsNotNone(db.get_client())
+            release.set()
+            thread.join()
+
+    def test_profile_round_trip(self):
+        profile_id = db.save_profile('Plan A', {'currentAge': 30}, owner='alice')
+
+        self.assertEqual(db.get_profiles(), [{'_id': profile_id, 'name': 'Plan A'}])
+        self.assertEqual(db.get_profile(profile_id), {
+            '_id': profile_id, 'name': 'Plan A', 'config': {'currentAge': 30}
+        })
+        stored = db.get_profiles_collection().find_one({'_id': ObjectId(profile_id)})
+        self.assertEqual(stored['owner'], 'alice')
+        self.assertIn('createdAt', stored)
+
+        self.assertTrue(db.delete_profile(profile_id))
+        self.assertFalse(db.delete_profile(profile_id))
+        self.assertIsNone(db.get_profile(profile_id))
+
+    def test_keyset_pagination_and_prefix(self):
+        ids = [db.save_profile(name, {}) for name in ('Plan A', 'Plan B', 'Other', 'Plan C')]
+
+        first_page = list(db.iter_profiles(limit=2))
+        self.assertEqual([profile['_id'] for profile in first_page], ids[:2])
+        second_page = list(db.iter_profiles(limit=2, after=first_page[-1]['_id']))
+        self.assertEqual([profile['_id'] for profile in second_page], ids[2:])
+
+        plans = list(db.iter_profiles(prefix='Plan'))
+        self.assertEqual([profile['name'] for profile in plans], ['Plan A', 'Plan B', 'Plan C'])
+        self.assertEqual(list(db.iter_profiles(prefix='Plan (')), [])
+
+    def test_prefix_pages_in_name_order(self):
+        names = ('Plan C', 'Plan A', 'Other', 'Plan B', 'Plan A')
+        ids = [db.save_profile(name, {}) for name in names]
+        pages = []
+        after = None
+        while True:
+            page = list(db.iter_profiles(limit=2, after=after, prefix='Plan'))
+            if not page:
+                break
+            pages.append(page)
+            after = db.page_cursor(page[-1], 'Plan')
+        expected = sorted((name, profile_id) for name, profile_id in zip(names, ids) if name != 'Other')
+        self.assertEqual([(profile['name'], profile['_id']) for page in pages for profile in page], expected)
+        self.assertEqual([len(page) for page in pages], [2, 2])
+
+    def test_cursor_validated_against_prefix(self):
+        db.validate_page_args(2, db.page_cursor({'_id': str(ObjectId()), 'name': 'Plan A'}, 'Plan'), 'Plan')
+        for after in ('abc', str(ObjectId())):
+            with self.assertRaises(ValueError):
+                db.validate_page_args(2, after, 'Plan')
+
+    def test_page_limit_parsed_strictly(self):
+        self.assertIsNone(db.parse_page_limit(None))
+        self.assertEqual(db.parse_page_limit('20'), 20)
+        for value in ('abc', '2.5', ''):
+            with self.assertRaises(ValueError):
+                db.parse_page_limit(value)
+
+    def test_projection_snapshot_stored_apart_from_profile(self):
+        profile_id = db.save_profile('Plan A', {'currentAge': 30}, projection={'version': 'v', 'result': {}})
+        self.assertNotIn('projection', db.get_profile(profile_id))
+        self.assertEqual(db.get_profile_projection(profile_id)['projection']['version'], 'v')
+
+        db.set_profile_projection(profile_id, {'version': 'w', 'result': {}})
+        self.assertEqual(db.get_profile_projection(profile_id)['projection']['version'], 'w')
+
+        # Updating without a new snapshot drops the stale one
+        self.assertTrue(db.update_profile(profile_id, 'Plan B', {'currentAge': 31}))
+        stored = db.get_profile_projection(profile_id)
+        self.assertEqual(stored, {'config': {'currentAge': 31}})
+        self.assertFalse(db.update_profile(str(ObjectId()), 'Plan C', {}))
+
+if __name__ == '__main__':
+    unittest.main()
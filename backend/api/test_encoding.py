@@ -0,0 +1,88 @@
+import gzip
+import json
+import unittest
+import numpy as np
+from parameterized import parameterized
+from . import encoding
+from .projection import run_projection
+from .test_projection import BASE_DATA
+
+
+class TestEncoding(unittest.TestCase):
+    @parameterized.expand([
+        (None, encoding.JSON_MIMETYPE),
+        ('*/*', encoding.JSON_MIMETYPE),
+        ('application/json', encoding.JSON_MIMETYPE),
+        (encoding.COLUMNAR_MIMETYPE, encoding.COLUMNAR_MIMETYPE),
+        (f'application/json;q=0.5, {encoding.COLUMNAR_MIMETYPE}', encoding.COLUMNAR_MIMETYPE),
+        ('text/html', encoding.JSON_MIMETYPE),
+    ])
+    def test_negotiate_mimetype(self, accept, expected):
+        self.assertEqual(encoding.negotiate(accept, None)[0], expected)
+
+    @parameterized.expand([
+        (None, None),
+        ('identity', None),
+        ('gzip, deflate', 'gzip'),
+        ('gzip;q=0', None),
+    ])
+    def test_negotiate_content_coding(self, accept_encoding, expected):
+        self.assertEqual(encoding.negotiate(None, accept_encoding)[1], expected)
+
+    def test_columnar_round_trip(self):
+        result = run_projection(BASE_DATA)
+        body = encoding.encode_columnar(result)
+        decoded = encoding.decode_columnar(body)
+
+        self.assertEqual(set(decoded), set(result))
+        for key, value in result.items():
+            if isinstance(value, list):
+                np.testing.assert_array_equal(decoded[key], np.asarray(value, dtype=float))
+            else:
+                self.assertEqual(decoded[key], value)
+
+    def test_columnar_columns_are_aligned(self):
+        body = encoding.encode_columnar({'label': 'x', 'values': [1.5, 2.5]})
+        self.assertEqual(len(body) % 8, 0)
+        self.assertEqual(body[-16:], np.array([1.5, 2.5], dtype='<f8').tobytes())
+
+    def test_small_bodies_are_not_compressed(self):
+        status, body, headers = encoding.encode_response({'a': 1}, None, 'gzip')
+        self.assertEqual(status, 200)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(json.loads(body), {'a': 1})
+
+    def test_large_bodies_are_compressed(self):
+        result = run_projection(BASE_DATA)
+        status, body, headers = encoding.encode_response(result, None, 'gzip', etag_parts=('projection', 'abc'))
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertTrue(headers['ETag'].endswith('-gzip"'))
+        self.assertEqual(json.loads(gzip.decompress(body)), json.loads(json.dumps(result)))
+
+    def test_json_body_used_as_is(self):
+        _, body, _ = encoding.encode_response(None, None, None, json_body=b'{"b": [1, 2]}\n')
+        self.assertEqual(body, b'{"b": [1, 2]}\n')
+        _, body, _ = encoding.encode_response(None, encoding.COLUMNAR_MIMETYPE, None, json_body=b'{"b": [1, 2]}\n')
+        self.assertEqual(list(encoding.decode_columnar(body)['b']), [1.0, 2.0])
+
+    def test_etag_differs_per_representation(self):
+        parts = ('profile', 'abc')
+        json_etag = encoding.encode_response({'a': 1}, None, None, parts)[2]['ETag']
+        columnar_etag = encoding.encode_response({'a': 1}, encoding.COLUMNAR_MIMETYPE, None, parts)[2]['ETag']
+        other_etag = encoding.encode_response({'a': 1}, None, None, ('profile', 'def'))[2]['ETag']
+        self.assertNotEqual(json_etag, columnar_etag)
+        self.assertNotEqual(json_etag, other_etag)
+        self.assertFalse(json_etag.startswith('W/'))
+
+    def test_matching_if_none_match_returns_304(self):
+        parts = ('profile', 'abc')
+        etag = encoding.encode_response({'a': 1}, None, None, parts)[2]['ETag']
+        status, body, headers = encoding.encode_response({'a': 1}, None, None, parts, if_none_match=etag)
+        self.assertEqual((status, body, headers['ETag']), (304, b'', etag))
+
+        status, _, _ = encoding.encode_response({'a': 1}, None, None, parts, if_none_match='"stale"')
+        self.assertEqual(status, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
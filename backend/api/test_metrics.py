@@ -0,0 +1,55 @@
+import unittest
+from . import metrics
+from .projection import calculate_fire_projection_vectorized
+from .test_projection import BASE_DATA
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram('latency_seconds', 'Latency', ('route',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(('/a',), value)
+
+        lines = histogram.render().splitlines()
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1.0"} 2', lines)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_count{route="/a"} 3', lines)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55', lines)
+
+    def test_label_values_are_escaped(self):
+        histogram = metrics.Histogram('latency_seconds', 'Latency', ('route',))
+        histogram.observe(('/a"b',), 0.1)
+        self.assertIn('route="/a\\"b"', histogram.render())
+
+    def test_phases_recorded_during_request(self):
+        metrics.start_request()
+        calculate_fire_projection_vectorized({**BASE_DATA, 'stopAtFire': True})
+        phases = metrics.finish_request()
+        self.assertEqual(set(phases), {'tax', 'pass1', 'pass2'})
+        self.assertTrue(all(seconds >= 0 for seconds in phases.values()))
+
+    def test_phases_ignored_outside_request(self):
+        calculate_fire_projection_vectorized(BASE_DATA)
+        self.assertEqual(metrics.finish_request(), {})
+
+    def test_phases_recorded_while_streaming(self):
+        metrics.start_request()
+        phases = metrics.finish_request()
+
+        def body():
+            with metrics.phase('mongo'):
+                yield b'a'
+
+        self.assertEqual(list(metrics.iter_with_phases(body(), phases)), [b'a'])
+        self.assertEqual(set(phases), {'mongo'})
+        self.assertEqual(metrics.finish_request(), {})
+
+    def test_server_timing_header(self):
+        self.assertEqual(
+            metrics.server_timing({'tax': 0.0015}, 0.01),
+            'tax;dur=1.50, total;dur=10.00'
+        )
+
+if __name__ == '__main__':
+    unittest.main()
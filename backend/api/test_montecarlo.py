@@ -0,0 +1,84 @@
+import unittest
+from unittest import mock
+from parameterized import parameterized
+from . import montecarlo
+from .montecarlo import MAX_PATHS, load_historical_returns, run_monte_carlo
+from .projection import calculate_fire_projection_vectorized
+from .test_projection import BASE_DATA
+
+
+class TestMonteCarlo(unittest.TestCase):
+    def test_historical_returns(self):
+        years, stock_returns, inflation = load_historical_returns()
+        self.assertEqual(len(years), len(stock_returns))
+        self.assertEqual(len(years), len(inflation))
+        self.assertEqual(years[0], 1928)
+        self.assertFalse(stock_returns.flags.writeable)
+
+    @parameterized.expand([
+        ("keep_working", False),
+        ("stop_at_fire", True),
+    ])
+    def test_zero_volatility_matches_deterministic(self, name, stop_at_fire):
+        data = {
+            **BASE_DATA,
+            'stopAtFire': stop_at_fire,
+            'simulation': {
+                'paths': 50,
+                'returns': {'stdev': 0},
+                'inflation': {'stdev': 0}
+            }
+        }
+        expected = calculate_fire_projection_vectorized(data)
+        result = run_monte_carlo(data)
+
+        self.assertEqual(result['years'], expected['years'])
+        self.assertEqual(result['fireProbability'], 1.0)
+        self.assertEqual(result['fireAgeDistribution']['ages'], [expected['fireAge']])
+        for band in result['realNetWorthPercentiles'].values():
+            for actual, wanted in zip(band, expected['realNetWorth']):
+                self.assertAlmostEqual(actual, wanted, delta=1e-6 * max(1, abs(wanted)))
+
+    @parameterized.expand([
+        ("normal", {'model': 'distribution'}),
+        ("lognormal", {'model': 'distribution', 'returns': {'distribution': 'lognormal'}}),
+        ("bootstrap", {'model': 'bootstrap'}),
+        ("split_across_workers", {'model': 'bootstrap', 'workers': 2}),
+    ])
+    def test_result_shape(self, name, simulation):
+        data = {**BASE_DATA, 'simulation': {'paths': 200, 'seed': 7, **simulation}}
+        result = run_monte_carlo(data)
+
+        self.assertEqual(result['paths'], 200)
+        self.assertGreaterEqual(result['successProbability'], 0)
+        self.assertLessEqual(result['successProbability'], result['fireProbability'])
+        self.assertAlmostEqual(sum(result['fireAgeDistribution']['probabilities']), result['fireProbability'])
+        self.assertEqual(set(result['realNetWorthPercentiles']), {'5', '25', '50', '75', '95'})
+        for band in result['realNetWorthPercentiles'].values():
+            self.assertEqual(len(band), len(result['years']))
+
+    def test_seed_is_reproducible(self):
+        data = {**BASE_DATA, 'simulation': {'paths': 100, 'seed': 42}}
+        self.assertEqual(run_monte_carlo(data), run_monte_carlo(data))
+
+    @parameterized.expand([
+        ("too_many_paths", {'simulation': {'paths': 10 ** 6}}),
+        ("too_long", {'endAge': 3000, 'simulation': {'paths': 2000}}),
+        ("too_many_path_years", {'currentAge': 20, 'endAge': 200, 'simulation': {'paths': MAX_PATHS}}),
+        ("string_number", {'annualReturn': '7'}),
+        ("monthly", {'granularity': 'monthly'}),
+    ])
+    def test_rejects_bad_input(self, name, overrides):
+        with self.assertRaises(ValueError):
+            run_monte_carlo({**BASE_DATA, **overrides})
+
+    def test_workers_clamped_to_pool(self):
+        data = {**BASE_DATA, 'simulation': {'paths': 100, 'seed': 1, 'workers': 10 ** 6}}
+        with mock.patch.object(montecarlo, 'WORKER_PROCESSES', 1), \
+                mock.patch.object(montecarlo, 'get_process_pool') as get_process_pool:
+            result = run_monte_carlo(data)
+        get_process_pool.assert_not_called()
+        self.assertEqual(result['paths'], 100)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import pstats
+import tempfile
+import time
+import unittest
+from .profiler import RequestProfiler
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def test_sampled_request_saves_pstats(self):
+        profiler = RequestProfiler(self.directory, sample_rate=1, slow_ms=0, max_files=10)
+        handle = profiler.start()
+        busy(0.01)
+        name = profiler.finish(handle, 0.01, 'POST /api/calculate')
+
+        self.assertTrue(name.endswith('.pstats'))
+        stats = pstats.Stats(profiler.path(name))
+        self.assertTrue(any(function == 'busy' for _, _, function in stats.stats))
+
+    def test_slow_request_saves_collapsed_stacks(self):
+        profiler = RequestProfiler(self.directory, sample_rate=0, slow_ms=10, max_files=10, interval_ms=1)
+        handle = profiler.start()
+        busy(0.05)
+        name = profiler.finish(handle, 0.05, 'POST /api/calculate')
+
+        self.assertTrue(name.endswith('.folded'))
+        with open(profiler.path(name)) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any('busy (test_profiler.py' in line for line in lines))
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+
+    def test_fast_request_is_discarded(self):
+        profiler = RequestProfiler(self.directory, sample_rate=0, slow_ms=1000, max_files=10, interval_ms=1)
+        handle = profiler.start()
+        self.assertIsNone(profiler.finish(handle, 0.001, 'GET /api/profiles'))
+        self.assertEqual(profiler.list(), [])
+
+    def test_retention_keeps_newest(self):
+        profiler = RequestProfiler(self.directory, sample_rate=1, slow_ms=0, max_files=2)
+        names = []
+        for i in range(4):
+            names.append(profiler.finish(profiler.start(), 0.001, f'request {i}'))
+            time.sleep(0.01)
+        self.assertEqual([profile['name'] for profile in profiler.list()], names[:1:-1])
+
+    def test_path_rejects_unsafe_names(self):
+        profiler = RequestProfiler(self.directory, sample_rate=1, slow_ms=0, max_files=2)
+        open(os.path.join(self.directory, 'notes.txt'), 'w').close()
+        self.assertIsNone(profiler.path('../etc/passwd'))
+        self.assertIsNone(profiler.path('notes.txt'))
+        self.assertIsNone(profiler.path('missing.pstats'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+import unittest
+import numpy as np
+from parameterized import parameterized
+from .calculator import calculate_fire_projection
+from .projection import (
+    build_yearly_array,
+    solve_real_net_worth,
+    calculate_fire_projection_vectorized,
+    build_projection_state,
+    apply_projection_delta,
+    projection_result,
+    build_step_array,
+    run_projection,
+    calculate_income_tax_array
+)
+
+BASE_DATA = {
+    'currentAge': 30,
+    'endAge': 65,
+    'currentNetWorth': 100000,
+    'annualReturn': 7,
+    'inflationRate': 2,
+    'retirementSpending': 40000,
+    'withdrawalRate': 4,
+    'preTax401k': 23000,
+    'employerMatch': 5,
+    'state': 'CA',
+    'stopAtFire': False,
+    'yearlyIncome': [{'startAge': 30, 'endAge': 65, 'amount': 100000}],
+    'yearlySpending': [{'startAge': 30, 'endAge': 65, 'amount': 50000}]
+}
+
+ARRAY_FIELDS = [
+    'nominalNetWorth',
+    'realNetWorth',
+    'yearlyPreTaxIncome',
+    'yearlyAfterTaxIncome',
+    'yearlySpending',
+    'yearlyTaxRates',
+    'yearlySavings',
+    'yearlyRealInterest'
+]
+
+
+class TestProjection(unittest.TestCase):
+    @parameterized.expand([
+        ("single_entry", [{'startAge': 30, 'endAge': 35, 'amount': 100}], 30, 40,
+         [100] * 6 + [0] * 5),
+        ("overlapping_entries", [
+            {'startAge': 30, 'endAge': 32, 'amount': 100},
+            {'startAge': 32, 'endAge': 33, 'amount': 50}
+        ], 30, 34, [100, 100, 150, 50, 0]),
+        ("clipped_to_range", [{'startAge': 20, 'endAge': 80, 'amount': 10}], 30, 33,
+         [10, 10, 10, 10]),
+        ("out_of_range", [{'startAge': 70, 'endAge': 80, 'amount': 10}], 30, 33,
+         [0, 0, 0, 0]),
+        ("no_entries", [], 30, 32, [0, 0, 0]),
+    ])
+    def test_build_yearly_array(self, name, entries, current_age, end_age, expected):
+        self.assertEqual(build_yearly_array(entries, current_age, end_age).tolist(), expected)
+
+    def test_solve_real_net_worth(self):
+        savings = [0, 1000, 2000, -500, 0]
+        balance = 50000
+        expected = [balance]
+        for saving in savings[1:]:
+            balance = balance + saving + balance * 0.05
+            expected.append(balance)
+        result = solve_real_net_worth(50000, savings, 0.05)
+        for actual, wanted in zip(result, expected):
+            self.assertAlmostEqual(actual, wanted, places=6)
+
+    @parameterized.expand([
+        ("base", {}),
+        ("stop_at_fire", {'stopAtFire': True}),
+        ("fire_in_first_year", {'currentNetWorth': 2000000, 'stopAtFire': True}),
+        ("never_reaches_fire", {'currentNetWorth': 0, 'yearlySpending': [
+            {'startAge': 30, 'endAge': 65, 'amount': 95000}
+        ]}),
+        ("impossible_fire", {'withdrawalRate': 10, 'stopAtFire': True}),
+        ("texas", {'state': 'TX'}),
+        ("zero_return", {'annualReturn': 2}),
+        ("negative_real_return", {'annualReturn': 1, 'inflationRate': 3}),
+        ("gaps_and_overlaps", {
+            'stopAtFire': True,
+            'yearlyIncome': [
+                {'startAge': 30, 'endAge': 40, 'amount': 150000.5},
+                {'startAge': 35, 'endAge': 45, 'amount': 60000},
+                {'startAge': 50, 'endAge': 55, 'amount': 30000}
+            ],
+            'yearlySpending': [
+                {'startAge': 25, 'endAge': 50, 'amount': 45000},
+                {'startAge': 40, 'endAge': 70, 'amount': 12000.25}
+            ]
+        }),
+        ("no_entries", {'yearlyIncome': [], 'yearlySpending': []}),
+    ])
+    def test_parity_with_loop_engine(self, name, overrides):
+        data = {**BASE_DATA, **overrides}
+        expected = calculate_fire_projection(data)
+        result = calculate_fire_projection_vectorized(data)
+
+        self.assertEqual(set(result), set(expected))
+        self.assertEqual(result['years'], expected['years'])
+        self.assertEqual(result['fireAge'], expected['fireAge'])
+        self.assertAlmostEqual(result['requiredSavings'], expected['requiredSavings'])
+        self.assertEqual(result.get('error'), expected.get('error'))
+        for field in ARRAY_FIELDS:
+            self.assertEqual(len(result[field]), len(expected[field]), field)
+            for actual, wanted in zip(result[field], expected[field]):
+                self.assertAlmostEqual(actual, wanted, delta=1e-6 * max(1, abs(wanted)), msg=field)
+
+    def assertProjectionsEqual(self, result, expected):
+        self.assertEqual(result['fireAge'], expected['fireAge'])
+        self.assertEqual(result.get('error'), expected.get('error'))
+        for field in ARRAY_FIELDS:
+            self.assertEqual(len(result[field]), len(expected[field]), field)
+            for actual, wanted in zip(result[field], expected[field]):
+                self.assertAlmostEqual(actual, wanted, delta=1e-6 * max(1, abs(wanted)), msg=field)
+
+    @parameterized.expand([
+        ("spending_tail", {'yearlySpending': [
+            {'startAge': 30, 'endAge': 50, 'amount': 50000},
+            {'startAge': 51, 'endAge': 65, 'amount': 30000}
+        ]}, 21),
+        ("income_tail", {'yearlyIncome': [
+            {'startAge': 30, 'endAge': 40, 'amount': 100000},
+            {'startAge': 41, 'endAge': 65, 'amount': 150000}
+        ]}, 11),
+        ("retirement_spending", {'retirementSpending': 60000}, 36),
+        ("stop_at_fire", {'stopAtFire': True}, 36),
+        ("annual_return", {'annualReturn': 6}, 0),
+        ("unchanged", {'yearlySpending': BASE_DATA['yearlySpending']}, 36),
+    ])
+    def test_delta_matches_full_recompute(self, name, patch, expected_start):
+        state = build_projection_state(BASE_DATA)
+        new_state, start_index = apply_projection_delta(state, patch)
+
+        self.assertEqual(start_index, expected_start)
+        self.assertProjectionsEqual(
+            projection_result(new_state),
+            calculate_fire_projection_vectorized({**BASE_DATA, **patch})
+        )
+
+    def test_chained_deltas(self):
+        state = build_projection_state({**BASE_DATA, 'stopAtFire': True})
+        state, _ = apply_projection_delta(state, {'retirementSpending': 35000})
+        state, _ = apply_projection_delta(state, {'yearlySpending': [{'startAge': 30, 'endAge': 65, 'amount': 45000}]})
+        expected = calculate_fire_projection_vectorized({
+            **BASE_DATA,
+            'stopAtFire': True,
+            'retirementSpending': 35000,
+            'yearlySpending': [{'startAge': 30, 'endAge': 65, 'amount': 45000}]
+        })
+        self.assertProjectionsEqual(projection_result(state), expected)
+
+    @parameterized.expand([
+        ("yearly_matches_build_yearly_array", [{'startAge': 31, 'endAge': 32, 'amount': 120}], 1,
+         [0, 120, 120, 0]),
+        ("monthly_spreads_amount", [{'startAge': 31, 'endAge': 31, 'amount': 120}], 12,
+         [0] * 12 + [10] * 12 + [0] * 24),
+        ("monthly_mid_year_start", [{'startAge': 30.5, 'endAge': 30, 'amount': 120}], 12,
+         [0] * 6 + [10] * 6 + [0] * 36),
+    ])
+    def test_build_step_array(self, name, entries, steps_per_year, expected):
+        self.assertEqual(build_step_array(entries, 30, 33, steps_per_year).tolist(), expected)
+
+    @parameterized.expand([("monthly", 12), ("biweekly", 26)])
+    def test_granular_flows_add_up_to_yearly(self, granularity, steps_per_year):
+        yearly = run_projection(BASE_DATA)
+        result = run_projection({**BASE_DATA, 'granularity': granularity})
+        downsampled = run_projection({**BASE_DATA, 'granularity': granularity, 'downsample': 'yearly'})
+
+        self.assertEqual(len(result['years']), len(yearly['years']) * steps_per_year)
+        self.assertEqual(downsampled['years'], yearly['years'])
+        self.assertEqual(downsampled['stepsPerPoint'], steps_per_year)
+        # Tax is computed on each year's total income, so the yearly sums match the yearly engine
+        for field in ('yearlyPreTaxIncome', 'yearlyAfterTaxIncome', 'yearlySpending', 'yearlyTaxRates'):
+            for actual, wanted in zip(downsampled[field], yearly[field]):
+                self.assertAlmostEqual(actual, wanted, places=6, msg=field)
+        # Savings compound within the year, so FIRE comes no later than in the yearly engine
+        self.assertLessEqual(result['fireAge'], yearly['fireAge'])
+        self.assertGreater(result['fireAge'], yearly['fireAge'] - 2)
+
+    def test_granular_stop_at_fire(self):
+        result = run_projection({**BASE_DATA, 'granularity': 'monthly', 'stopAtFire': True})
+        fire_index = result['years'].index(result['fireAge'])
+        self.assertGreater(result['yearlyPreTaxIncome'][fire_index - 1], 0)
+        self.assertEqual(set(result['yearlyPreTaxIncome'][fire_index:]), {0})
+        self.assertEqual(set(result['yearlySpending'][fire_index:]), {BASE_DATA['retirementSpending'] / 12})
+
+    def test_downsample_samples_stocks_and_sums_flows(self):
+        result = run_projection(BASE_DATA)
+        downsampled = run_projection({**BASE_DATA, 'downsample': 10})
+        self.assertEqual(downsampled['years'], result['years'][::10])
+        self.assertEqual(downsampled['realNetWorth'], result['realNetWorth'][::10])
+        self.assertAlmostEqual(downsampled['yearlySavings'][-1], sum(result['yearlySavings'][30:]))
+
+    @parameterized.expand([
+        ("unknown_granularity", {'granularity': 'daily'}),
+        ("unknown_downsample", {'downsample': 'weekly'}),
+    ])
+    def test_invalid_granularity_options(self, name, overrides):
+        with self.assertRaises(ValueError):
+            run_projection({**BASE_DATA, **overrides})
+
+    def test_income_tax_array_rejects_mismatched_401k(self):
+        with self.assertRaisesRegex(ValueError, 'preTax401k has 2 values but there are 3 incomes'):
+            calculate_income_tax_array(np.array([100000.0, 110000.0, 0.0]), 'CA', [23000, 23000], 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
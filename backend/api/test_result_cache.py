@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from parameterized import parameterized
+from .result_cache import MemoryBackend, ResultCache, SqliteBackend, config_hash
+from .test_projection import BASE_DATA
+
+
+class TestResultCache(unittest.TestCase):
+    def test_config_hash_ignores_key_order_and_entry_ids(self):
+        data = {**BASE_DATA, 'yearlyIncome': [
+            {'id': 'a', 'startAge': 30, 'endAge': 40, 'amount': 100000},
+            {'id': 'b', 'startAge': 41, 'endAge': 65, 'amount': 120000}
+        ]}
+        same = dict(reversed(list(data.items())))
+        same['yearlyIncome'] = [
+            {'amount': 120000.0, 'endAge': 65, 'startAge': 41, 'id': 'x'},
+            {'amount': 100000, 'endAge': 40, 'startAge': 30, 'id': 'y'}
+        ]
+        self.assertEqual(config_hash(data), config_hash(same))
+        self.assertNotEqual(config_hash(data), config_hash({**data, 'annualReturn': 8}))
+
+    def backend(self, name, maxsize=2, ttl=60):
+        if name == 'memory':
+            return MemoryBackend(maxsize, ttl)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SqliteBackend(os.path.join(directory.name, 'cache.sqlite3'), maxsize, ttl)
+
+    @parameterized.expand([("memory",), ("sqlite",)])
+    def test_hits_misses_and_saved_latency(self, name):
+        cache = ResultCache(self.backend(name))
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', b'{"fireAge": 45}', 50.0)
+        body, saved_ms = cache.get('a')
+
+        self.assertEqual(body, b'{"fireAge": 45}')
+        self.assertGreater(saved_ms, 0)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['backend'], name)
+
+    @parameterized.expand([("memory",), ("sqlite",)])
+    def test_size_bound(self, name):
+        cache = ResultCache(self.backend(name, maxsize=2))
+        for key in ('a', 'b', 'c'):
+            cache.set(key, b'{}', 1.0)
+        self.assertEqual(cache.stats()['size'], 2)
+        self.assertIsNotNone(cache.get('c'))
+
+    @parameterized.expand([("memory",), ("sqlite",)])
+    def test_ttl_expiry(self, name):
+        cache = ResultCache(self.backend(name, ttl=-1))
+        cache.set('a', b'{}', 1.0)
+        self.assertIsNone(cache.get('a'))
+
+    def test_sqlite_is_shared_between_instances(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'cache.sqlite3')
+        SqliteBackend(path, 10, 60).set('a', b'{}', 1.0)
+        self.assertEqual(SqliteBackend(path, 10, 60).get('a'), (b'{}', 1.0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from unittest import mock
+import numpy as np
+from parameterized import parameterized
+from . import schema
+from .projection import run_projection
+from .schema import ValidationError, normalize_entries, parse_calculate_config
+from .test_projection import BASE_DATA
+
+
+class TestSchema(unittest.TestCase):
+    @parameterized.expand([
+        ("empty", [], []),
+        ("drops_ids", [{'id': 'a', 'startAge': 30, 'endAge': 40, 'amount': 5}], [{'startAge': 30, 'endAge': 40, 'amount': 5}]),
+        ("sorted", [
+            {'startAge': 50, 'endAge': 60, 'amount': 2},
+            {'startAge': 30, 'endAge': 40, 'amount': 1}
+        ], [
+            {'startAge': 30, 'endAge': 40, 'amount': 1},
+            {'startAge': 50, 'endAge': 60, 'amount': 2}
+        ]),
+        ("overlaps_summed", [
+            {'startAge': 30, 'endAge': 45, 'amount': 100},
+            {'startAge': 40, 'endAge': 50, 'amount': 50}
+        ], [
+            {'startAge': 30, 'endAge': 39, 'amount': 100},
+            {'startAge': 40, 'endAge': 45, 'amount': 150},
+            {'startAge': 46, 'endAge': 50, 'amount': 50}
+        ]),
+        ("adjacent_merged", [
+            {'startAge': 30, 'endAge': 35, 'amount': 10},
+            {'startAge': 36, 'endAge': 40, 'amount': 10}
+        ], [{'startAge': 30, 'endAge': 40, 'amount': 10}]),
+        ("clipped", [{'startAge': 20, 'endAge': 90, 'amount': 10}], [{'startAge': 30, 'endAge': 65, 'amount': 10}]),
+        ("outside_dropped", [{'startAge': 70, 'endAge': 90, 'amount': 10}], []),
+        ("cancelling_dropped", [
+            {'startAge': 30, 'endAge': 40, 'amount': 10},
+            {'startAge': 30, 'endAge': 40, 'amount': -10}
+        ], []),
+    ])
+    def test_normalize_entries(self, name, entries, expected):
+        self.assertEqual(normalize_entries(entries, 'yearlyIncome', 30, 65), expected)
+
+    def test_fractional_ages(self):
+        entries = [{'startAge': 30.5, 'endAge': 31.25, 'amount': 12}]
+        self.assertEqual(normalize_entries(entries, 'yearlyIncome', 30, 65, fractional_ages=True), entries)
+        with self.assertRaises(ValidationError):
+            normalize_entries(entries, 'yearlyIncome', 30, 65)
+
+    @parameterized.expand([
+        ("not_object", []),
+        ("missing_field", {key: value for key, value in BASE_DATA.items() if key != 'withdrawalRate'}),
+        ("string_number", {**BASE_DATA, 'annualReturn': '7'}),
+        ("boolean_number", {**BASE_DATA, 'preTax401k': True}),
+        ("fractional_age", {**BASE_DATA, 'currentAge': 30.5}),
+        ("end_before_current", {**BASE_DATA, 'endAge': 20}),
+        ("too_long", {**BASE_DATA, 'endAge': 30 + schema.MAX_PROJECTION_YEARS}),
+        ("zero_withdrawal", {**BASE_DATA, 'withdrawalRate': 0}),
+        ("unknown_filing_status", {**BASE_DATA, 'filingStatus': 'joint'}),
+        ("unknown_granularity", {**BASE_DATA, 'granularity': 'daily'}),
+        ("entries_not_list", {**BASE_DATA, 'yearlyIncome': {'startAge': 30}}),
+        ("entry_missing_amount", {**BASE_DATA, 'yearlyIncome': [{'startAge': 30, 'endAge': 40}]}),
+        ("entry_reversed", {**BASE_DATA, 'yearlySpending': [{'startAge': 40, 'endAge': 30, 'amount': 1}]}),
+        ("unknown_state", {**BASE_DATA, 'state': 'ZZ'}),
+        ("unknown_tax_year", {**BASE_DATA, 'taxYear': 1990}),
+        ("string_summary_only", {**BASE_DATA, 'summaryOnly': 'yes'}),
+        ("unknown_downsample", {**BASE_DATA, 'granularity': 'monthly', 'downsample': 'weekly'}),
+        ("zero_downsample", {**BASE_DATA, 'downsample': -1}),
+        ("retained_monthly", {**BASE_DATA, 'retainState': True, 'granularity': 'monthly'}),
+        ("retained_downsampled", {**BASE_DATA, 'retainState': True, 'downsample': 5}),
+        ("retained_summary", {**BASE_DATA, 'retainState': True, 'summaryOnly': True}),
+    ])
+    def test_rejects_bad_input(self, name, data):
+        with self.assertRaises(ValidationError):
+            parse_calculate_config(data)
+
+    def test_error_names_the_entry(self):
+        data = {**BASE_DATA, 'yearlyIncome': [BASE_DATA['yearlyIncome'][0], {'startAge': 30, 'endAge': 40, 'amount': None}]}
+        with self.assertRaisesRegex(ValidationError, r'yearlyIncome\[1\]\.amount'):
+            parse_calculate_config(data)
+
+    def test_whole_float_ages_become_ints(self):
+        config = parse_calculate_config({**BASE_DATA, 'currentAge': 30.0, 'endAge': 65.0})
+        self.assertEqual((config['currentAge'], config['endAge']), (30, 65))
+        self.assertIsInstance(config['currentAge'], int)
+
+    def test_unclipped_entries(self):
+        data = {**BASE_DATA, 'yearlyIncome': [{'startAge': 20, 'endAge': 90, 'amount': 10}]}
+        self.assertEqual(
+            parse_calculate_config(data, clip_entries=False)['yearlyIncome'],
+            [{'startAge': 20, 'endAge': 90, 'amount': 10}]
+        )
+
+    @parameterized.expand([
+        ("vectorized", 'vectorized', 'yearly'),
+        ("loop", 'loop', 'yearly'),
+        ("monthly", 'vectorized', 'monthly'),
+    ])
+    def test_normalized_config_gives_same_projection(self, name, engine, granularity):
+        data = {
+            **BASE_DATA,
+            'engine': engine,
+            'granularity': granularity,
+            'stopAtFire': True,
+            'yearlyIncome': [
+                {'id': 'a', 'startAge': 25, 'endAge': 45, 'amount': 90000},
+                {'id': 'b', 'startAge': 40, 'endAge': 55, 'amount': 60000},
+                {'id': 'c', 'startAge': 56, 'endAge': 80, 'amount': 20000}
+            ],
+            'yearlySpending': [
+                {'id': 'd', 'startAge': 30, 'endAge': 50, 'amount': 40000},
+                {'id': 'e', 'startAge': 51, 'endAge': 65, 'amount': 40000}
+            ]
+        }
+        expected = run_projection(data)
+        result = run_projection(parse_calculate_config(data))
+        self.assertEqual(result['fireAge'], expected['fireAge'])
+        for key, value in expected.items():
+            if isinstance(value, list):
+                np.testing.assert_allclose(result[key], value, rtol=1e-9, atol=1e-6)
+
+    def test_decode_json_without_orjson(self):
+        with mock.patch.object(schema, 'orjson', None):
+            self.assertEqual(schema.decode_json(b'{"a": [1, 2.5]}'), {'a': [1, 2.5]})
+        self.assertEqual(schema.decode_json(b'{"a": [1, 2.5]}'), {'a': [1, 2.5]})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+import unittest
+from .projection import calculate_fire_projection_vectorized
+from .schema import ValidationError
+from .snapshot import ENGINE_MODULES, ENGINE_VERSION, build_projection_snapshot, engine_version, snapshot_is_current
+from .test_projection import BASE_DATA
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_projection_snapshot_invalidation(self):
+        snapshot = build_projection_snapshot(BASE_DATA)
+        self.assertEqual(snapshot['result'], calculate_fire_projection_vectorized(BASE_DATA))
+        self.assertTrue(snapshot_is_current(snapshot, dict(reversed(list(BASE_DATA.items())))))
+        self.assertFalse(snapshot_is_current(snapshot, {**BASE_DATA, 'annualReturn': 8}))
+        self.assertFalse(snapshot_is_current({**snapshot, 'version': 'old'}, BASE_DATA))
+        self.assertFalse(snapshot_is_current(None, BASE_DATA))
+
+    def test_engine_change_changes_version(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ENGINE_MODULES:
+            shutil.copy(os.path.join(os.path.dirname(__file__), name), directory)
+        self.assertEqual(engine_version(directory), ENGINE_VERSION)
+        with open(os.path.join(directory, 'projection.py'), 'a') as f:
+            f.write('\n# changed\n')
+        self.assertNotEqual(engine_version(directory), ENGINE_VERSION)
+
+    def test_snapshot_validates_config(self):
+        with self.assertRaises(ValidationError):
+            build_projection_snapshot({**BASE_DATA, 'endAge': 5000})
+
+if __name__ == '__main__':
+    unittest.main()
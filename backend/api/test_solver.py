@@ -0,0 +1,60 @@
+import unittest
+from parameterized import parameterized
+from .calculator import find_fire_age
+from .solver import solve_for_target, with_value
+from .test_projection import BASE_DATA
+
+
+class TestSolver(unittest.TestCase):
+    @parameterized.expand([
+        ("more_income", 'income', 40),
+        ("less_income", 'income', 55),
+        ("spending", 'spending', 40),
+        ("current_net_worth", 'currentNetWorth', 38),
+        ("pre_tax_401k", 'preTax401k', 45),
+    ])
+    def test_solution_hits_target(self, name, variable, target_age):
+        result = solve_for_target({**BASE_DATA, 'targetAge': target_age, 'variable': variable})
+        self.assertLessEqual(result['fireAge'], target_age)
+
+        # Slightly less favourable than the solution must miss the target
+        step = result['value'] * 1e-3 + 10
+        worse = result['value'] - step if variable != 'spending' else result['value'] + step
+        if worse >= 0:
+            fire_age = find_fire_age(with_value(BASE_DATA, variable, worse))
+            self.assertTrue(fire_age is None or fire_age > target_age)
+
+    def test_already_reached_returns_lower_bound(self):
+        data = {**BASE_DATA, 'currentNetWorth': 2000000}
+        result = solve_for_target({**data, 'targetAge': 40, 'variable': 'preTax401k'})
+        self.assertEqual(result['value'], 0)
+
+    @parameterized.expand([
+        ("fire_at_current_age", {'currentNetWorth': 5000000}),
+        ("no_spending", {'yearlySpending': []}),
+        ("spending_after_target", {
+            'currentNetWorth': 900000, 'yearlySpending': [{'startAge': 50, 'endAge': 65, 'amount': 40000}]
+        }),
+    ])
+    def test_spending_unbounded(self, name, overrides):
+        result = solve_for_target({**BASE_DATA, **overrides, 'targetAge': 40, 'variable': 'spending'})
+        self.assertIsNone(result['value'])
+        self.assertTrue(result['unbounded'])
+        self.assertLessEqual(result['fireAge'], 40)
+
+    @parameterized.expand([
+        ("unknown_variable", {'variable': 'age', 'targetAge': 40}),
+        ("target_out_of_range", {'variable': 'income', 'targetAge': 90}),
+        ("fire_impossible", {'variable': 'income', 'targetAge': 40, 'withdrawalRate': 10}),
+        ("unreachable_401k", {'variable': 'preTax401k', 'targetAge': 31}),
+        ("fractional_age", {'variable': 'income', 'targetAge': 40, 'currentAge': 30.5}),
+        ("fractional_target", {'variable': 'income', 'targetAge': 40.5}),
+        ("string_number", {'variable': 'income', 'targetAge': 40, 'annualReturn': '7'}),
+        ("unconverged", {'variable': 'currentNetWorth', 'targetAge': 40, 'tolerance': 1e-300}),
+    ])
+    def test_errors(self, name, overrides):
+        with self.assertRaises(ValueError):
+            solve_for_target({**BASE_DATA, **overrides})
+
+if __name__ == '__main__':
+    unittest.main()
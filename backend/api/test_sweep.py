@@ -0,0 +1,64 @@
+import unittest
+from parameterized import parameterized
+from .projection import calculate_fire_projection_vectorized
+from .sweep import apply_cell, run_sweep
+from .test_projection import BASE_DATA
+
+
+class TestSweep(unittest.TestCase):
+    def test_apply_cell_scales_entries(self):
+        config = apply_cell(BASE_DATA, ['spendingScale', 'annualReturn'], [0.5, 6])
+        self.assertEqual(config['yearlySpending'][0]['amount'], 25000)
+        self.assertEqual(config['yearlyIncome'], BASE_DATA['yearlyIncome'])
+        self.assertEqual(config['annualReturn'], 6)
+        self.assertNotIn('spendingScale', config)
+
+    @parameterized.expand([
+        ("return_only_axes", [
+            {'name': 'withdrawalRate', 'values': [3, 3.5, 4]},
+            {'name': 'annualReturn', 'values': [5, 7]}
+        ], 1),
+        ("mixed_axes", [
+            {'name': 'spendingScale', 'values': [0.8, 1, 1.2]},
+            {'name': 'retirementSpending', 'values': [30000, 50000]}
+        ], 1),
+        ("parallel", [
+            {'name': 'preTax401k', 'values': [0, 23000]},
+            {'name': 'annualReturn', 'values': [6, 8]}
+        ], 2),
+    ])
+    def test_cells_match_single_projection(self, name, axes, workers):
+        result = run_sweep({'base': BASE_DATA, 'axes': axes, 'workers': workers})
+        self.assertEqual(result['shape'], [len(axis['values']) for axis in axes])
+
+        for i, first in enumerate(axes[0]['values']):
+            for j, second in enumerate(axes[1]['values']):
+                config = apply_cell(BASE_DATA, [axes[0]['name'], axes[1]['name']], [first, second])
+                expected = calculate_fire_projection_vectorized(config)
+                self.assertEqual(result['fireAge'][i][j], expected['fireAge'])
+                self.assertAlmostEqual(result['requiredSavings'][i][j], expected['requiredSavings'])
+                self.assertAlmostEqual(result['finalRealNetWorth'][i][j], expected['realNetWorth'][-1])
+
+    def test_base_output_options_ignored(self):
+        axes = [{'name': 'annualReturn', 'values': [5, 7]}]
+        expected = run_sweep({'base': BASE_DATA, 'axes': axes})
+        result = run_sweep({'base': {**BASE_DATA, 'summaryOnly': True, 'downsample': 5}, 'axes': axes})
+        self.assertEqual(result, expected)
+
+    @parameterized.expand([
+        ("string_number", {'annualReturn': '7'}),
+        ("too_long", {'endAge': 20000}),
+        ("monthly", {'granularity': 'monthly'}),
+    ])
+    def test_rejects_bad_base(self, name, overrides):
+        with self.assertRaises(ValueError):
+            run_sweep({'base': {**BASE_DATA, **overrides}, 'axes': [{'name': 'annualReturn', 'values': [5]}]})
+
+    def test_rejects_oversized_sweep(self):
+        axes = [{'name': 'annualReturn', 'values': list(range(200))},
+                {'name': 'inflationRate', 'values': list(range(200))}]
+        with self.assertRaises(ValueError):
+            run_sweep({'base': BASE_DATA, 'axes': axes})
+
+if __name__ == '__main__':
+    unittest.main()
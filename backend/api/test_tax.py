@@ -0,0 +1,129 @@
+import unittest
+from parameterized import parameterized
+from .tax import (
+    FEDERAL_TAX_RATES,
+    STATE_TAX_RATES,
+    calculate_tax,
+    calculate_tax_for_bracket,
+    calculate_tax_batch,
+    calculate_tax_for_bracket_batch
+)
+from .tax_tables import (
+    FILING_STATUSES, NO_TAX, bracket_tax, build_tax_table, compile_brackets, get_tax_tables, load_tax_years
+)
+
+INCOMES = [-5000, 0, 1, 10756, 10756.5, 10757, 25000, 47150, 100000, 168600, 200000,
+           230000, 360659.5, 500000, 721315, 2500000]
+
+
+class TestTax(unittest.TestCase):
+    @parameterized.expand([
+        ("federal", FEDERAL_TAX_RATES),
+        ("california_with_gaps", STATE_TAX_RATES['CA']),
+        ("overlapping", [(0, 100, 0.1), (50, 150, 0.2), (200, float('inf'), 0.3)]),
+        ("no_brackets", []),
+    ])
+    def test_compiled_brackets_match_loop(self, name, brackets):
+        compiled = compile_brackets(brackets)
+        result = calculate_tax_for_bracket_batch(INCOMES, compiled)
+        for income, tax in zip(INCOMES, result):
+            self.assertAlmostEqual(tax, calculate_tax_for_bracket(income, brackets), places=6)
+
+    @parameterized.expand([
+        ("california", 'CA', 0),
+        ("california_401k", 'CA', 23000),
+        ("texas", 'TX', 10000),
+    ])
+    def test_calculate_tax_batch_matches_single(self, name, state, pre_tax_401k):
+        result = calculate_tax_batch(INCOMES, state, pre_tax_401k)
+        for i, income in enumerate(INCOMES):
+            expected = calculate_tax({'income': income, 'state': state, 'preTax401k': pre_tax_401k})
+            for key, value in expected.items():
+                self.assertAlmostEqual(result[key][i], value, places=6, msg=key)
+
+    def test_calculate_tax_batch_per_income_401k(self):
+        result = calculate_tax_batch([100000, 200000], 'CA', [0, 23000])
+        expected = calculate_tax({'income': 200000, 'state': 'CA', 'preTax401k': 23000})
+        self.assertAlmostEqual(result['totalTax'][1], expected['totalTax'], places=6)
+
+    @parameterized.expand([
+        ("too_few", [23000]),
+        ("too_many", [0, 23000, 23000]),
+    ])
+    def test_calculate_tax_batch_rejects_mismatched_401k(self, name, pre_tax_401k):
+        with self.assertRaisesRegex(ValueError, 'preTax401k has'):
+            calculate_tax_batch([100000, 200000], 'CA', pre_tax_401k)
+
+    @parameterized.expand([
+        ("federal", FEDERAL_TAX_RATES),
+        ("california_with_gaps", STATE_TAX_RATES['CA']),
+        ("no_brackets", []),
+    ])
+    def test_bracket_tax_matches_loop(self, name, brackets):
+        table = build_tax_table(brackets)
+        for income in INCOMES:
+            self.assertAlmostEqual(bracket_tax(income, table), calculate_tax_for_bracket(income, brackets), places=6)
+
+    @parameterized.expand([
+        (state, status, year)
+        for state in ('CA', 'NY', 'MA', 'TX', 'FL')
+        for status in FILING_STATUSES
+        for year in (2024, 2025)
+    ])
+    def test_calculate_tax_batch_matches_single_for_every_table(self, state, status, year):
+        result = calculate_tax_batch(INCOMES, state, 23000, status, year)
+        for i, income in enumerate(INCOMES):
+            expected = calculate_tax({
+                'income': income, 'state': state, 'preTax401k': 23000, 'filingStatus': status, 'taxYear': year
+            })
+            for key, value in expected.items():
+                self.assertAlmostEqual(result[key][i], value, places=6, msg=key)
+
+    def test_state_deduction_is_the_states_own(self):
+        federal, ny, _ = get_tax_tables('NY')
+        result = calculate_tax({'income': 100000, 'state': 'NY'})
+        self.assertEqual(ny.deduction, 8000)
+        self.assertAlmostEqual(result['stateTax'], calculate_tax_for_bracket(92000, STATE_TAX_RATES['NY']))
+        self.assertEqual(calculate_tax({'income': 100000, 'state': 'TX'})['stateTax'], 0)
+
+    def test_filing_status_changes_federal_tax(self):
+        single = calculate_tax({'income': 150000, 'state': 'TX'})
+        joint = calculate_tax({'income': 150000, 'state': 'TX', 'filingStatus': 'married_joint'})
+        federal, _, _ = get_tax_tables('TX', 'married_joint')
+        self.assertAlmostEqual(joint['federalTax'], calculate_tax_for_bracket(150000 - 29200, federal.brackets))
+        self.assertLess(joint['federalTax'], single['federalTax'])
+
+    def test_later_years_inherit_state_tables(self):
+        years = load_tax_years()
+        self.assertIs(years[2025].states['NY'], years[2024].states['NY'])
+        self.assertNotEqual(years[2025].federal['single'].deduction, years[2024].federal['single'].deduction)
+        self.assertIs(get_tax_tables('TX', tax_year=2025)[1], NO_TAX)
+
+    @parameterized.expand([
+        ("unknown", 'ZZ'),
+        ("missing_from_data", 'NJ'),
+        ("lowercase", 'ca'),
+        ("not_a_string", None),
+    ])
+    def test_unknown_state_rejected(self, name, state):
+        with self.assertRaisesRegex(ValueError, 'available states'):
+            get_tax_tables(state)
+
+    def test_tables_are_shared_read_only(self):
+        self.assertIs(load_tax_years(), load_tax_years())
+        federal, _, _ = get_tax_tables('CA')
+        with self.assertRaises(ValueError):
+            federal.compiled.rates[0] = 1
+        with self.assertRaises(TypeError):
+            load_tax_years()[2024].states['CA'] = None
+
+    @parameterized.expand([
+        ("unknown_status", {'filingStatus': 'widowed'}),
+        ("unknown_year", {'taxYear': 1999}),
+    ])
+    def test_unknown_table_raises(self, name, overrides):
+        with self.assertRaises(ValueError):
+            calculate_tax({'income': 100000, 'state': 'CA', **overrides})
+
+if __name__ == '__main__':
+    unittest.main()
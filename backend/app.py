@@ -1,101 +1,512 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g, send_file, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from pymongo import MongoClient
-from bson.objectid import ObjectId
-from api.calculator import calculate_fire_projection
-from api.tax import calculate_tax
+from api.calculator import iter_fire_projection
+from api.projection import apply_projection_delta, build_projection_state, projection_result, run_projection
+from api.snapshot import PROJECTION_VERSION, build_projection_snapshot, snapshot_is_current
+from api.montecarlo import run_monte_carlo
+from api.backtest import run_backtest
+from api.sweep import run_sweep
+from api.solver import solve_for_target
+from api.batch import run_batch
+from api.result_cache import config_hash, create_result_cache
+from api.cache import LRUCache
+from api.profiler import create_profiler
+from api.schema import ValidationError, decode_json, parse_calculate_config
+from api import bulk, db, encoding, metrics
+from api.tax import TAX_CACHE, cached_calculate_tax, calculate_tax_batch
+import hmac
+import itertools
+import json
 import logging
+import os
+import random
 import time
+import uuid
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-CORS(app, origins=[
+CORS_ORIGINS = [
     "http://localhost:5173",
     "https://nw.derricklin.net",
     "https://fire.derricklin.net"
-], max_age=3600)
+]
+CORS_EXPOSE_HEADERS = ['X-Cache', 'X-Cache-Saved-Ms', 'X-Projection-Snapshot', 'Server-Timing', 'ETag']
+CORS(app, origins=CORS_ORIGINS, max_age=3600, expose_headers=CORS_EXPOSE_HEADERS)
 
-# MongoDB connection
-client = MongoClient('mongodb://localhost:27017/')
-db = client.fire_calculator
-profiles = db.profiles
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Cached /api/calculate responses; RESULT_CACHE_BACKEND=none disables it
+RESULT_CACHE = create_result_cache()
+
+# Retained projection states for /api/calculate/delta, per worker process
+PROJECTION_STATES = LRUCache(int(os.getenv('PROJECTION_STATE_CACHE_SIZE', 256)))
+
+# Fraction of requests that get a completion log line; off by default
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv('REQUEST_LOG_SAMPLE_RATE', 0))
+# Add a Server-Timing header with the per-phase breakdown to every response
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'false').lower() == 'true'
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() with its encoding counted as the serialize phase, and request bodies decoded with orjson"""
+
+    def loads(self, s, **kwargs):
+        return decode_json(s)
+
+    def response(self, *args, **kwargs):
+        with metrics.phase('serialize'):
+            return super().response(*args, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+def dumps_json(obj):
+    """The compact JSON jsonify() sends"""
+    return app.json.dumps(obj, separators=(',', ':'))
+
+# Opt-in request profiler (PROFILE_SAMPLE_RATE / PROFILE_SLOW_MS); None when disabled
+PROFILER = create_profiler()
+# Bearer token for the /api/admin endpoints; they are disabled without one
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
 
 @app.before_request
 def before_request():
-    g.start_time = time.time()
-    logger.info(f'Received {request.method} request to {request.path}')
+    g.start_time = time.perf_counter()
+    metrics.start_request()
+    if request.is_json:
+        # Parse up front so the parse phase is timed; routes read the cached body
+        with metrics.phase('parse'):
+            request.get_json(silent=True)
+    if PROFILER is not None:
+        g.profile = PROFILER.start()
+
+def complete_request(method, route, path, status, started, phases, profile):
+    """Record a finished request; returns (duration, saved profile name)"""
+    duration = time.perf_counter() - started
+    metrics.observe_request(method, route, status, duration, phases)
+    profile_name = PROFILER.finish(profile, duration, f'{method} {route}') if PROFILER is not None else None
+    if REQUEST_LOG_SAMPLE_RATE and random.random() < REQUEST_LOG_SAMPLE_RATE:
+        logger.info(f'Completed {method} request to {path} in {duration:.3f}s with status {status}')
+    return duration, profile_name
 
 @app.after_request
 def after_request(response):
-    duration = time.time() - g.start_time
-    logger.info(f'Completed {request.method} request to {request.path} in {duration:.2f}s with status {response.status_code}')
+    phases = metrics.finish_request()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    args = (request.method, route, request.path, response.status_code, g.start_time, phases, g.pop('profile', None))
+    if response.is_streamed:
+        # The body (and its Mongo reads) comes after this returns, so the request is recorded once
+        # it has been sent; its headers are gone by then, hence no Server-Timing or X-Profile
+        response.response = metrics.iter_with_phases(response.response, phases)
+        response.call_on_close(lambda: complete_request(*args))
+        return response
+    duration, profile_name = complete_request(*args)
+    # The file name is only useful (and only shown) to whoever can download it
+    if profile_name and is_admin():
+        response.headers['X-Profile'] = profile_name
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = metrics.server_timing(phases, duration)
     return response
 
+@app.teardown_request
+def teardown_request(exception):
+    # A request that failed before after_request must still stop its profiler
+    if PROFILER is not None and g.get('profile') is not None:
+        PROFILER.finish(g.pop('profile'), time.perf_counter() - g.start_time, f'{request.method} {request.path} error')
+
+def is_admin():
+    """Whether the request carries the admin bearer token"""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+def admin_error():
+    """Error response unless the request carries the admin bearer token"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not is_admin():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return None
+
+@app.route('/api/admin/profiler', methods=['GET'])
+def list_request_profiles():
+    error = admin_error()
+    if error:
+        return error
+    if PROFILER is None:
+        return jsonify({'enabled': False, 'profiles': []})
+    return jsonify({'enabled': True, 'profiles': PROFILER.list()})
+
+@app.route('/api/admin/profiler/<name>', methods=['GET'])
+def download_request_profile(name):
+    error = admin_error()
+    if error:
+        return error
+    path = PROFILER.path(name) if PROFILER is not None else None
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, as_attachment=True, download_name=name)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    extra = []
+    tax_cache = TAX_CACHE.stats()
+    extra.append(metrics.render_counter('fire_tax_cache_hits_total', 'Tax cache hits', tax_cache['hits']))
+    extra.append(metrics.render_counter('fire_tax_cache_misses_total', 'Tax cache misses', tax_cache['misses']))
+    if RESULT_CACHE is not None:
+        result_cache = RESULT_CACHE.stats()
+        extra.append(metrics.render_counter('fire_result_cache_hits_total', 'Result cache hits', result_cache['hits']))
+        extra.append(metrics.render_counter('fire_result_cache_misses_total', 'Result cache misses', result_cache['misses']))
+        extra.append(metrics.render_gauge('fire_result_cache_size', 'Result cache entries', result_cache['size']))
+    extra.append(metrics.render_gauge('fire_projection_states', 'Retained projection states', PROJECTION_STATES.stats()['size']))
+    return Response(metrics.render_metrics(extra), mimetype='text/plain; version=0.0.4')
+
+def wants_stream():
+    """NDJSON streaming is requested with ?stream=true or Accept: application/x-ndjson"""
+    if request.args.get('stream') == 'true':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def ndjson_line(item):
+    return json.dumps(item) + '\n'
+
+# Per-year fields of a streamed row, as yielded by iter_fire_projection
+STREAM_ROW_KEYS = (
+    'nominalNetWorth', 'realNetWorth', 'yearlyPreTaxIncome', 'yearlyAfterTaxIncome', 'yearlySpending',
+    'yearlyTaxRates', 'yearlySavings', 'yearlyRealInterest'
+)
+
+def iter_projection_rows(result):
+    """A full projection as the summary and per-year rows iter_fire_projection streams"""
+    yield {key: result[key] for key in ('fireAge', 'requiredSavings', 'error') if key in result}
+    for i, year in enumerate(result['years']):
+        yield {'year': year, **{key: result[key][i] for key in STREAM_ROW_KEYS}}
+
+def stream_projection(data):
+    """One NDJSON line per scenario, or a summary line followed by one line per year"""
+    if isinstance(data, dict) and 'scenarios' in data:
+        def generate():
+            for index, scenario in enumerate(data['scenarios']):
+                try:
+                    yield ndjson_line({'scenario': index, **run_projection(parse_calculate_config(scenario))})
+                except Exception as e:
+                    yield ndjson_line({'scenario': index, 'error': str(e)})
+    else:
+        data = parse_calculate_config(data)
+        if data.get('granularity', 'yearly') != 'yearly' or data.get('downsample') or data.get('retainState'):
+            raise ValueError('Streaming supports yearly granularity without downsample or retainState')
+        # The loop engine yields each year as it is computed; the vectorized one computes them all first
+        if data.get('engine', 'loop') == 'loop':
+            rows = iter_fire_projection(data)
+        else:
+            rows = iter_projection_rows(run_projection({**data, 'summaryOnly': False}))
+        # Computing the summary up front turns bad input into a 400 before streaming starts
+        summary = next(rows)
+        if data.get('summaryOnly'):
+            rows.close()
+            rows = iter(())
+
+        def generate():
+            yield ndjson_line(summary)
+            try:
+                for row in rows:
+                    yield ndjson_line(row)
+            except Exception as e:
+                logger.error(f'Streaming calculate request failed: {str(e)}')
+                yield ndjson_line({'error': str(e)})
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def negotiated_response(obj, etag_parts=None, json_body=None):
+    """obj in the format and content coding the client accepts; JSON unless it asks for another"""
+    with metrics.phase('serialize'):
+        status, body, headers = encoding.encode_response(
+            obj, request.headers.get('Accept'), request.headers.get('Accept-Encoding'), etag_parts,
+            request.headers.get('If-None-Match') if request.method == 'GET' else None,
+            dumps_json, json_body
+        )
+    return Response(body, status, headers)
+
+def projection_etag_parts(config_key):
+    """ETag parts shared by a calculate response and a saved profile's projection"""
+    return ('projection', config_key, PROJECTION_VERSION)
+
+def result_cache_key(config_key):
+    """Result cache key; versioned like the ETag, as the SQLite backend outlives engine and tax table changes"""
+    return f'{config_key}:{PROJECTION_VERSION}'
+
+def retained_projection(state, recomputed_from):
+    """Projection response for a state, stored under a new handle for later deltas"""
+    handle = uuid.uuid4().hex
+    PROJECTION_STATES.set(handle, state)
+    result = projection_result(state)
+    result['projectionHandle'] = handle
+    result['recomputedFrom'] = state.config['currentAge'] + recomputed_from
+    return result
+
 @app.route('/api/calculate', methods=['POST'])
 def calculate():
     data = request.json
     try:
-        result = calculate_fire_projection(data)
-        return jsonify(result)
+        if wants_stream():
+            return stream_projection(data)
+        # Rejects bad input before any work and normalizes the income/spending entries
+        data = parse_calculate_config(data)
+        if data.get('retainState'):
+            # Entries left unclipped so a later delta can move the ages without losing any
+            config = parse_calculate_config(request.json, clip_entries=False)
+            return jsonify(retained_projection(build_projection_state(config), 0))
+        if RESULT_CACHE is None:
+            return negotiated_response(run_projection(data))
+
+        # Hashed only with a cache to look up; the ETag comes with it
+        key = config_hash(data)
+        cached = RESULT_CACHE.get(result_cache_key(key))
+        if cached is not None:
+            body, saved_ms = cached
+            response = negotiated_response(None, projection_etag_parts(key), body)
+            response.headers['X-Cache'] = 'HIT'
+            response.headers['X-Cache-Saved-Ms'] = f'{saved_ms:.2f}'
+            return response
+
+        started = time.perf_counter()
+        result = run_projection(data)
+        # The cache always holds the JSON body; other formats are encoded from it on a hit
+        with metrics.phase('serialize'):
+            body = (dumps_json(result) + '\n').encode()
+        RESULT_CACHE.set(result_cache_key(key), body, (time.perf_counter() - started) * 1000)
+        response = negotiated_response(result, projection_etag_parts(key), body)
+        response.headers['X-Cache'] = 'MISS'
+        return response
     except Exception as e:
         logger.error(f'Calculate request failed: {str(e)}')
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/calculate/delta', methods=['POST'])
+def calculate_delta():
+    data = request.json
+    try:
+        state = PROJECTION_STATES.get(data['handle'])
+        if state is None:
+            # Expired, evicted or held by another worker: the client resends the full config
+            return jsonify({'error': 'Unknown projection handle'}), 404
+        patch = data.get('patch', {})
+        if not isinstance(patch, dict):
+            raise ValidationError('patch must be an object')
+        # The patched config gets the same checks and normalization as a full request
+        config = parse_calculate_config({**state.config, **patch}, clip_entries=False)
+        new_state, recomputed_from = apply_projection_delta(state, {key: config[key] for key in patch})
+        return jsonify(retained_projection(new_state, recomputed_from))
+    except Exception as e:
+        logger.error(f'Delta calculate request failed: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/calculate/cache/stats', methods=['GET'])
+def calculate_cache_stats():
+    if RESULT_CACHE is None:
+        return jsonify({'backend': 'none'})
+    return jsonify(RESULT_CACHE.stats())
+
+@app.route('/api/calculate/batch', methods=['POST'])
+def calculate_batch():
+    data = request.json
+    try:
+        configs = data['configs'] if isinstance(data, dict) else data
+        result = run_batch(configs)
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Batch calculate request failed: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/simulate/montecarlo', methods=['POST'])
+def simulate_montecarlo():
+    data = request.json
+    try:
+        result = run_monte_carlo(data)
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Monte Carlo request failed: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/backtest', methods=['POST'])
+def backtest():
+    data = request.json
+    try:
+        result = run_backtest(data)
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Backtest request failed: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/sweep', methods=['POST'])
+def sweep():
+    data = request.json
+    try:
+        result = run_sweep(data)
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Sweep request failed: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/solve', methods=['POST'])
+def solve():
+    data = request.json
+    try:
+        result = solve_for_target(data)
+        return jsonify(result)
+    except Exception as e:
+        logger.error(f'Solve request failed: {str(e)}')
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/tax', methods=['POST'])
 def tax():
     data = request.json
     try:
-        result = calculate_tax(data)
+        result = cached_calculate_tax(
+            data['income'], data['state'], data.get('preTax401k', 0), data.get('filingStatus'), data.get('taxYear')
+        )
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/tax/cache/stats', methods=['GET'])
+def tax_cache_stats():
+    return jsonify(TAX_CACHE.stats())
+
+@app.route('/api/tax/batch', methods=['POST'])
+def tax_batch():
+    data = request.json
+    try:
+        result = calculate_tax_batch(
+            data['incomes'], data['state'], data.get('preTax401k', 0), data.get('filingStatus'), data.get('taxYear')
+        )
+        return jsonify({key: values.tolist() for key, values in result.items()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+def parse_profile_page_args():
+    """(limit, after, prefix) from the query string, validated before any streaming starts"""
+    limit = db.parse_page_limit(request.args.get('limit'))
+    after = request.args.get('after')
+    prefix = request.args.get('prefix')
+    db.validate_page_args(limit, after, prefix)
+    return limit, after, prefix
+
 @app.route('/api/profiles', methods=['GET'])
 def list_profiles():
     try:
-        profiles_list = list(profiles.find({}, {'_id': 1, 'name': 1}))
-        # Convert ObjectId to string for JSON serialization
-        for profile in profiles_list:
-            profile['_id'] = str(profile['_id'])
-        return jsonify(profiles_list)
+        limit, after, prefix = parse_profile_page_args()
+        profiles = db.iter_profiles(limit, after, prefix)
+        # Run the query before the 200 goes out, so database errors are still a 400
+        first = next(profiles, None)
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    if first is not None:
+        profiles = itertools.chain([first], profiles)
+    paginated = limit is not None or after is not None or prefix is not None
+
+    def generate():
+        # Without paging arguments the body stays a plain array for the existing client
+        yield '{"profiles":[' if paginated else '['
+        last = None
+        count = 0
+        for profile in profiles:
+            yield (',' if count else '') + json.dumps(profile)
+            last = profile
+            count += 1
+        if paginated:
+            next_cursor = db.page_cursor(last, prefix) if limit is not None and count == limit else None
+            yield '],"nextCursor":' + json.dumps(next_cursor) + '}'
+        else:
+            yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def try_projection_snapshot(config):
+    """Snapshot to store with a profile; a config that can't be projected is still saved"""
+    try:
+        return build_projection_snapshot(config)
+    except Exception as e:
+        logger.warning(f'Could not build projection snapshot: {str(e)}')
+        return None
 
 @app.route('/api/profiles', methods=['POST'])
 def create_profile():
-    logger.info('Received create profile request')
     try:
         data = request.json
         if not data:
             return jsonify({'error': 'No data provided'}), 400
-        profile = {
-            'name': data['name'],
-            'config': data['config']
-        }
-        result = profiles.insert_one(profile)
-        return jsonify({'id': str(result.inserted_id)})
+        profile_id = db.save_profile(data['name'], data['config'], data.get('owner'), try_projection_snapshot(data['config']))
+        return jsonify({'id': profile_id})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/profiles/<profile_id>', methods=['PUT'])
+def update_profile_by_id(profile_id):
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        if db.update_profile(profile_id, data['name'], data['config'], try_projection_snapshot(data['config'])):
+            return jsonify({'success': True})
+        return jsonify({'error': 'Profile not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/profiles/import', methods=['POST'])
+def import_profiles():
+    try:
+        compressed = request.headers.get('Content-Encoding') == 'gzip'
+        result = bulk.import_profiles(bulk.open_ndjson(request.stream, compressed))
+        return jsonify(result)
     except Exception as e:
+        logger.error(f'Profile import failed: {str(e)}')
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/profiles/export', methods=['GET'])
+def export_profiles():
+    lines = bulk.export_profiles()
+    if 'gzip' in request.accept_encodings:
+        response = Response(stream_with_context(bulk.gzip_lines(lines)), mimetype=NDJSON_MIMETYPE)
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+    return Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
+
 @app.route('/api/profiles/<profile_id>', methods=['GET'])
 def get_profile_by_id(profile_id):
     try:
-        profile = profiles.find_one({'_id': ObjectId(profile_id)})
+        profile = db.get_profile(profile_id)
         if profile:
-            profile['_id'] = str(profile['_id'])
-            return jsonify(profile)
+            return negotiated_response(profile, ('profile', profile['_id'], profile['name'], config_hash(profile['config'])))
         return jsonify({'error': 'Profile not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/profiles/<profile_id>/projection', methods=['GET'])
+def get_profile_projection_by_id(profile_id):
+    try:
+        profile = db.get_profile_projection(profile_id)
+        if not profile:
+            return jsonify({'error': 'Profile not found'}), 404
+        snapshot = profile.get('projection')
+        if snapshot_is_current(snapshot, profile['config']):
+            response = negotiated_response(snapshot['result'], projection_etag_parts(snapshot['configHash']))
+            response.headers['X-Projection-Snapshot'] = 'HIT'
+            return response
+        # Missing, or made by an older engine or tax table: recompute and store
+        snapshot = build_projection_snapshot(profile['config'])
+        db.set_profile_projection(profile_id, snapshot)
+        response = negotiated_response(snapshot['result'], projection_etag_parts(snapshot['configHash']))
+        response.headers['X-Projection-Snapshot'] = 'REFRESHED'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/profiles/<profile_id>', methods=['DELETE'])
 def delete_profile_by_id(profile_id):
     try:
-        result = profiles.delete_one({'_id': ObjectId(profile_id)})
-        if result.deleted_count > 0:
+        if db.delete_profile(profile_id):
             return jsonify({'success': True})
         return jsonify({'error': 'Profile not found'}), 404
     except Exception as e:
@@ -0,0 +1,314 @@
+"""ASGI entry point: `uvicorn asgi:app --workers 2`
+
+The profile routes run natively on the event loop with the async Mongo client, and
+/api/calculate and /api/solve hand their CPU work to the shared process pool. Every other
+route, and the streaming and retained-state calculate modes, are served by the Flask app
+through a WSGI adapter, so both entry points expose the same API.
+"""
+import asyncio
+import json
+import os
+import time
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.convertors import Convertor, register_url_convertor
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from api import async_db, db, encoding, metrics
+from api.pool import WORKER_PROCESSES, get_process_pool
+from api.projection import run_projection
+from api.snapshot import build_projection_snapshot, snapshot_is_current
+from api.result_cache import config_hash
+from api.schema import decode_json, parse_calculate_config
+from api.solver import solve_for_target
+from app import (
+    CORS_EXPOSE_HEADERS, CORS_ORIGINS, NDJSON_MIMETYPE, RESULT_CACHE, SERVER_TIMING, app as flask_app,
+    dumps_json, logger, projection_etag_parts, result_cache_key
+)
+
+# Projections queued for or running in the process pool; further requests wait their turn
+CPU_CONCURRENCY = int(os.getenv('ASGI_CPU_CONCURRENCY', WORKER_PROCESSES * 2))
+# Threads serving the Flask routes behind the WSGI adapter
+WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', 8))
+
+_cpu_slots = asyncio.Semaphore(CPU_CONCURRENCY)
+
+class ObjectIdConvertor(Convertor):
+    """Only well-formed ids reach the native routes; anything else (e.g. /export) falls through to Flask"""
+    regex = '[0-9a-fA-F]{24}'
+
+    def convert(self, value):
+        return value
+
+    def to_string(self, value):
+        return str(value)
+
+register_url_convertor('objectid', ObjectIdConvertor())
+
+async def run_cpu(fn, *args):
+    """Run fn in the process pool, at most CPU_CONCURRENCY at a time"""
+    async with _cpu_slots:
+        with metrics.phase('pool'):
+            return await asyncio.get_running_loop().run_in_executor(get_process_pool(), fn, *args)
+
+def json_response(obj, status_code=200):
+    # The Flask JSON provider, so bodies (and cached ones) are identical across entry points
+    with metrics.phase('serialize'):
+        body = dumps_json(obj) + '\n'
+    return Response(body, status_code, media_type='application/json')
+
+def negotiated_response(request, obj, etag_parts=None, json_body=None):
+    """obj in the format and content coding the client accepts, as app.negotiated_response"""
+    with metrics.phase('serialize'):
+        status, body, headers = encoding.encode_response(
+            obj, request.headers.get('accept'), request.headers.get('accept-encoding'), etag_parts,
+            request.headers.get('if-none-match') if request.method == 'GET' else None,
+            dumps_json, json_body
+        )
+    return Response(body, status, headers=headers)
+
+async def read_json(request):
+    with metrics.phase('parse'):
+        return decode_json(await request.body())
+
+def instrumented(route):
+    """Request timing for a native route, recorded in the same histograms as the Flask routes"""
+    def decorator(handler):
+        async def endpoint(request, *args):
+            started = time.perf_counter()
+            metrics.start_request()
+            response = await handler(request, *args)
+            phases = metrics.finish_request()
+            if isinstance(response, StreamingResponse):
+                # Recorded once the body has been sent; its headers go first, so no Server-Timing
+                def record():
+                    duration = time.perf_counter() - started
+                    metrics.observe_request(request.method, route, response.status_code, duration, phases)
+                response.body_iterator = metrics.aiter_with_phases(response.body_iterator, phases)
+                response.background = BackgroundTask(record)
+                return response
+            duration = time.perf_counter() - started
+            metrics.observe_request(request.method, route, response.status_code, duration, phases)
+            if SERVER_TIMING:
+                response.headers['Server-Timing'] = metrics.server_timing(phases, duration)
+            return response
+        return endpoint
+    return decorator
+
+def wants_stream(request):
+    if request.query_params.get('stream') == 'true':
+        return True
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    return accept.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def replay(body):
+    """ASGI receive callable that hands an already-read body to another app"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+    return receive
+
+class CalculateEndpoint:
+    """POST /api/calculate: projections in the process pool, special modes handed to Flask"""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        body = await request.body()
+        try:
+            data = decode_json(body)
+            special = wants_stream(request) or data.get('retainState')
+        except Exception:
+            special = True
+        if special:
+            # Streaming rows and retained states are per-process; Flask serves (and validates) those
+            await self.fallback(scope, replay(body), send)
+            return
+        response = await calculate(request, data)
+        await response(scope, receive, send)
+
+@instrumented('/api/calculate')
+async def calculate(request, data):
+    try:
+        data = parse_calculate_config(data)
+        if RESULT_CACHE is None:
+            return negotiated_response(request, await run_cpu(run_projection, data))
+
+        key = config_hash(data)
+        cached = RESULT_CACHE.get(result_cache_key(key))
+        if cached is not None:
+            body, saved_ms = cached
+            response = negotiated_response(request, None, projection_etag_parts(key), body)
+            response.headers['X-Cache'] = 'HIT'
+            response.headers['X-Cache-Saved-Ms'] = f'{saved_ms:.2f}'
+            return response
+
+        started = time.perf_counter()
+        result = await run_cpu(run_projection, data)
+        with metrics.phase('serialize'):
+            body = (dumps_json(result) + '\n').encode()
+        RESULT_CACHE.set(result_cache_key(key), body, (time.perf_counter() - started) * 1000)
+        response = negotiated_response(request, result, projection_etag_parts(key), body)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    except Exception as e:
+        logger.error(f'Calculate request failed: {str(e)}')
+        return json_response({'error': str(e)}, 400)
+
+@instrumented('/api/solve')
+async def solve(request):
+    try:
+        return json_response(await run_cpu(solve_for_target, await read_json(request)))
+    except Exception as e:
+        logger.error(f'Solve request failed: {str(e)}')
+        return json_response({'error': str(e)}, 400)
+
+@instrumented('/api/profiles')
+async def list_profiles(request):
+    try:
+        limit = db.parse_page_limit(request.query_params.get('limit'))
+        after = request.query_params.get('after')
+        prefix = request.query_params.get('prefix')
+        db.validate_page_args(limit, after, prefix)
+        profiles = async_db.iter_profiles(limit, after, prefix)
+        # Run the query before the 200 goes out, so database errors are still a 400
+        first = await anext(profiles, None)
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+    paginated = limit is not None or after is not None or prefix is not None
+
+    async def generate():
+        # Without paging arguments the body stays a plain array for the existing client
+        yield '{"profiles":[' if paginated else '['
+        last = None
+        count = 0
+        if first is not None:
+            yield json.dumps(first)
+            last = first
+            count = 1
+            async for profile in profiles:
+                yield ',' + json.dumps(profile)
+                last = profile
+                count += 1
+        if paginated:
+            next_cursor = db.page_cursor(last, prefix) if limit is not None and count == limit else None
+            yield '],"nextCursor":' + json.dumps(next_cursor) + '}'
+        else:
+            yield ']'
+    return StreamingResponse(generate(), media_type='application/json')
+
+async def try_projection_snapshot(config):
+    """Snapshot to store with a profile; a config that can't be projected is still saved"""
+    try:
+        return await run_cpu(build_projection_snapshot, config)
+    except Exception as e:
+        logger.warning(f'Could not build projection snapshot: {str(e)}')
+        return None
+
+@instrumented('/api/profiles')
+async def create_profile(request):
+    try:
+        data = await read_json(request)
+        if not data:
+            return json_response({'error': 'No data provided'}, 400)
+        snapshot = await try_projection_snapshot(data['config'])
+        profile_id = await async_db.save_profile(data['name'], data['config'], data.get('owner'), snapshot)
+        return json_response({'id': profile_id})
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+
+@instrumented('/api/profiles/<profile_id>')
+async def get_profile_by_id(request):
+    try:
+        profile = await async_db.get_profile(request.path_params['profile_id'])
+        if profile:
+            return negotiated_response(
+                request, profile, ('profile', profile['_id'], profile['name'], config_hash(profile['config']))
+            )
+        return json_response({'error': 'Profile not found'}, 404)
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+
+@instrumented('/api/profiles/<profile_id>')
+async def update_profile_by_id(request):
+    try:
+        data = await read_json(request)
+        if not data:
+            return json_response({'error': 'No data provided'}, 400)
+        snapshot = await try_projection_snapshot(data['config'])
+        if await async_db.update_profile(request.path_params['profile_id'], data['name'], data['config'], snapshot):
+            return json_response({'success': True})
+        return json_response({'error': 'Profile not found'}, 404)
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+
+@instrumented('/api/profiles/<profile_id>')
+async def delete_profile_by_id(request):
+    try:
+        if await async_db.delete_profile(request.path_params['profile_id']):
+            return json_response({'success': True})
+        return json_response({'error': 'Profile not found'}, 404)
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+
+@instrumented('/api/profiles/<profile_id>/projection')
+async def get_profile_projection_by_id(request):
+    try:
+        profile_id = request.path_params['profile_id']
+        profile = await async_db.get_profile_projection(profile_id)
+        if not profile:
+            return json_response({'error': 'Profile not found'}, 404)
+        snapshot = profile.get('projection')
+        if snapshot_is_current(snapshot, profile['config']):
+            response = negotiated_response(request, snapshot['result'], projection_etag_parts(snapshot['configHash']))
+            response.headers['X-Projection-Snapshot'] = 'HIT'
+            return response
+        # Missing, or made by an older engine or tax table: recompute and store
+        snapshot = await run_cpu(build_projection_snapshot, profile['config'])
+        await async_db.set_profile_projection(profile_id, snapshot)
+        response = negotiated_response(request, snapshot['result'], projection_etag_parts(snapshot['configHash']))
+        response.headers['X-Projection-Snapshot'] = 'REFRESHED'
+        return response
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+
+async def lifespan(app):
+    yield
+    await async_db.close_client()
+
+def create_app():
+    wsgi = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+    routes = [
+        Route('/api/calculate', CalculateEndpoint(wsgi), methods=['POST']),
+        Route('/api/solve', solve, methods=['POST']),
+        Route('/api/profiles', list_profiles, methods=['GET']),
+        Route('/api/profiles', create_profile, methods=['POST']),
+        Route('/api/profiles/{profile_id:objectid}', get_profile_by_id, methods=['GET']),
+        Route('/api/profiles/{profile_id:objectid}', update_profile_by_id, methods=['PUT']),
+        Route('/api/profiles/{profile_id:objectid}', delete_profile_by_id, methods=['DELETE']),
+        Route('/api/profiles/{profile_id:objectid}/projection', get_profile_projection_by_id, methods=['GET']),
+        # Everything else, and other methods on the paths above, is served by Flask
+        Mount('/', app=wsgi),
+    ]
+    middleware = [Middleware(
+        CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=['*'], allow_headers=['*'],
+        expose_headers=CORS_EXPOSE_HEADERS, max_age=3600
+    )]
+    return Starlette(routes=routes, middleware=middleware, lifespan=lifespan)
+
+app = create_app()
@@ -0,0 +1,201 @@
+"""Benchmarks for the tax engine, the projection engines and the HTTP endpoints.
+
+Run from backend/:
+
+    python -m benchmarks.run                       # run and compare against benchmarks/baseline.json
+    python -m benchmarks.run --save-baseline       # record a new baseline on this machine
+    python -m benchmarks.run --filter projection --output results.json
+
+Results are per-call seconds (median and min over the repeats). A case regresses when its
+min, the least noisy of the two, is more than --threshold slower than the baseline; the exit status is then 1.
+Baselines are only comparable on the same machine and dependency versions (requirements.txt),
+so record one where the check runs. Back-to-back runs on a shared machine differ by up to about
+1.5x on the fastest cases, hence the 10 repeats and the 50% default threshold.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import timeit
+
+# Measure the computation, not the response cache
+os.environ.setdefault('RESULT_CACHE_BACKEND', 'none')
+
+import mongomock
+import numpy as np
+
+from api import db
+from api.backtest import run_backtest
+from api.calculator import calculate_fire_projection
+from api.projection import calculate_fire_projection_vectorized
+from api.tax import FEDERAL_TAX_RATES, calculate_tax, calculate_tax_for_bracket
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_REPEAT = 10
+DEFAULT_MIN_TIME = 0.1
+HORIZONS = (10, 30, 60, 100)
+ENTRY_COUNTS = (1, 10, 100, 500)
+PROFILE_COUNTS = (100, 1000)
+
+def build_entries(count, current_age, end_age, amount, rng):
+    """`count` overlapping entries spread over the horizon; together they cover every year"""
+    entries = [{'startAge': current_age, 'endAge': end_age, 'amount': amount / 2}]
+    for i in range(count - 1):
+        start = rng.randint(current_age, end_age)
+        entries.append({
+            'id': i,
+            'startAge': start,
+            'endAge': rng.randint(start, end_age),
+            'amount': round(amount / count * rng.uniform(0.5, 1.5), 2)
+        })
+    return entries
+
+def build_config(horizon, entry_count, seed=0):
+    """A FireCalculator-style payload with the given horizon and number of entries per list"""
+    rng = random.Random(seed)
+    current_age = 30
+    end_age = current_age + horizon - 1
+    return {
+        'currentAge': current_age,
+        'endAge': end_age,
+        'currentNetWorth': 100000,
+        'annualReturn': 7,
+        'inflationRate': 2,
+        'retirementSpending': 40000,
+        'withdrawalRate': 4,
+        'preTax401k': 23000,
+        'employerMatch': 5,
+        'state': 'CA',
+        'stopAtFire': False,
+        'yearlyIncome': build_entries(entry_count, current_age, end_age, 120000, rng),
+        'yearlySpending': build_entries(entry_count, current_age, end_age, 50000, rng)
+    }
+
+def measure(fn, repeat, min_time):
+    """Per-call seconds for each repeat, with the loop count picked like timeit's autorange"""
+    timer = timeit.Timer(fn)
+    loops = 1
+    while timer.timeit(loops) < min_time and loops < 1_000_000:
+        loops *= 10
+    timings = [t / loops for t in timer.repeat(repeat=repeat, number=loops)]
+    return {'median': statistics.median(timings), 'min': min(timings), 'loops': loops, 'repeat': repeat}
+
+def tax_cases():
+    for income in (30000, 120000, 750000):
+        yield f'tax.calculate_tax_for_bracket[income={income}]', lambda income=income: calculate_tax_for_bracket(income, FEDERAL_TAX_RATES)
+        payload = {'income': income, 'state': 'CA', 'preTax401k': 23000}
+        yield f'tax.calculate_tax[income={income}]', lambda payload=payload: calculate_tax(payload)
+
+def projection_cases():
+    for horizon in HORIZONS:
+        for entry_count in ENTRY_COUNTS:
+            config = build_config(horizon, entry_count)
+            label = f'[years={horizon},entries={entry_count}]'
+            yield f'projection.loop{label}', lambda config=config: calculate_fire_projection(config)
+            yield f'projection.vectorized{label}', lambda config=config: calculate_fire_projection_vectorized(config)
+    for horizon in (30, 60):
+        config = build_config(horizon, 10)
+        yield f'projection.backtest[years={horizon}]', lambda config=config: run_backtest(config)
+
+def http_cases():
+    # Imported here so the tax/projection cases don't pay for the Flask app
+    from app import app
+    logging.disable(logging.INFO)
+    client = app.test_client()
+    db.use_client_factory(mongomock.MongoClient)
+
+    for horizon, entry_count in ((30, 10), (60, 100)):
+        config = build_config(horizon, entry_count)
+        yield f'http.calculate[years={horizon},entries={entry_count}]', lambda config=config: client.post('/api/calculate', json=config)
+
+    config = build_config(30, 10)
+    for profile_count in PROFILE_COUNTS:
+        def setup(profile_count=profile_count):
+            db.get_profiles_collection().delete_many({})
+            db.get_profiles_collection().insert_many(
+                [{'name': f'Profile {i}', 'config': config, 'owner': None} for i in range(profile_count)]
+            )
+        yield f'http.profiles.list[profiles={profile_count}]', (setup, lambda: client.get('/api/profiles').data)
+    yield 'http.profiles.create', lambda: client.post('/api/profiles', json={'name': 'Bench', 'config': config})
+
+def iter_cases(selected):
+    groups = {'tax': tax_cases, 'projection': projection_cases, 'http': http_cases}
+    for group in selected:
+        yield from groups[group]()
+
+def run(groups, name_filter=None, repeat=DEFAULT_REPEAT, min_time=DEFAULT_MIN_TIME):
+    results = {}
+    for name, case in iter_cases(groups):
+        if name_filter and name_filter not in name:
+            continue
+        setup, fn = case if isinstance(case, tuple) else (None, case)
+        if setup:
+            setup()
+        results[name] = measure(fn, repeat, min_time)
+        print(f"{name:60s} {results[name]['median'] * 1e6:12.1f} us", file=sys.stderr)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        'results': results
+    }
+
+def compare(results, baseline, threshold):
+    """Cases whose min is more than `threshold` slower than the baseline"""
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        ratio = current['min'] / previous['min']
+        if ratio > 1 + threshold:
+            regressions.append({'name': name, 'baseline': previous['min'], 'current': current['min'], 'ratio': ratio})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the backend benchmarks')
+    parser.add_argument('--groups', nargs='+', choices=['tax', 'projection', 'http'], default=['tax', 'projection', 'http'])
+    parser.add_argument('--filter', help='only run cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME, help='minimum seconds per repeat')
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='overwrite the baseline with these results')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('BENCHMARK_THRESHOLD', DEFAULT_THRESHOLD)),
+                        help='allowed slowdown before a case counts as a regression, e.g. 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    results = run(args.groups, args.filter, args.repeat, args.min_time)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Saved baseline to {args.baseline}', file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}; run with --save-baseline first', file=sys.stderr)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['name']}: {regression['baseline'] * 1e6:.1f} us -> "
+              f"{regression['current'] * 1e6:.1f} us ({regression['ratio']:.2f}x)", file=sys.stderr)
+    print(json.dumps({'regressions': regressions, 'threshold': args.threshold}))
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""Load test the backend with a realistic mix of calculate, tax and profile traffic.
+
+Run from backend/:
+
+    python -m loadtest.run                                  # gunicorn, 2 workers x 4 threads, mongomock
+    python -m loadtest.run --workers 4 --threads 2 --concurrency 32 --duration 60
+    python -m loadtest.run --mix calculate=1 --url http://127.0.0.1:8000   # a server that is already up
+    python -m loadtest.run --replay recorded.jsonl --output results.json
+
+Each virtual user is a thread with one keep-alive connection that runs scenarios back to back
+(closed loop): `calculate` and `tax` send one request with a FireCalculator-style payload, and
+`profiles` runs the client's save/list/load/update/delete flow. --replay instead cycles through a
+recorded file of `{"method", "path", "body", "headers"}` lines. The report has throughput,
+p50/p95/p99 latency and the error rate (transport errors and 4xx/5xx) per endpoint, counting
+only requests that start after the warmup.
+
+The load generator shares the machine (and, per thread, the GIL) with the server; when its own
+CPU use is high, the numbers describe the client rather than the app.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_MIX = 'calculate=70,tax=20,profiles=10'
+STATES = ('CA', 'NY', 'TX', 'WA', 'FL', 'IL', 'MA', 'CO')
+OBJECT_ID_PATTERN = re.compile(r'/[0-9a-fA-F]{24}(?=/|$)')
+READY_PATH = '/api/tax/cache/stats'
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def build_calculate_payload(rng):
+    """A payload like FireCalculator.tsx's handleCalculate sends, around the form's defaults"""
+    current_age = rng.randint(22, 45)
+    end_age = current_age + rng.randint(20, 60)
+    yearly_income = []
+    age = current_age
+    while age < end_age - 10 and len(yearly_income) < 4:
+        stop = min(age + rng.randint(2, 10), end_age)
+        yearly_income.append({'startAge': age, 'endAge': stop, 'amount': rng.randrange(60000, 450000, 5000)})
+        age = stop + 1
+    yearly_spending = [{'startAge': current_age, 'endAge': end_age, 'amount': rng.randrange(40000, 150000, 5000)}]
+    if rng.random() < 0.3:
+        start = rng.randint(current_age, end_age)
+        yearly_spending.append({'startAge': start, 'endAge': min(start + 5, end_age), 'amount': rng.randrange(10000, 50000, 5000)})
+    return {
+        'currentAge': current_age,
+        'endAge': end_age,
+        'currentNetWorth': rng.randrange(0, 500000, 10000),
+        'annualReturn': rng.choice((5, 6, 7, 8)),
+        'inflationRate': rng.choice((2, 3)),
+        'retirementSpending': rng.randrange(40000, 150000, 5000),
+        'withdrawalRate': rng.choice((3.5, 4)),
+        'state': rng.choice(STATES),
+        'preTax401k': rng.choice((0, 23000)),
+        'employerMatch': rng.choice((0, 3, 5)),
+        'yearlySpending': yearly_spending,
+        'yearlyIncome': yearly_income,
+        'stopAtFire': rng.random() < 0.2
+    }
+
+def build_tax_payload(rng):
+    return {'income': rng.randrange(20000, 800000, 1000), 'state': rng.choice(STATES), 'preTax401k': rng.choice((0, 23000))}
+
+class Traffic:
+    """Payload source; a fixed pool of distinct payloads makes the result cache hit rate realistic"""
+
+    def __init__(self, distinct_payloads, seed):
+        self.rng = random.Random(seed)
+        self.pools = {
+            'calculate': [build_calculate_payload(self.rng) for _ in range(distinct_payloads)],
+            'tax': [build_tax_payload(self.rng) for _ in range(distinct_payloads)]
+        }
+
+    def payload(self, kind, rng):
+        pool = self.pools[kind]
+        if pool:
+            return rng.choice(pool)
+        return build_calculate_payload(rng) if kind == 'calculate' else build_tax_payload(rng)
+
+class Recorder:
+    """Latencies and statuses per endpoint for one virtual user; merged after the run"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+
+    def record(self, label, seconds, status):
+        self.latencies.setdefault(label, []).append(seconds)
+        self.statuses.setdefault(label, Counter())[status] += 1
+
+class VirtualUser:
+    def __init__(self, host, port, timeout, measure_from):
+        self.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        self.recorder = Recorder()
+        self.measure_from = measure_from
+
+    def request(self, label, method, path, body=None, headers=None):
+        """(status, body); status is None for a transport error"""
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers.setdefault('Content-Type', 'application/json')
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, payload, headers)
+            response = self.connection.getresponse()
+            status, data = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnects on the next request
+            self.connection.close()
+            status, data = None, b''
+        if started >= self.measure_from:
+            self.recorder.record(label, time.perf_counter() - started, status)
+        return status, data
+
+def calculate_scenario(user, traffic, rng):
+    user.request('POST /api/calculate', 'POST', '/api/calculate', traffic.payload('calculate', rng))
+
+def tax_scenario(user, traffic, rng):
+    user.request('POST /api/tax', 'POST', '/api/tax', traffic.payload('tax', rng))
+
+def profiles_scenario(user, traffic, rng):
+    """Save, list, load, update and delete a profile, as the client's profile dialogs do"""
+    config = traffic.payload('calculate', rng)
+    status, body = user.request('POST /api/profiles', 'POST', '/api/profiles', {'name': f'Load test {rng.random():.6f}', 'config': config})
+    if status != 200:
+        return
+    path = f"/api/profiles/{json.loads(body)['id']}"
+    user.request('GET /api/profiles', 'GET', '/api/profiles')
+    user.request('GET /api/profiles/<id>', 'GET', path)
+    user.request('PUT /api/profiles/<id>', 'PUT', path, {'name': 'Load test (edited)', 'config': {**config, 'annualReturn': 6}})
+    user.request('DELETE /api/profiles/<id>', 'DELETE', path)
+
+SCENARIOS = {'calculate': calculate_scenario, 'tax': tax_scenario, 'profiles': profiles_scenario}
+
+def parse_mix(text):
+    """'calculate=70,tax=20' -> {'calculate': 70.0, 'tax': 20.0}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError('The traffic mix needs at least one positive weight')
+    return mix
+
+def load_replay(path):
+    """Recorded requests, one `{"method", "path", "body", "headers"}` object per line"""
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                record['label'] = f"{record['method']} {OBJECT_ID_PATTERN.sub('/<id>', record['path'].split('?')[0])}"
+                requests.append(record)
+    if not requests:
+        raise ValueError(f'No requests in {path}')
+    return requests
+
+def run_user(index, args, traffic, mix, replay, measure_from, deadline):
+    rng = random.Random(args.seed + index)
+    user = VirtualUser(args.host, args.port, args.timeout, measure_from)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    position = index
+    while time.perf_counter() < deadline:
+        if replay:
+            record = replay[position % len(replay)]
+            position += 1
+            user.request(record['label'], record['method'], record['path'], record.get('body'), record.get('headers'))
+        else:
+            SCENARIOS[rng.choices(names, weights)[0]](user, traffic, rng)
+    user.connection.close()
+    return user.recorder
+
+def run(args, mix, replay):
+    traffic = Traffic(args.distinct_payloads, args.seed)
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    deadline = measure_from + args.duration
+    recorders = [None] * args.concurrency
+
+    def target(index):
+        recorders[index] = run_user(index, args, traffic, mix, replay, measure_from, deadline)
+
+    threads = [threading.Thread(target=target, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Requests still in flight at the deadline are counted, so measure to the actual finish
+    elapsed = time.perf_counter() - measure_from
+    return summarize([recorder for recorder in recorders if recorder is not None], elapsed)
+
+def is_error(status):
+    return status is None or status >= 400
+
+def summarize_endpoint(latencies, statuses, elapsed):
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, (50, 95, 99))
+    errors = sum(count for status, count in statuses.items() if is_error(status))
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'errorRate': errors / len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'p50Ms': p50, 'p95Ms': p95, 'p99Ms': p99, 'maxMs': latencies_ms.max(),
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=lambda item: str(item[0]))}
+    }
+
+def summarize(recorders, elapsed):
+    """Per-endpoint and overall stats over the measured window"""
+    latencies = {}
+    statuses = {}
+    for recorder in recorders:
+        for label, values in recorder.latencies.items():
+            latencies.setdefault(label, []).extend(values)
+            statuses.setdefault(label, Counter()).update(recorder.statuses[label])
+    endpoints = {label: summarize_endpoint(latencies[label], statuses[label], elapsed) for label in sorted(latencies)}
+    all_latencies = [value for values in latencies.values() for value in values]
+    total = summarize_endpoint(all_latencies, sum(statuses.values(), Counter()), elapsed) if all_latencies else None
+    return {'elapsed': elapsed, 'endpoints': endpoints, 'total': total}
+
+def format_report(summary):
+    header = f"{'endpoint':32s} {'requests':>9s} {'req/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'max ms':>9s} {'errors':>8s}"
+    lines = [header, '-' * len(header)]
+    rows = list(summary['endpoints'].items()) + ([('total', summary['total'])] if summary['total'] else [])
+    for label, stats in rows:
+        lines.append(
+            f"{label:32s} {stats['requests']:9d} {stats['throughput']:9.1f} {stats['p50Ms']:9.1f} {stats['p95Ms']:9.1f} "
+            f"{stats['p99Ms']:9.1f} {stats['maxMs']:9.1f} {stats['errorRate']:8.2%}"
+        )
+    return '\n'.join(lines)
+
+def start_server(args):
+    command = [
+        sys.executable, '-m', 'loadtest.serve', '--server', args.server, '--host', args.host, '--port', str(args.port),
+        '--workers', str(args.workers), '--threads', str(args.threads)
+    ]
+    if args.mongo_uri:
+        command += ['--mongo-uri', args.mongo_uri]
+    return subprocess.Popen(command, cwd=BACKEND_DIR)
+
+def wait_until_ready(host, port, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f'The server exited with status {server.returncode}')
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=1)
+            connection.request('GET', READY_PATH)
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'The server did not answer {READY_PATH} within {timeout}s')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the backend')
+    parser.add_argument('--url', help='load test a server that is already running instead of starting one')
+    parser.add_argument('--server', choices=['gunicorn', 'uvicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--mongo-uri', help='MongoDB for the started server; the default is an in-memory stand-in')
+    parser.add_argument('--concurrency', type=int, default=16, help='virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='seconds of load before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'scenario weights (default {DEFAULT_MIX})')
+    parser.add_argument('--distinct-payloads', type=int, default=200,
+                        help='size of the payload pool per scenario; 0 generates a new payload per request')
+    parser.add_argument('--replay', help='replay a recorded requests.jsonl instead of the mix')
+    parser.add_argument('--timeout', type=float, default=30, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results JSON here')
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+        replay = load_replay(args.replay) if args.replay else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        args.host, args.port = url.hostname, url.port or 80
+    else:
+        args.host = '127.0.0.1'
+        server = start_server(args)
+    try:
+        wait_until_ready(args.host, args.port, server)
+        print(f'Running {args.concurrency} virtual users for {args.warmup:g}s warmup + {args.duration:g}s', file=sys.stderr)
+        summary = run(args, mix, replay)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(format_report(summary))
+    if args.output:
+        results = {
+            'meta': {
+                'server': None if args.url else {'server': args.server, 'workers': args.workers, 'threads': args.threads},
+                'url': args.url,
+                'concurrency': args.concurrency,
+                'mix': None if replay else mix,
+                'replay': args.replay,
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            },
+            **summary
+        }
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 1 if summary['total'] is None or summary['total']['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
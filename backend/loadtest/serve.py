@@ -0,0 +1,70 @@
+"""Start the app for a load test: `python -m loadtest.serve --server gunicorn --workers 2 --threads 4`
+
+With the default in-memory Mongo stand-in (mongomock) every worker process has its own
+database, so profiles created on one worker aren't visible on another; loadtest.run keeps each
+virtual user on one keep-alive connection for that reason. Pass --mongo-uri to share a real
+(e.g. local) MongoDB between workers instead.
+"""
+import argparse
+import logging
+import os
+import sys
+
+def use_memory_mongo():
+    import mongomock
+    from api import db
+    # db.get_client() creates one client per process, so each forked worker gets its own
+    db.use_client_factory(mongomock.MongoClient)
+
+def serve_gunicorn(app, args):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{args.host}:{args.port}')
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            # gthread even with one thread: the sync worker closes every connection
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('keepalive', 5)
+            self.cfg.set('loglevel', 'warning')
+
+        def load(self):
+            return app
+
+    Server().run()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the app for a load test')
+    parser.add_argument('--server', choices=['gunicorn', 'uvicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--mongo-uri', help='MongoDB to use instead of the in-memory stand-in')
+    args = parser.parse_args(argv)
+
+    if args.mongo_uri:
+        # Read by api.db at import time
+        os.environ['MONGODB_URI'] = args.mongo_uri
+    elif args.server == 'uvicorn':
+        parser.error('the ASGI profile routes use the async Mongo client; pass --mongo-uri')
+    else:
+        use_memory_mongo()
+
+    if args.server == 'uvicorn':
+        import uvicorn
+        uvicorn.run('asgi:app', host=args.host, port=args.port, workers=args.workers, log_level='warning')
+        return 0
+
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    if args.server == 'gunicorn':
+        serve_gunicorn(app, args)
+    else:
+        # Single process, a thread per request; for machines without gunicorn
+        app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
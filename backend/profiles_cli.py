@@ -0,0 +1,58 @@
+"""Bulk profile import/export against the configured MongoDB.
+
+    python profiles_cli.py export profiles.ndjson.gz
+    python profiles_cli.py import profiles.ndjson.gz
+
+Files ending in .gz are gzip-compressed; `-` reads stdin or writes stdout.
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import sys
+
+from api import bulk
+
+
+def open_file(path, mode):
+    if path == '-':
+        # The caller's `with` must not close stdin/stdout
+        return contextlib.nullcontext(sys.stdin if 'r' in mode else sys.stdout)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+def export_command(args):
+    count = 0
+    with open_file(args.file, 'w') as f:
+        for line in bulk.export_profiles():
+            f.write(line)
+            count += 1
+    print(f'Exported {count} profiles', file=sys.stderr)
+
+def import_command(args):
+    with open_file(args.file, 'r') as f:
+        result = bulk.import_profiles(f, batch_size=args.batch_size)
+    for error in result['errors']:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    print(json.dumps({'inserted': result['inserted'], 'replaced': result['replaced'], 'failed': result['failed']}))
+    return 1 if result['failed'] else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import/export FIRE calculator profiles as NDJSON')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='write every profile to a file')
+    export_parser.add_argument('file')
+    export_parser.set_defaults(handler=export_command)
+
+    import_parser = commands.add_parser('import', help='insert profiles from a file')
+    import_parser.add_argument('file')
+    import_parser.add_argument('--batch-size', type=int, default=bulk.IMPORT_BATCH_SIZE)
+    import_parser.set_defaults(handler=import_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args) or 0
+
+if __name__ == '__main__':
+    sys.exit(main())